@@ -0,0 +1,59 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tools.compactGraph import CompactGraph, write_compact
+from tools.readGraph import load_graph
+
+# Compares file size and load time of the JSON export and the compact format.
+#   python benchmarks/bench_graph_format.py --modules 20000 --arcs 500000
+
+def make_graph(module_count: int, arc_count: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    nodes = [f"src.package{i % 40}.subpackage{i % 13}.module_{i}" for i in range(module_count)]
+    symbols = [f"Symbol{i}" for i in range(max(1, arc_count // 20))]
+    arcs = [{"source": rng.choice(nodes), "target": rng.choice(nodes), "symbol": rng.choice(symbols)}
+            for _ in range(arc_count)]
+    return {"nodes": nodes, "arcs": arcs}
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark graph file formats")
+    parser.add_argument("--modules", type=int, default=20000)
+    parser.add_argument("--arcs", type=int, default=500000)
+    args = parser.parse_args()
+
+    graph = make_graph(args.modules, args.arcs)
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "graph.json")
+        compact_path = os.path.join(tmp, "graph.mcpg")
+        write_json, _ = timed(lambda: json.dump(graph, open(json_path, "w", encoding="utf-8"), indent=2))
+        write_bin, _ = timed(lambda: write_compact(graph, compact_path))
+
+        load_json, loaded = timed(lambda: load_graph(json_path))
+        load_bin, loaded_bin = timed(lambda: load_graph(compact_path))
+        assert loaded == loaded_bin
+
+        def open_only():
+            with CompactGraph(compact_path) as g:
+                return g.arc_count, g.string(g.source_ids[g.arc_count - 1])
+        open_bin, _ = timed(open_only)
+
+        print(f"{'':24} {'json':>12} {'compact':>12}")
+        print(f"{'file size (MB)':24} {os.path.getsize(json_path) / 1e6:>12.1f} {os.path.getsize(compact_path) / 1e6:>12.1f}")
+        print(f"{'write (s)':24} {write_json:>12.3f} {write_bin:>12.3f}")
+        print(f"{'load_graph (s)':24} {load_json:>12.3f} {load_bin:>12.3f}")
+        print(f"{'mmap open + 1 arc (s)':24} {'':>12} {open_bin:>12.5f}")
+
+if __name__ == "__main__":
+    main()
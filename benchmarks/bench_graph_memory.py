@@ -0,0 +1,88 @@
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tools.Graph import Graph
+
+# Memory and build time of the in-memory Graph against the previous object-per-arc layout.
+#   python benchmarks/bench_graph_memory.py --modules 20000 --arcs 500000
+
+class LegacyNode:
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = path
+
+class LegacyArc:
+    def __init__(self, source, target, symbol: str):
+        self.source = source
+        self.target = target
+        self.symbol = symbol
+
+class LegacyGraph:
+    # The previous layout, kept for comparison: one Python object per arc in a flat list
+    def __init__(self):
+        self.nodes = {}
+        self.arcs = []
+
+    def add_node(self, name: str, path: str):
+        node = LegacyNode(name, path)
+        self.nodes[name] = node
+        return node
+
+    def add_arc(self, source, target, symbol: str):
+        self.arcs.append(LegacyArc(source, target, symbol))
+
+def make_arcs(module_count: int, arc_count: int, seed: int = 0):
+    rng = random.Random(seed)
+    names = [f"src.package{i % 40}.subpackage{i % 13}.module_{i}" for i in range(module_count)]
+    symbols = [f"Symbol{i}" for i in range(max(1, arc_count // 20))]
+    # Grouped by source, the order GraphBuilder links in
+    arcs = sorted((rng.randrange(module_count), rng.randrange(module_count), rng.choice(symbols))
+                  for _ in range(arc_count))
+    return names, arcs
+
+def build(cls, names: list, arcs: list):
+    graph = cls()
+    nodes = [graph.add_node(name, name.replace(".", "/") + ".py") for name in names]
+    for source, target, symbol in arcs:
+        graph.add_arc(nodes[source], nodes[target], symbol)
+    return graph
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark in-memory graph layouts")
+    parser.add_argument("--modules", type=int, default=20000)
+    parser.add_argument("--arcs", type=int, default=500000)
+    args = parser.parse_args()
+
+    names, arcs = make_arcs(args.modules, args.arcs)
+    print(f"{args.modules} modules, {args.arcs} arcs")
+    for label, cls in (("legacy", LegacyGraph), ("indexed", Graph)):
+        start = time.perf_counter()
+        build(cls, names, arcs)
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()
+        empty = build(cls, names, [])
+        nodes_only, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del empty
+        tracemalloc.start()
+        graph = build(cls, names, arcs)
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"  {label:8} build {elapsed:6.2f} s  memory {size / 1e6:7.1f} MB  "
+              f"({(size - nodes_only) / args.arcs:5.1f} bytes/arc on top of the nodes)  arcs kept {len(graph.arcs)}")
+
+    graph = build(Graph, names, arcs)
+    hub = max(names, key=lambda n: len(graph.predecessors(n)))
+    start = time.perf_counter()
+    for _ in range(1000):
+        graph.predecessors(hub)
+    print(f"  predecessors of the busiest module: {(time.perf_counter() - start) * 1000:.3f} us per call")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tools.GraphBuilder import GraphBuilder
+
+# Times only the link phase of GraphBuilder.build (Step 3) on synthetic module names,
+# so parsing and walking do not hide how resolution scales with module count.
+#   python benchmarks/bench_link.py --sizes 1000 2000 4000 8000 16000
+
+def make_builder(module_count: int, imports_per_module: int, seed: int = 0):
+    rng = random.Random(seed)
+    builder = GraphBuilder(".")
+    names = []
+    for i in range(module_count):
+        name = f"src.pkg{i % 50}.sub{i % 7}.mod{i}"
+        names.append(name)
+        builder.graph.add_node(name, name.replace(".", "/") + ".py")
+    summaries = []
+    for name in names:
+        imports = []
+        for _ in range(imports_per_module):
+            target = rng.choice(names)
+            # Mix absolute imports with suffixes of varying length and relative ones
+            style = rng.random()
+            if style < 0.4:
+                imports.append((target.split(".", 1)[1], "Symbol"))
+            elif style < 0.7:
+                imports.append((target.rsplit(".", 2)[-2] + "." + target.rsplit(".", 1)[-1], "Symbol"))
+            else:
+                imports.append(("." + target.rsplit(".", 1)[-1], "Symbol"))
+        summaries.append(imports)
+    return builder, summaries
+
+def legacy_link(builder: GraphBuilder, summaries: list):
+    # The previous O(imports x modules) scan, kept for comparison
+    nodes = builder.graph.nodes
+    for source_node, imports in zip(list(nodes.values()), summaries):
+        for imported_module, imported_name in imports:
+            for target_name, target_node in nodes.items():
+                if target_name.endswith(imported_module) or target_name == imported_module:
+                    builder.graph.add_arc(source_node, target_node, imported_name)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the import resolution (link) phase")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 2000, 4000, 8000, 16000])
+    parser.add_argument("--imports", type=int, default=8, help="imports per module")
+    parser.add_argument("--legacy", action="store_true", help="also time the previous linear scan")
+    args = parser.parse_args()
+
+    print(f"{'modules':>8} {'index (s)':>10} {'us/module':>10} {'legacy (s)':>11}")
+    for size in args.sizes:
+        builder, summaries = make_builder(size, args.imports)
+        start = time.perf_counter()
+        builder._link(summaries)
+        indexed = time.perf_counter() - start
+        legacy = ""
+        if args.legacy:
+            builder, summaries = make_builder(size, args.imports)
+            start = time.perf_counter()
+            legacy_link(builder, summaries)
+            legacy = f"{time.perf_counter() - start:.3f}"
+        print(f"{size:>8} {indexed:>10.3f} {indexed / size * 1e6:>10.1f} {legacy:>11}")
+
+if __name__ == "__main__":
+    main()
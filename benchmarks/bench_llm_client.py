@@ -0,0 +1,61 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# Load test of the async LLM client against the offline stub backend.
+#   python benchmarks/bench_llm_client.py --queries 200 --latency 0.2 --concurrency 16 --error-rate 0.05
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+async def run(queries: int):
+    from messages.asyncLLM import llm_client
+
+    latencies = []
+    failures = 0
+
+    async def one(i: int):
+        nonlocal failures
+        start = time.perf_counter()
+        try:
+            await llm_client.complete([{"role": "system", "content": "graph"},
+                                       {"role": "user", "content": f"What does module_{i} do?"}])
+        except Exception:
+            failures += 1
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(queries)))
+    return time.perf_counter() - start, latencies, failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the async LLM client with the stub backend")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per stub completion")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of stub requests answered with 429")
+    args = parser.parse_args()
+
+    # The client reads its settings at import
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["FAKE_LLM_LATENCY"] = str(args.latency)
+    os.environ["FAKE_LLM_ERROR_RATE"] = str(args.error_rate)
+    os.environ["LLM_MAX_CONCURRENCY"] = str(args.concurrency)
+
+    from messages.asyncLLM import llm_client
+    elapsed, latencies, failures = asyncio.run(run(args.queries))
+    print(f"{args.queries} queries, concurrency {args.concurrency}, stub latency {args.latency}s, "
+          f"error rate {args.error_rate}")
+    print(f"  elapsed    {elapsed:8.2f} s  (serial would take {args.queries * args.latency:.2f} s)")
+    print(f"  throughput {args.queries / elapsed:8.1f} queries/s")
+    print(f"  latency    p50 {percentile(latencies, 0.5):.3f} s  p95 {percentile(latencies, 0.95):.3f} s  "
+          f"max {max(latencies):.3f} s")
+    print(f"  retries    {llm_client.retries}, failed after retries {failures}")
+
+if __name__ == "__main__":
+    main()
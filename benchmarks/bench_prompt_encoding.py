@@ -0,0 +1,67 @@
+import argparse
+import glob
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from insturctions.instructionCreate import create_insturction
+from insturctions.contextBuilder import GraphContext
+import insturctions.contextBuilder as contextBuilder
+from messages import tokens
+from messages.tokens import count_tokens
+from tools.readGraph import load_graph
+
+# Compares prompt size of the 'repr' and 'compact' graph encodings on saved graphs, for
+# the whole graph and for the subgraph selected for a question about each module.
+#   python benchmarks/bench_prompt_encoding.py files/*.json
+
+def subgraph_prompts(nodes: list, arcs: list, encoding: str) -> list:
+    # The selection budget is counted in the encoding's own tokens
+    contextBuilder.PROMPT_GRAPH_ENCODING = encoding
+    context = GraphContext(nodes, arcs)
+    prompts = []
+    for name in nodes:
+        sub_nodes, sub_arcs = context.select_subgraph(f"What does {name.rsplit('.', 1)[-1]} do?")
+        prompts.append(create_insturction(sub_nodes, sub_arcs, partial=True, encoding=encoding))
+    return prompts
+
+def is_deterministic(nodes: list, arcs: list, rounds: int = 5) -> bool:
+    # The same graph built in another order must give the same prompt
+    rng = random.Random(0)
+    expected = create_insturction(nodes, arcs, encoding="compact")
+    for _ in range(rounds):
+        shuffled_nodes, shuffled_arcs = list(nodes), list(arcs)
+        rng.shuffle(shuffled_nodes)
+        rng.shuffle(shuffled_arcs)
+        if create_insturction(shuffled_nodes, shuffled_arcs, encoding="compact") != expected:
+            return False
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark graph encodings in LLM prompts")
+    parser.add_argument("graphs", nargs="*", help="Graph files (default: files/*.json)")
+    args = parser.parse_args()
+    paths = args.graphs or sorted(glob.glob(os.path.join("files", "*.json")))
+    counter = "tiktoken cl100k_base" if tokens._encoding is not None else "estimate, ~4 characters per token"
+    print(f"Token counts: {counter}")
+    for path in paths:
+        nodes, arcs = load_graph(path)
+        print(f"\n{path}: {len(nodes)} modules, {len(arcs)} arcs")
+        print(f"{'prompt':<22}{'encoding':<10}{'chars':>10}{'tokens':>10}")
+        full = {}
+        for encoding in ("repr", "compact"):
+            text = create_insturction(nodes, arcs, encoding=encoding)
+            full[encoding] = count_tokens(text)
+            print(f"{'full graph':<22}{encoding:<10}{len(text):>10}{full[encoding]:>10}")
+        for encoding in ("repr", "compact"):
+            prompts = subgraph_prompts(nodes, arcs, encoding)
+            chars = sum(len(p) for p in prompts) / max(1, len(prompts))
+            count = sum(count_tokens(p) for p in prompts) / max(1, len(prompts))
+            print(f"{'subgraph (mean)':<22}{encoding:<10}{chars:>10.0f}{count:>10.0f}")
+        print(f"Full graph: {1 - full['compact'] / full['repr']:.0%} fewer tokens, "
+              f"deterministic across build orders: {is_deterministic(nodes, arcs)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+# Cold start and latency under mixed load of the servers, with the offline stub LLM.
+# Run it on two checkouts to compare them.
+#   python benchmarks/bench_server.py startup --runs 10
+#   python benchmarks/bench_server.py load --requests 500 --concurrency 32 --latency 0.2
+# 'load' drives the FastAPI app in process (httpx ASGI transport) against the graphs and
+# sessions in files/ and memory/, so it needs at least one of each.
+
+STARTUP_TARGETS = ("mcp-fastapi-server.py", "mcp-server.py", "messages.query_llm")
+# Share of each request kind in the load mix
+MIX = (("resources/list", 2), ("resources/get", 2), ("messages/get", 2), ("tools/query", 3),
+       ("tools/dependencies", 1))
+
+_IMPORT = """
+import importlib, importlib.util, sys, time
+start = time.perf_counter()
+target = sys.argv[1]
+if target.endswith(".py"):
+    spec = importlib.util.spec_from_file_location("server", target)
+    spec.loader.exec_module(importlib.util.module_from_spec(spec))
+else:
+    importlib.import_module(target)
+print(time.perf_counter() - start)
+"""
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+def import_time(target: str, backend: str):
+    # Seconds to import the target in a fresh interpreter, or the error that stopped it
+    env = dict(os.environ, LLM_BACKEND=backend,
+               PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    result = subprocess.run([sys.executable, "-c", _IMPORT, target], cwd=ROOT, env=env,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        return None, result.stderr.strip().splitlines()[-1]
+    return float(result.stdout.strip().splitlines()[-1]), None
+
+def startup(runs: int, backend: str):
+    print(f"Cold start, LLM_BACKEND={backend}, median of {runs} runs")
+    for target in STARTUP_TARGETS:
+        times = []
+        for _ in range(runs):
+            seconds, error = import_time(target, backend)
+            if error:
+                print(f"  {target:<26} failed: {error}")
+                break
+            times.append(seconds)
+        else:
+            print(f"  {target:<26} {statistics.median(times) * 1000:8.1f} ms")
+
+def _load_server():
+    import importlib.util
+    spec = importlib.util.spec_from_file_location("fastapi_server", os.path.join(ROOT, "mcp-fastapi-server.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.app
+
+async def run_load(requests: int, concurrency: int, seed: int) -> dict:
+    import httpx
+    app = _load_server()
+    rng = random.Random(seed)
+    latencies = {name: [] for name, _ in MIX}
+    failures = {name: 0 for name, _ in MIX}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        resource = (await client.get("/resources/list")).json()["resources"][0]
+        session = (await client.get("/messages/list")).json()["resources"][0]
+        graph = os.path.join("files", resource)
+        page = (await client.post("/resources/get", json={"resource_name": resource, "node_limit": 10})).json()
+        modules = page["nodes"]
+        payloads = {
+            "resources/list": lambda: ("GET", "/resources/list", None),
+            "resources/get": lambda: ("POST", "/resources/get", {"resource_name": resource}),
+            "messages/get": lambda: ("POST", "/messages/get", {"session_id": session, "limit": 20}),
+            "tools/query": lambda: ("POST", "/tools/query", {
+                "graph": graph, "session_id": session, "use_cache": False,
+                "query": f"What does {rng.choice(modules).rsplit('.', 1)[-1]} do?"}),
+            "tools/dependencies": lambda: ("POST", "/tools/dependencies",
+                                           {"graph": graph, "module": rng.choice(modules)}),
+        }
+        kinds = rng.choices([name for name, _ in MIX], weights=[weight for _, weight in MIX], k=requests)
+        slots = asyncio.Semaphore(concurrency)
+
+        async def one(kind: str):
+            method, url, body = payloads[kind]()
+            async with slots:
+                start = time.perf_counter()
+                response = await client.request(method, url, json=body)
+                latencies[kind].append(time.perf_counter() - start)
+            if response.status_code != 200:
+                failures[kind] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(kind) for kind in kinds))
+        elapsed = time.perf_counter() - start
+    return {"elapsed": elapsed, "latencies": latencies, "failures": failures}
+
+def load(requests: int, concurrency: int, latency: float, seed: int):
+    # The stub reads its settings at import
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["FAKE_LLM_LATENCY"] = str(latency)
+    os.chdir(ROOT)
+    result = asyncio.run(run_load(requests, concurrency, seed))
+    print(f"{requests} requests, concurrency {concurrency}, stub latency {latency}s: "
+          f"{requests / result['elapsed']:.1f} requests/s")
+    print(f"  {'endpoint':<22}{'count':>7}{'p50 ms':>10}{'p99 ms':>10}{'failed':>8}")
+    everything = []
+    for name, _ in MIX:
+        values = result["latencies"][name]
+        everything.extend(values)
+        if values:
+            print(f"  {name:<22}{len(values):>7}{percentile(values, 0.5) * 1000:>10.1f}"
+                  f"{percentile(values, 0.99) * 1000:>10.1f}{result['failures'][name]:>8}")
+    print(f"  {'all':<22}{len(everything):>7}{percentile(everything, 0.5) * 1000:>10.1f}"
+          f"{percentile(everything, 0.99) * 1000:>10.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark server cold start and latency under mixed load")
+    commands = parser.add_subparsers(dest="command", required=True)
+    start = commands.add_parser("startup", help="Time importing each server in a fresh interpreter")
+    start.add_argument("--runs", type=int, default=5)
+    start.add_argument("--backend", default="azure", help="LLM_BACKEND for the imports (default: azure)")
+    mixed = commands.add_parser("load", help="Concurrent mixed requests against the FastAPI app")
+    mixed.add_argument("--requests", type=int, default=500)
+    mixed.add_argument("--concurrency", type=int, default=32)
+    mixed.add_argument("--latency", type=float, default=0.2, help="Seconds per stub completion")
+    mixed.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.command == "startup":
+        startup(args.runs, args.backend)
+    else:
+        load(args.requests, args.concurrency, args.latency, args.seed)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(__file__))
+
+# The stub answers instantly and offline; the client reads this at import
+os.environ["LLM_BACKEND"] = "fake"
+
+from synthetic_repo import generate_repo
+from tools.GraphBuilder import GraphBuilder
+from tools.graphStore import GraphStore
+from tools.readGraph import load_graph
+from insturctions.contextBuilder import GraphContext
+from insturctions.instructionCreate import create_insturction
+from messages.query_llm import send_query_to_llm
+from messages.tokens import count_tokens
+
+# End-to-end pipeline benchmark on synthetic repositories: times each phase (walk, parse,
+# link, export, load, subgraph and full prompt render, stub llm) and its peak memory, and writes the results as JSON
+# so that two runs can be compared.
+#   python benchmarks/bench_suite.py --modules 1000 5000 --imports 8 --lines 120 --depth 3
+#   python benchmarks/bench_suite.py --modules 1000 5000 --compare benchmarks/results/<earlier run>.json
+
+PHASES = ("walk", "parse", "link", "export", "load", "prompt", "full_prompt", "llm")
+QUERIES = 5
+# A phase this many times slower than in the baseline is reported as a regression
+REGRESSION_RATIO = 1.25
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "-C", os.path.dirname(os.path.abspath(__file__)), "rev-parse", "--short", "HEAD"],
+                              capture_output=True, check=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def make_queries(modules: int, count: int, seed: int = 0) -> list:
+    # Questions naming generated modules, so the subgraph prompt has something to match
+    rng = random.Random(seed)
+    return [f"What depends on mod_{i} and what does it import?" for i in rng.sample(range(modules), min(count, modules))]
+
+def run_pipeline(repo: str, prefix: str, fmt: str, workers: int, queries: list, clock, store: GraphStore) -> dict:
+    # clock(phase, fn) runs one phase and returns its result; everything else is bookkeeping
+    builder = GraphBuilder(repo, filter_prefix=prefix, workers=workers, store=store)
+    clock("walk", builder._collect_nodes)
+    summaries = clock("parse", lambda: builder._parse(workers > 1))
+    clock("link", lambda: builder._link(summaries))
+    # export_graph announces the path it writes to
+    with contextlib.redirect_stdout(io.StringIO()):
+        path = clock("export", lambda: builder.export_graph(fmt))
+    nodes, arcs = clock("load", lambda: load_graph(path))
+
+    def render():
+        context = GraphContext(nodes, arcs)
+        return [context.system_prompt(q) for q in queries]
+    prompts = clock("prompt", render)
+    full_prompt = clock("full_prompt", lambda: create_insturction(nodes, arcs))
+
+    def ask():
+        return [send_query_to_llm([{"role": "system", "content": p}, {"role": "user", "content": q}])
+                for p, q in zip(prompts, queries)]
+    clock("llm", ask)
+    export_bytes = os.path.getsize(path)
+    os.remove(path)
+    return {"nodes": len(nodes), "arcs": len(arcs), "export_bytes": export_bytes,
+            "prompt_tokens": max(count_tokens(p) for p in prompts) if prompts else 0,
+            "full_prompt_tokens": count_tokens(full_prompt)}
+
+def timed_run(repo: str, prefix: str, fmt: str, workers: int, queries: list, store: GraphStore) -> tuple:
+    seconds = {}
+
+    def clock(phase, fn):
+        start = time.perf_counter()
+        result = fn()
+        seconds[phase] = time.perf_counter() - start
+        return result
+    return run_pipeline(repo, prefix, fmt, workers, queries, clock, store), seconds
+
+def traced_run(repo: str, prefix: str, fmt: str, workers: int, queries: list, store: GraphStore) -> dict:
+    # Separate pass, tracemalloc slows everything down too much to time under it.
+    # Worker processes are not traced, so parse memory is only meaningful with --workers 1.
+    peaks = {}
+
+    def clock(phase, fn):
+        tracemalloc.reset_peak()
+        result = fn()
+        current, peak = tracemalloc.get_traced_memory()
+        peaks[phase] = {"peak_mb": round(peak / 1e6, 3), "retained_mb": round(current / 1e6, 3)}
+        return result
+    tracemalloc.start()
+    try:
+        run_pipeline(repo, prefix, fmt, workers, queries, clock, store)
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+def bench_size(modules: int, args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        repo = os.path.join(tmp, "repo")
+        repo_summary = generate_repo(repo, modules, args.imports, args.lines, args.depth, args.branching, args.seed)
+        # Exports go to a store of their own, never into the caller's files/ and its index
+        store = GraphStore(folder=os.path.join(tmp, "files"), index_path=os.path.join(tmp, "graphs.sqlite"))
+        queries = make_queries(modules, QUERIES, args.seed)
+        samples = {phase: [] for phase in PHASES}
+        graph = None
+        for _ in range(args.repeat):
+            graph, seconds = timed_run(repo, "src", args.format, args.workers, queries, store)
+            for phase in PHASES:
+                samples[phase].append(round(seconds[phase], 6))
+        memory = traced_run(repo, "src", args.format, args.workers, queries, store) if not args.no_memory else {}
+    phases = {}
+    for phase in PHASES:
+        phases[phase] = {"seconds": round(statistics.median(samples[phase]), 6), "samples": samples[phase]}
+        phases[phase].update(memory.get(phase, {}))
+    return {"modules": modules, "source_bytes": repo_summary["bytes"], "packages": repo_summary["packages"],
+            **graph, "phases": phases}
+
+def compare(results: dict, baseline: dict) -> list:
+    # (modules, phase, baseline seconds, current seconds) for phases slower than REGRESSION_RATIO
+    previous = {run["modules"]: run for run in baseline.get("runs", [])}
+    regressions = []
+    print(f"\nAgainst {baseline.get('commit') or 'baseline'} from {baseline.get('created', '?')}:")
+    for run in results["runs"]:
+        old = previous.get(run["modules"])
+        if old is None:
+            continue
+        cells = []
+        for phase in PHASES:
+            before, after = old["phases"].get(phase, {}).get("seconds"), run["phases"][phase]["seconds"]
+            if not before:
+                cells.append(f"{phase} n/a")
+                continue
+            ratio = after / before
+            cells.append(f"{phase} x{ratio:.2f}")
+            if ratio > REGRESSION_RATIO:
+                regressions.append((run["modules"], phase, before, after))
+        print(f"  {run['modules']:>7}  " + "  ".join(cells))
+    for modules, phase, before, after in regressions:
+        print(f"  slower: {phase} at {modules} modules, {before:.4f} s -> {after:.4f} s")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline on synthetic repositories")
+    parser.add_argument("--modules", type=int, nargs="+", default=[500, 2000])
+    parser.add_argument("--imports", type=int, default=6, help="Average imports per module")
+    parser.add_argument("--lines", type=int, default=80, help="Approximate lines per module")
+    parser.add_argument("--depth", type=int, default=3, help="Package nesting below src/")
+    parser.add_argument("--branching", type=int, default=4, help="Subpackages per package")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per size, the median is reported")
+    parser.add_argument("--workers", type=int, default=1, help="Parse processes; 1 parses serially")
+    parser.add_argument("--format", choices=["json", "compact"], default="json", help="Export format")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc pass")
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    created = datetime.now(timezone.utc)
+    results = {
+        "suite": "pipeline",
+        "created": created.isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "params": {"imports": args.imports, "lines": args.lines, "depth": args.depth, "branching": args.branching,
+                   "seed": args.seed, "repeat": args.repeat, "workers": args.workers, "format": args.format},
+        "runs": [],
+    }
+    print(f"{'modules':>8} {'arcs':>8} " + " ".join(f"{p:>11}" for p in PHASES) + f" {'peak MB':>8}")
+    for modules in args.modules:
+        run = bench_size(modules, args)
+        results["runs"].append(run)
+        peak = max((p.get("peak_mb", 0) for p in run["phases"].values()), default=0)
+        print(f"{modules:>8} {run['arcs']:>8} " + " ".join(f"{run['phases'][p]['seconds']:>11.4f}" for p in PHASES)
+              + f" {peak:>8.1f}")
+
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), "results",
+                                         created.strftime("%Y%m%dT%H%M%SZ") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(results, baseline):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
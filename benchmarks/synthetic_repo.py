@@ -0,0 +1,116 @@
+import argparse
+import os
+import random
+
+# Deterministic synthetic Python repository for the benchmarks: the same parameters and
+# seed always produce byte-identical files, so runs on different machines are comparable.
+#   python benchmarks/synthetic_repo.py /tmp/synthetic --modules 2000 --imports 8 --lines 120 --depth 3
+
+def package_of(index: int, depth: int, branching: int) -> list:
+    # Modules are spread over branching ** depth leaf packages, round robin
+    parts = []
+    for level in range(depth):
+        parts.append(f"pkg{(index // branching ** level) % branching}")
+    return parts
+
+def module_names(modules: int, depth: int, branching: int, prefix: str = "src") -> list:
+    return [".".join([prefix] + package_of(i, depth, branching) + [f"mod_{i}"]) for i in range(modules)]
+
+def _import_line(source: str, target: str, symbol: str, rng: random.Random) -> str:
+    # Absolute, dotted-suffix and relative imports, the forms GraphBuilder has to resolve
+    source_pkg, target_pkg = source.rsplit(".", 1)[0], target.rsplit(".", 1)[0]
+    style = rng.random()
+    if source_pkg == target_pkg and style < 0.5:
+        return f"from .{target.rsplit('.', 1)[1]} import {symbol}"
+    if style < 0.7:
+        return f"from {target} import {symbol}"
+    return f"from {target.split('.', 1)[1]} import {symbol}"
+
+def module_source(index: int, names: list, by_package: dict, imports: int, lines: int,
+                  rng: random.Random) -> str:
+    name = names[index]
+    local = by_package[name.rsplit(".", 1)[0]]
+    header = ['"""Synthetic module %d."""' % index, "import os", "import json"]
+    used = []
+    # Density is an average: each module gets between 0 and twice the requested imports
+    for _ in range(rng.randint(0, 2 * imports)):
+        # Most imports stay inside the package, like real code
+        if rng.random() < 0.6:
+            target = rng.choice(local)
+        else:
+            target = rng.randrange(len(names))
+        if target == index:
+            continue
+        symbol = rng.choice((f"Model{target}", f"func_{target}"))
+        header.append(_import_line(name, names[target], symbol, rng))
+        # About one import in ten is never used, so no arc should come from it
+        if rng.random() < 0.9:
+            used.append(symbol)
+    body = ["", "", f"class Model{index}:", f"    name = {name!r}", "",
+            "    def __init__(self, value=None):", "        self.value = value", "",
+            f"def func_{index}(value=None):"]
+    body.append(f"    return Model{index}(value)")
+    body += ["", "", "def run():", "    results = []"]
+    for symbol in used:
+        call = f"{symbol}()" if symbol.startswith("func_") else f"{symbol}(os.sep)"
+        body.append(f"    results.append({call})")
+    body.append("    return json.dumps([repr(r) for r in results])")
+    # Filler code up to the requested length, with the names and nodes real modules have
+    filler = 0
+    while len(header) + len(body) < lines:
+        body += ["", "", f"def helper_{filler}(items, scale={filler}):",
+                 "    total = 0",
+                 "    for position, item in enumerate(items):",
+                 "        if item is None:",
+                 "            continue",
+                 "        total += position * scale + len(str(item))",
+                 f"    return {{'helper': {filler}, 'total': total}}"]
+        filler += 1
+    return "\n".join(header + body) + "\n"
+
+def generate_repo(root: str, modules: int = 1000, imports: int = 6, lines: int = 80, depth: int = 3,
+                  branching: int = 4, seed: int = 0, prefix: str = "src") -> dict:
+    # Returns a summary of what was written; files are only rewritten when their content changes
+    rng = random.Random(seed)
+    names = module_names(modules, depth, branching, prefix)
+    by_package = {}
+    for i, name in enumerate(names):
+        by_package.setdefault(name.rsplit(".", 1)[0], []).append(i)
+    total_bytes = 0
+    packages = set()
+    for i, name in enumerate(names):
+        parts = name.split(".")
+        directory = os.path.join(root, *parts[:-1])
+        if parts[:-1] and tuple(parts[:-1]) not in packages:
+            os.makedirs(directory, exist_ok=True)
+            for level in range(1, len(parts)):
+                packages.add(tuple(parts[:level]))
+        source = module_source(i, names, by_package, imports, lines, rng).encode("utf-8")
+        total_bytes += len(source)
+        path = os.path.join(directory, parts[-1] + ".py")
+        if not os.path.isfile(path) or os.path.getsize(path) != len(source) or open(path, "rb").read() != source:
+            with open(path, "wb") as f:
+                f.write(source)
+    for package in packages:
+        init = os.path.join(root, *package, "__init__.py")
+        if not os.path.isfile(init):
+            open(init, "w").close()
+    return {"modules": modules, "packages": len(packages), "bytes": total_bytes, "prefix": prefix}
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic Python repository")
+    parser.add_argument("root", help="Directory to write the repository to")
+    parser.add_argument("--modules", type=int, default=1000)
+    parser.add_argument("--imports", type=int, default=6, help="Average imports per module")
+    parser.add_argument("--lines", type=int, default=80, help="Approximate lines per module")
+    parser.add_argument("--depth", type=int, default=3, help="Package nesting below the prefix")
+    parser.add_argument("--branching", type=int, default=4, help="Subpackages per package")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    summary = generate_repo(args.root, args.modules, args.imports, args.lines, args.depth, args.branching, args.seed)
+    print(f"{summary['modules']} modules in {summary['packages']} packages, "
+          f"{summary['bytes'] / 1e6:.1f} MB under {os.path.join(args.root, summary['prefix'])}")
+
+if __name__ == "__main__":
+    main()
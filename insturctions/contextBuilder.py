@@ -0,0 +1,156 @@
+import difflib
+import re
+from collections import OrderedDict, deque
+from insturctions.instructionCreate import create_insturction, PROMPT_GRAPH_ENCODING
+from insturctions.graphEncoding import module_cost, arc_cost
+from messages.tokens import count_tokens
+from tools.graphQuery import cached_graph_query
+from tools.symbolIndex import cached_symbol_index
+from tools.metrics import phase
+
+DEFAULT_HOPS = 1
+DEFAULT_TOKEN_BUDGET = 6000
+# Modules used as the starting point when a query names no module at all
+FALLBACK_SEEDS = 5
+# Modules named in a query that get exact structural facts when grounding is on
+GROUNDING_MODULES = 3
+
+def aggregate_arcs(arcs: list) -> list:
+    # One entry per (source, target) pair with all the symbols it imports
+    pairs = OrderedDict()
+    for arc in arcs:
+        pairs.setdefault((arc["source"], arc["target"]), set()).add(arc["symbol"])
+    return [{"source": s, "target": t, "symbols": sorted(symbols)} for (s, t), symbols in pairs.items()]
+
+def neighbourhood(seeds: list, adjacency: dict, hops: int) -> dict:
+    # Breadth-first over arcs in both directions: module -> distance from the nearest seed
+    distance = {seed: 0 for seed in seeds}
+    queue = deque(seeds)
+    while queue:
+        name = queue.popleft()
+        if distance[name] >= hops:
+            continue
+        for other in adjacency.get(name, ()):
+            if other not in distance:
+                distance[other] = distance[name] + 1
+                queue.append(other)
+    return distance
+
+class GraphContext:
+    # Indexes built once per graph so that selecting context for a query only
+    # touches the modules around the ones it mentions, not the whole graph
+    def __init__(self, nodes: list, arcs: list):
+        self.nodes = nodes
+        aggregated = aggregate_arcs(arcs)
+        self.by_pair = {(a["source"], a["target"]): a for a in aggregated}
+        self.adjacency = {}
+        for arc in aggregated:
+            self.adjacency.setdefault(arc["source"], set()).add(arc["target"])
+            self.adjacency.setdefault(arc["target"], set()).add(arc["source"])
+        # Lower-cased dotted suffix -> modules, covering full names and last components
+        self.by_suffix = {}
+        for name in nodes:
+            parts = name.lower().split(".")
+            for i in range(len(parts)):
+                self.by_suffix.setdefault(".".join(parts[i:]), []).append(name)
+        self.last_components = sorted(set(n.lower().rsplit(".", 1)[-1] for n in nodes))
+        self.busiest = sorted(nodes, key=lambda n: (-len(self.adjacency.get(n, ())), n))[:FALLBACK_SEEDS]
+        self.nbytes = 300 * len(aggregated) + 200 * len(nodes)
+
+    def match_modules(self, query: str) -> list:
+        # Rank modules by how directly the query mentions them
+        words = set(w.lower().strip(".") for w in re.findall(r"[A-Za-z_][\w.]*", query))
+        parts = set(p for w in words for p in w.split(".") if p)
+        scores = {}
+        def score(names, value):
+            for name in names:
+                scores[name] = max(scores.get(name, 0), value)
+        for word in words:
+            for name in self.by_suffix.get(word, ()):
+                if name.lower() == word:
+                    score([name], 4)
+                elif "." in word:
+                    score([name], 3)
+        for part in parts:
+            score([n for n in self.by_suffix.get(part, ()) if n.lower().rsplit(".", 1)[-1] == part], 2)
+        if not scores:
+            # Typos only; difflib is too slow to run over every module name when something matched
+            for part in parts:
+                for close in difflib.get_close_matches(part, self.last_components, n=3, cutoff=0.85):
+                    score(self.by_suffix.get(close, ()), 1)
+        return sorted(scores, key=lambda n: (-scores[n], n))
+
+    def select_subgraph(self, query: str, hops: int = DEFAULT_HOPS, token_budget: int = DEFAULT_TOKEN_BUDGET):
+        adjacency = self.adjacency
+        seeds = self.match_modules(query) or self.busiest
+        distance = neighbourhood(seeds, adjacency, hops)
+        # Closest modules first, busier ones before quieter ones at the same distance
+        seed_rank = {name: i for i, name in enumerate(seeds)}
+        candidates = sorted(distance, key=lambda n: (distance[n], seed_rank.get(n, 0), -len(adjacency.get(n, ())), n))
+
+        included = set()
+        selected_nodes = []
+        selected_arcs = []
+        used = 0
+        for name in candidates:
+            # Arcs this module adds: the ones linking it to modules already in the context
+            new_arcs = []
+            for other in adjacency.get(name, ()):
+                if other in included or other == name:
+                    new_arcs.extend(self.by_pair[pair] for pair in {(name, other), (other, name)} if pair in self.by_pair)
+            if PROMPT_GRAPH_ENCODING == "repr":
+                cost = count_tokens(repr(name)) + sum(count_tokens(repr(a)) for a in new_arcs)
+            else:
+                cost = module_cost(name) + sum(arc_cost(a) for a in new_arcs)
+            if selected_nodes and used + cost > token_budget:
+                break
+            used += cost
+            included.add(name)
+            selected_nodes.append(name)
+            selected_arcs.extend(new_arcs)
+        return selected_nodes, selected_arcs
+
+    def system_prompt(self, query: str, hops: int = DEFAULT_HOPS, token_budget: int = DEFAULT_TOKEN_BUDGET) -> str:
+        sub_nodes, sub_arcs = self.select_subgraph(query, hops, token_budget)
+        return create_insturction(sub_nodes, sub_arcs, partial=True)
+
+def build_system_prompt(nodes: list, arcs: list, query: str, mode: str = "subgraph", hops: int = DEFAULT_HOPS,
+                        token_budget: int = DEFAULT_TOKEN_BUDGET) -> str:
+    if mode == "full":
+        return create_insturction(nodes, arcs)
+    return GraphContext(nodes, arcs).system_prompt(query, hops, token_budget)
+
+def cached_system_prompt(graph, query: str, mode: str = "subgraph", hops: int = DEFAULT_HOPS,
+                         token_budget: int = DEFAULT_TOKEN_BUDGET) -> str:
+    # graph is a tools.graphCache entry, so the full prompt and the context indexes
+    # are built once per graph file instead of once per query
+    with phase("prompt"):
+        if mode == "full":
+            return graph.memo("full_prompt", lambda: create_insturction(graph.nodes, graph.arcs))
+        context = graph.memo("context", lambda: GraphContext(graph.nodes, graph.arcs))
+        return context.system_prompt(query, hops, token_budget)
+
+def grounding_facts(graph, query: str) -> str:
+    # Exact reachability, cycle and layer facts for the modules the query names, so the
+    # model can quote them instead of inferring them from the listed arcs
+    context = graph.memo("context", lambda: GraphContext(graph.nodes, graph.arcs))
+    modules = context.match_modules(query)[:GROUNDING_MODULES]
+    if not modules:
+        return ""
+    lines = cached_graph_query(graph).facts(modules)
+    return "Exact facts computed from the full dependency graph:\n" + "\n".join(lines)
+
+def symbol_facts(graph, query: str) -> str:
+    # Definitions of the modules the query names and which modules' symbols they use, read
+    # from source on demand; empty when the repository of the graph isn't known
+    index = cached_symbol_index(graph)
+    if index is None:
+        return ""
+    context = graph.memo("context", lambda: GraphContext(graph.nodes, graph.arcs))
+    modules = context.match_modules(query)[:GROUNDING_MODULES]
+    if not modules:
+        return ""
+    lines = index.facts(modules, set(re.findall(r"[A-Za-z_]\w*", query)))
+    if not lines:
+        return ""
+    return "Symbol-level dependencies read from the source of the modules in the question:\n" + "\n".join(lines)
@@ -0,0 +1,38 @@
+from collections import OrderedDict
+from messages.tokens import count_tokens
+
+# Aliases look like m1, m2, ...; costs of not yet aliased modules are estimated with this one
+_SAMPLE_ALIAS = "m100"
+
+def _arc_symbols(arc: dict) -> list:
+    # Raw arcs carry one symbol, arcs aggregated per module pair a list of them
+    return arc["symbols"] if "symbols" in arc else [arc["symbol"]]
+
+def module_aliases(nodes) -> OrderedDict:
+    # module -> alias, in sorted module order, so the same modules always get the same aliases
+    return OrderedDict((name, f"m{i}") for i, name in enumerate(sorted(set(nodes)), 1))
+
+def encode_graph(nodes, arcs) -> str:
+    # The graph as a legend of module aliases and one adjacency line per importing module,
+    # each target followed by the symbols imported from it. Everything is sorted, so equal
+    # graphs give the same text whatever order their nodes and arcs were built in.
+    aliases = module_aliases(list(nodes) + [n for a in arcs for n in (a["source"], a["target"])])
+    imports = {}
+    for arc in arcs:
+        imports.setdefault(arc["source"], {}).setdefault(arc["target"], set()).update(_arc_symbols(arc))
+    lines = ["Modules (alias = module):"]
+    lines.extend(f"{alias} = {name}" for name, alias in aliases.items())
+    lines.append("Imports (module -> imported module: symbols; ...):")
+    for source in sorted(imports):
+        targets = imports[source]
+        lines.append(f"{aliases[source]} -> " + "; ".join(
+            f"{aliases[target]}: {', '.join(sorted(targets[target]))}" for target in sorted(targets)))
+    return "\n".join(lines)
+
+def module_cost(name: str) -> int:
+    # Tokens one more module adds to the legend
+    return count_tokens(f"{_SAMPLE_ALIAS} = {name}\n")
+
+def arc_cost(arc: dict) -> int:
+    # Tokens one more (source, target) pair adds to an adjacency line
+    return count_tokens(f"; {_SAMPLE_ALIAS}: {', '.join(_arc_symbols(arc))}")
@@ -1,12 +1,36 @@
-def create_insturction(nodes,arcs) -> str:
+import os
+from insturctions.graphEncoding import encode_graph
 
-    return(f"""
+# How the graph is written into the prompt: 'compact' (aliased adjacency lists, graph first,
+# so providers can cache the prompt prefix) or 'repr' (Python lists of nodes and arc dicts)
+PROMPT_GRAPH_ENCODING = os.getenv("PROMPT_GRAPH_ENCODING", "compact")
+
+PARTIAL_SCOPE = "Only the part of the graph around the modules in the question is included: arcs are grouped per module pair with all the symbols imported along them."
+
+def create_insturction(nodes,arcs,partial=False,encoding=None) -> str:
+    if (encoding or PROMPT_GRAPH_ENCODING) == "repr":
+        scope = f"\n    {PARTIAL_SCOPE}" if partial else ""
+        return(f"""
     You are a code analyzer. You have been provided with a dependency graph that represents project modules and the dependencies between these modules.
     Your task is to answers questions specifically related to the modules. Your answer should help understand the functionality, importance, and relationships of the specified module within the context of the overall project.
     Dependency Graph Build:
     Nodes - a list of module names, each module is a node in the graph.
-    Arcs - a list of tuples, each tuple represents a directed edge from one module to another, along with the type of dependency (example: read(module that uses), write(module that is being used), timeOut(the dependency))
+    Arcs - a list of tuples, each tuple represents a directed edge from one module to another, along with the type of dependency (example: read(module that uses), write(module that is being used), timeOut(the dependency)){scope}
     The dependency graph is described as follows:
     Nodes: {nodes}
     Arcs: {arcs}
     """)
+
+    # The graph comes first and the text after it doesn't depend on the question, so the
+    # prompt of a whole graph (context_mode "full") is byte-identical across turns and
+    # sessions; a subgraph prompt depends on the question it was selected for
+    scope = f"{PARTIAL_SCOPE}\n" if partial else ""
+    return(f"""Dependency graph:
+{encode_graph(nodes, arcs)}
+
+You are a code analyzer. You have been provided with the dependency graph above, which represents project modules and the dependencies between these modules.
+Your task is to answers questions specifically related to the modules. Your answer should help understand the functionality, importance, and relationships of the specified module within the context of the overall project.
+Dependency Graph Build:
+Modules - each module of the project has a short alias (m1, m2, ...) used in place of its name; refer to modules by their full names in your answer.
+Imports - one line per module that imports others: the module's alias, then each module it depends on with the symbols it imports from it.
+{scope}""")
@@ -0,0 +1,204 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from tools.GraphBuilder import GraphBuilder, BuildCancelled
+from tools.shardedBuilder import ShardedBuilder
+from tools.repoWalker import normalize_prefixes
+from tools.DependencyAnalyzer import MAX_FILE_BYTES, LARGE_FILES
+from tools.AnalysisCache import AnalysisCache
+from tools.graphStore import graph_store, source_fingerprint
+from tools.metrics import current_trace_id, phase
+from memory.memoryOrch import create_session, session_exists
+from .retention import maybe_collect
+
+MAX_CONCURRENT_JOBS = int(os.getenv("ANALYZE_MAX_JOBS", "2"))
+# Finished jobs are kept around this long so clients can still poll their result
+FINISHED_JOB_TTL = 3600
+
+ACTIVE_STATES = ("queued", "running")
+
+class AnalyzeJob:
+    def __init__(self, repo_path: str, options: dict):
+        self.job_id = str(uuid.uuid4())
+        self.repo_path = repo_path
+        self.options = options
+        self.status = "queued"
+        self.parsed = 0
+        self.total = 0
+        self.graph_path = None
+        # True when the graph was already stored: the repository was unchanged, or the
+        # build produced a graph identical to an earlier one
+        self.reused = False
+        self.session_id = None
+        self.large_files = []
+        # Shards of a sharded build, and whether each one was parsed again
+        self.shards = []
+        # Seconds per build phase, and the trace id of the request that started the job
+        self.timings = {}
+        self.trace_id = current_trace_id()
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.cancel_event = threading.Event()
+        self.future = None
+
+    def progress(self, parsed: int, total: int):
+        self.parsed = parsed
+        self.total = total
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "repo": self.repo_path,
+            "parsed": self.parsed,
+            "total": self.total,
+            "graph_path": self.graph_path,
+            "reused": self.reused,
+            "session_id": self.session_id,
+            "large_files": self.large_files,
+            "shards": self.shards,
+            "timings": {phase: round(seconds, 4) for phase, seconds in list(self.timings.items())},
+            "trace_id": self.trace_id,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+class JobManager:
+    def __init__(self, max_workers: int = MAX_CONCURRENT_JOBS):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analyze")
+        self.jobs = {}
+        self.active = {}
+        self.lock = threading.Lock()
+
+    def _key(self, repo_path: str, options: dict):
+        # Options that only change how the graph is built (pool size, cache, shards) don't change the graph
+        return (os.path.realpath(repo_path), normalize_prefixes(options.get("prefixes")), bool(options.get("use_git")),
+                options.get("format") or "json", options.get("max_file_bytes") or MAX_FILE_BYTES,
+                options.get("large_files") or LARGE_FILES)
+
+    def submit(self, repo_path: str, **options):
+        # Returns (job, shared) where shared means an identical job was already in flight
+        key = self._key(repo_path, options)
+        with self.lock:
+            self._expire()
+            job = self.active.get(key)
+            if job is not None and job.status in ACTIVE_STATES:
+                return job, True
+            job = AnalyzeJob(repo_path, options)
+            self.jobs[job.job_id] = job
+            self.active[key] = job
+            job.future = self.executor.submit(self._run, job, key)
+            return job, False
+
+    def get(self, job_id: str):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.status not in ACTIVE_STATES:
+                return job
+            job.cancel_event.set()
+            if job.future.cancel():
+                self._finish(job, "cancelled")
+            return job
+
+    def _finish(self, job: AnalyzeJob, status: str, error: str = None):
+        job.status = status
+        job.error = error
+        job.finished = time.time()
+        key = self._key(job.repo_path, job.options)
+        if self.active.get(key) is job:
+            del self.active[key]
+
+    def _expire(self):
+        now = time.time()
+        for job_id, job in list(self.jobs.items()):
+            if job.finished is not None and now - job.finished > FINISHED_JOB_TTL:
+                del self.jobs[job_id]
+
+    def _session(self, job: AnalyzeJob) -> str:
+        # A graph that was already stored comes back with the session it was handed out with,
+        # as long as that session still exists; only new graphs start a new session
+        if job.reused:
+            session_id = graph_store.session_for(job.graph_path)
+            if session_id and session_exists(session_id):
+                return session_id
+        session_id = create_session()
+        graph_store.set_session(job.graph_path, session_id)
+        return session_id
+
+    def _check_cancelled(self, job: AnalyzeJob):
+        # The builder only checks while it walks and parses; this covers the steps around it
+        if job.cancel_event.is_set():
+            raise BuildCancelled("Build cancelled")
+
+    def _run(self, job: AnalyzeJob, key):
+        with self.lock:
+            if job.cancel_event.is_set():
+                # Cancelled after a worker picked it up, too late for future.cancel()
+                self._finish(job, "cancelled")
+                return job
+            job.status = "running"
+            job.started = time.time()
+        opts = job.options
+        cache = AnalysisCache() if opts.get("use_cache", True) else None
+        try:
+            # Stamps are taken before parsing, so a file edited during the build gives
+            # another fingerprint next time
+            with phase("fingerprint", job.timings):
+                fingerprint = source_fingerprint(job.repo_path, key[1:], bool(opts.get("use_git")), key[1])
+                stored = graph_store.lookup_source(fingerprint) if cache is not None else None
+            self._check_cancelled(job)
+            if stored is not None:
+                job.graph_path, entry = stored
+                job.large_files = entry["large_files"]
+                job.parsed = job.total = entry["nodes"] or 0
+                job.reused = True
+            else:
+                max_file_bytes = opts.get("max_file_bytes") or MAX_FILE_BYTES
+                large_files = opts.get("large_files") or LARGE_FILES
+                if opts.get("shards"):
+                    # Shards keep their own partial graphs, so they work with or without the file cache
+                    builder = ShardedBuilder(job.repo_path, filter_prefix=key[1], workers=opts.get("workers"),
+                                             use_cache=cache is not None, use_git=bool(opts.get("use_git")),
+                                             max_file_bytes=max_file_bytes, large_files=large_files)
+                else:
+                    builder = GraphBuilder(job.repo_path, filter_prefix=key[1], workers=opts.get("workers"),
+                                           chunksize=opts.get("chunksize"), cache=cache,
+                                           use_git=bool(opts.get("use_git")), max_file_bytes=max_file_bytes,
+                                           large_files=large_files)
+                builder.timings = job.timings
+                builder.build(parallel=opts.get("parallel"), progress=job.progress, cancel_event=job.cancel_event)
+                job.large_files = builder.large_file_report
+                job.shards = getattr(builder, "shard_report", [])
+                self._check_cancelled(job)
+                job.graph_path = builder.export_graph(opts.get("format") or "json")
+                job.reused = builder.reused
+                graph_store.record_source(fingerprint, job.graph_path)
+            # A cancelled job hands out no session
+            self._check_cancelled(job)
+            job.session_id = self._session(job)
+            with self.lock:
+                self._finish(job, "done")
+        except BuildCancelled:
+            with self.lock:
+                self._finish(job, "cancelled")
+        except Exception as e:
+            with self.lock:
+                self._finish(job, "failed", str(e))
+        finally:
+            if cache is not None:
+                cache.close()
+        maybe_collect()
+        return job
+
+# Shared by every request handled by this process
+job_manager = JobManager()
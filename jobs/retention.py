@@ -0,0 +1,36 @@
+import os
+import threading
+from tools.graphCache import graph_cache
+from tools.graphStore import graph_store
+from memory.memoryOrch import expire_sessions
+
+# Sessions without a new message for this many days are removed (0 keeps them)
+SESSION_RETENTION_DAYS = float(os.getenv("SESSION_RETENTION_DAYS", "30"))
+# Sessions that never got a message are removed after this many seconds (0, the default,
+# keeps them: analyze and watch hand out sessions that a client may only use much later)
+EMPTY_SESSION_TTL = float(os.getenv("EMPTY_SESSION_TTL", "0"))
+# The collector runs by itself at most this often, counted across all workers
+GC_INTERVAL = float(os.getenv("GC_INTERVAL", "3600"))
+
+def collect_garbage(dry_run: bool = False) -> dict:
+    # Applies the retention policy to stored graphs and sessions. With dry_run nothing
+    # is removed and the result lists what would be.
+    graphs = graph_store.collect(dry_run=dry_run)
+    if not dry_run:
+        for name in graphs:
+            graph_cache.invalidate(graph_store.path(name))
+    sessions = expire_sessions(SESSION_RETENTION_DAYS * 86400, EMPTY_SESSION_TTL, dry_run)
+    return {"graphs": graphs, "sessions": sessions, "dry_run": dry_run}
+
+def _collect_if_due():
+    try:
+        if graph_store.claim_collection(GC_INTERVAL):
+            collect_garbage()
+    except Exception as e:
+        # Collection is housekeeping; a failed run must not affect the request that triggered it
+        print(f"Garbage collection failed: {e}")
+
+def maybe_collect():
+    # Called after each analysis; the run itself happens off the caller's thread
+    if GC_INTERVAL > 0:
+        threading.Thread(target=_collect_if_due, name="retention", daemon=True).start()
@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from tools.DependencyAnalyzer import MAX_FILE_BYTES, LARGE_FILES
+from tools.graphCache import graph_cache
+from tools.liveGraph import LiveGraph
+from tools.repoWalker import normalize_prefixes
+from tools.metrics import current_trace_id
+from memory.memoryOrch import create_session
+
+# Seconds between two scans of a watched repository for changed files
+WATCH_INTERVAL = float(os.getenv("WATCH_INTERVAL", "2"))
+MIN_WATCH_INTERVAL = 0.2
+# Repositories watched at once per process; each one keeps its whole graph in memory
+MAX_WATCHES = int(os.getenv("WATCH_MAX", "8"))
+# Graph reference accepted by every tool that takes a graph path
+WATCH_REF_PREFIX = "watch:"
+RECENT_CHANGES = 20
+
+class WatchNotReady(Exception):
+    pass
+
+class Watch:
+    def __init__(self, repo_path: str, options: dict):
+        self.watch_id = str(uuid.uuid4())
+        self.ref = WATCH_REF_PREFIX + self.watch_id
+        self.repo_path = repo_path
+        self.options = options
+        self.interval = max(MIN_WATCH_INTERVAL, float(options.get("interval") or WATCH_INTERVAL))
+        self.live = LiveGraph(repo_path, filter_prefix=normalize_prefixes(options.get("prefixes")),
+                              use_git=bool(options.get("use_git")),
+                              max_file_bytes=options.get("max_file_bytes") or MAX_FILE_BYTES,
+                              large_files=options.get("large_files") or LARGE_FILES,
+                              workers=options.get("workers"), use_cache=options.get("use_cache", True),
+                              ref=self.ref)
+        # "building" until the first graph is ready, then "watching" until stopped
+        self.status = "building"
+        self.session_id = None
+        self.error = None
+        self.trace_id = current_trace_id()
+        self.created = time.time()
+        self.last_scan = None
+        self.scans = 0
+        self.updates = 0
+        self.recent = deque(maxlen=RECENT_CHANGES)
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f"watch-{self.watch_id[:8]}", daemon=True)
+
+    def _run(self):
+        try:
+            self.live.build()
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e)
+            return
+        if self.stop_event.is_set():
+            return
+        self.status = "watching"
+        while not self.stop_event.wait(self.interval):
+            self.scan()
+
+    def scan(self):
+        try:
+            report = self.live.scan()
+        except Exception as e:
+            # A repository in the middle of a checkout can fail one scan; the next one retries
+            self.error = str(e)
+            return None
+        self.error = None
+        self.scans += 1
+        self.last_scan = time.time()
+        if report is not None:
+            self.updates += 1
+            self.recent.append(dict(report, time=self.last_scan))
+        return report
+
+    def view(self):
+        if self.status != "watching":
+            raise WatchNotReady(f"Watch '{self.watch_id}' is {self.status}"
+                                + (f": {self.error}" if self.error else ""))
+        return self.live.view()
+
+    def to_dict(self) -> dict:
+        return {
+            "watch_id": self.watch_id,
+            "graph": self.ref,
+            "status": self.status,
+            "repo": self.repo_path,
+            "session_id": self.session_id,
+            "interval": self.interval,
+            "scans": self.scans,
+            "updates": self.updates,
+            "last_scan": self.last_scan,
+            "recent_changes": list(self.recent),
+            **self.live.stats(),
+            "trace_id": self.trace_id,
+            "error": self.error,
+            "created": self.created,
+        }
+
+class WatchManager:
+    def __init__(self, max_watches: int = MAX_WATCHES):
+        self.max_watches = max_watches
+        self.watches = {}
+        self.active = {}
+        self.lock = threading.Lock()
+
+    def _key(self, repo_path: str, options: dict):
+        # Same notion of "the same graph" as analysis jobs
+        return (os.path.realpath(repo_path), normalize_prefixes(options.get("prefixes")), bool(options.get("use_git")),
+                options.get("max_file_bytes") or MAX_FILE_BYTES, options.get("large_files") or LARGE_FILES)
+
+    def start(self, repo_path: str, **options):
+        # Returns (watch, shared) where shared means the repository was already being watched
+        key = self._key(repo_path, options)
+        with self.lock:
+            # A watch whose first build failed is over: it neither serves a retry of the same
+            # repository nor counts toward the limit. It stays listed, and its graph reference
+            # keeps answering with the error, until it is stopped.
+            for failed_key in [k for k, w in self.active.items() if w.status == "failed"]:
+                del self.active[failed_key]
+            watch = self.active.get(key)
+            if watch is not None:
+                return watch, True
+            if len(self.active) >= self.max_watches:
+                raise ValueError(f"At most {self.max_watches} repositories can be watched at once")
+            watch = Watch(repo_path, options)
+            watch.session_id = create_session()
+            self.watches[watch.watch_id] = watch
+            self.active[key] = watch
+            graph_cache.register_live(watch.ref, watch.view)
+            watch.thread.start()
+            return watch, False
+
+    def get(self, watch_id: str):
+        with self.lock:
+            return self.watches.get(watch_id)
+
+    def stop(self, watch_id: str):
+        with self.lock:
+            watch = self.watches.pop(watch_id, None)
+            if watch is None:
+                return None
+            watch.stop_event.set()
+            watch.status = "stopped"
+            graph_cache.unregister_live(watch.ref)
+            key = self._key(watch.repo_path, watch.options)
+            if self.active.get(key) is watch:
+                del self.active[key]
+            return watch
+
+    def list(self) -> list:
+        with self.lock:
+            return [watch.to_dict() for watch in self.watches.values()]
+
+# Shared by every request handled by this process
+watch_manager = WatchManager()
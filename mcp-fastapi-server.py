@@ -1,16 +1,48 @@
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from pydantic import BaseModel
-from tools.readGraph import load_graph
+from tools.graphCache import graph_cache
+from tools.graphStream import stream_graph_json, DEFAULT_PAGE_SIZE
+from tools.graphQuery import ModuleNotFound
+from tools.symbolIndex import cached_symbol_index, SymbolNotFound
 from insturctions.instructionCreate import create_insturction
-from messages.query_llm import send_query_to_llm
-from tools.GraphBuilder import GraphBuilder
-from memory.memoryOrch import create_session
+from insturctions.contextBuilder import DEFAULT_HOPS, DEFAULT_TOKEN_BUDGET
+from messages.asyncLLM import async_send_query_to_llm
+from messages.streaming import astream_llm_events, stream_cached_events
+from messages.batchQuery import answer_queries, MAX_BATCH_QUERIES
+from memory.historyManager import DEFAULT_REQUEST_BUDGET
+from services import serviceCore
+from jobs.analyzeJobs import job_manager
+from jobs.watchers import watch_manager, WatchNotReady
+from jobs.retention import collect_garbage
+from tools.metrics import registry, start_trace, end_trace, HTTP_SECONDS, TRACE_HEADER, CONTENT_TYPE
 from collections import OrderedDict
+from typing import Optional, List, Union
 import os
-import json
+import asyncio
+import time
 
 app = FastAPI(title="Code Analyzer MCP Server")
+# Rows returned by the dependencies/dependents tools unless the request sets a limit
+ANALYTICS_ROW_LIMIT = 1000
+
+@app.middleware("http")
+async def trace_request(request: Request, call_next):
+    # Every response carries a trace id (the client's X-Trace-Id if it sent one) and the
+    # time spent in each phase of handling it as a Server-Timing header
+    trace, token = start_trace(request.headers.get(TRACE_HEADER))
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        end_trace(token)
+    route = request.scope.get("route")
+    HTTP_SECONDS.observe(time.perf_counter() - start, route=getattr(route, "path", "unmatched"),
+                         status=str(response.status_code))
+    response.headers[TRACE_HEADER] = trace.trace_id
+    if trace.timings:
+        response.headers["Server-Timing"] = trace.server_timing()
+    return response
 
 @app.get("/manifest")
 async def manifest():
@@ -56,19 +88,20 @@ async def list_prompt():
     return JSONResponse(content=response_data)
 
 @app.get("/resources/list")
-async def list_resources():
+async def list_resources(offset: int = 0, limit: Optional[int] = None, repo: Optional[str] = None):
     try:
-        file_names = [f for f in os.listdir("./files") if os.path.isfile(os.path.join("./files", f))]
+        page = await asyncio.to_thread(serviceCore.list_resources, offset, limit, repo)
         response_data = OrderedDict([
             ("status", "success"),
             ("message", "List of available resources"),
-            ("resources", file_names),
-            ("request_parameters", [{"resource_name": "Name of a resource from the list"}]),
+            *page.items(),
+            ("request_parameters", [{"resource_name": "Name of a resource from the list"}, {"raw": "Optional, stream the graph document itself as the response body (default: false)"}, {"node_offset": "Optional, index of the first node to return"}, {"node_limit": "Optional, number of nodes to return (default: 1000 when paging)"}, {"arc_offset": "Optional, index of the first matching arc to return"}, {"arc_limit": "Optional, number of arcs to return (default: 1000 when paging)"}, {"source": "Optional, module name or list of names: only arcs from these modules"}, {"target": "Optional, module name or list of names: only arcs to these modules"}]),
             ("request_endpoint", "/resources/get"),
             ("response_parameters", [
                 {
                     "status": "Request status",
-                    "resource": "A dependency graph file containing nodes and arcs"
+                    "resource": "A dependency graph file containing nodes and arcs",
+                    "nodes": "With paging or filters: the requested nodes, and arcs, total_nodes, total_arcs, matched_arcs"
                 }
             ])
         ])
@@ -77,14 +110,14 @@ async def list_resources():
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/messages/list")
-async def list_messages():
+async def list_messages(offset: int = 0, limit: Optional[int] = None):
     try:
-        file_names = [f for f in os.listdir("./memory/sessions") if os.path.isfile(os.path.join("./memory/sessions", f))]
+        page = await asyncio.to_thread(serviceCore.list_messages, offset, limit)
         response_data = OrderedDict([
             ("status", "success"),
             ("message", "List of available sessions"),
-            ("resources", file_names),
-            ("request_parameters", [{"session_id": "ID of a session from the list"}]),
+            *page.items(),
+            ("request_parameters", [{"session_id": "ID of a session from the list"}, {"offset": "Optional, index of the first message to return (default: 0)"}, {"limit": "Optional, maximum number of messages to return (default: all)"}]),
             ("request_endpoint", "/messages/get"),
             ("response_parameters", [
                 {
@@ -106,102 +139,518 @@ async def list_tools():
             {
                 "name": "Analyze",
                 "description": "Analyzes a local Git repository to extract module-level dependencies and builds a structured dependency graph.",
-                "request_parameters": [{"git": "Path to the local Git repository"}],
+                "request_parameters": [{"git": "Path to the local Git repository"}, {"parallel": "Optional, parse modules in a process pool (default: only for large repos)"}, {"workers": "Optional, number of worker processes"}, {"chunksize": "Optional, number of files sent to a worker at a time"}, {"use_cache": "Optional, reuse cached results for unchanged files (default: true)"}, {"use_git": "Optional, take the file list from git ls-files instead of walking the tree"}, {"wait": "Optional, wait for the analysis and return the graph directly (default: false)"}, {"format": "Optional, 'json' or 'compact' (binary, memory-mapped) graph file (default: json)"}, {"max_file_bytes": "Optional, files above this size are scanned lightly or skipped (default: 2 MB)"}, {"large_files": "Optional, 'light' or 'skip' for files above max_file_bytes (default: light)"}, {"prefixes": "Optional, path prefix or list of prefixes (source roots) of the modules to analyze (default: src)"}, {"shards": "Optional, parse each top-level package under the prefixes in its own process and merge them; packages whose files didn't change are not parsed again (default: false)"}],
                 "request_endpoint": "/tools/analyze",
                 "response_parameters": [
                     {
                         "status": "Request status",
-                        "graph_path": "Path to the generated dependency graph file",
-                        "session_id": "ID of the session"
+                        "job_id": "ID of the analysis job, poll it with /tools/analyze/status",
+                        "shared": "True when an identical analysis was already running and is reused",
+                        "graph_path": "Path to the generated dependency graph file (only with wait)",
+                        "reused": "True when the repository was unchanged or produced an already stored graph, whose file is returned (only with wait)",
+                        "session_id": "ID of the session (only with wait)"
+                    }
+                ]
+            },
+            {
+                "name": "Analyze Status",
+                "description": "Reports the state and progress (files parsed / total) of an analysis job, and its graph and session once done.",
+                "request_parameters": [{"job_id": "ID of the analysis job"}],
+                "request_endpoint": "/tools/analyze/status",
+                "response_parameters": [
+                    {
+                        "status": "Request status",
+                        "job": "Job state: status, parsed, total, graph_path, session_id, error"
+                    }
+                ]
+            },
+            {
+                "name": "Analyze Cancel",
+                "description": "Cancels a queued or running analysis job.",
+                "request_parameters": [{"job_id": "ID of the analysis job"}],
+                "request_endpoint": "/tools/analyze/cancel",
+                "response_parameters": [
+                    {
+                        "status": "Request status",
+                        "job": "Job state after the cancellation request"
+                    }
+                ]
+            },
+            {
+                "name": "Watch",
+                "description": "Keeps the dependency graph of a repository in memory and re-analyzes only the modules whose files change. Queries and analytics tools take the returned graph reference and always see the current graph.",
+                "request_parameters": [{"git": "Path to the local Git repository"}, {"interval": "Optional, seconds between scans for changed files (default: 2)"}, {"workers": "Optional, as for Analyze"}, {"use_cache": "Optional, as for Analyze"}, {"use_git": "Optional, as for Analyze"}, {"max_file_bytes": "Optional, as for Analyze"}, {"large_files": "Optional, as for Analyze"}, {"prefixes": "Optional, as for Analyze"}],
+                "request_endpoint": "/tools/watch",
+                "response_parameters": [
+                    {
+                        "status": "Request status",
+                        "watch_id": "ID of the watch",
+                        "graph": "Graph reference ('watch:<watch_id>') to pass as graph to the other tools",
+                        "session_id": "ID of the session",
+                        "shared": "True when the repository was already being watched",
+                        "watch": "Watch state: status (building, watching, failed), version, modules, arcs, recent_changes"
+                    }
+                ]
+            },
+            {
+                "name": "Watch Status",
+                "description": "Reports the state of a watch: graph version, module and arc counts, and the most recent changes applied.",
+                "request_parameters": [{"watch_id": "ID of the watch"}],
+                "request_endpoint": "/tools/watch/status",
+                "response_parameters": [
+                    {
+                        "status": "Request status",
+                        "watch": "Watch state"
+                    }
+                ]
+            },
+            {
+                "name": "Watch Snapshot",
+                "description": "Writes the current in-memory graph of a watch to a graph file.",
+                "request_parameters": [{"watch_id": "ID of the watch"}, {"format": "Optional, 'json' or 'compact' (default: json)"}],
+                "request_endpoint": "/tools/watch/snapshot",
+                "response_parameters": [
+                    {
+                        "status": "Request status",
+                        "graph_path": "Path to the written graph file",
+                        "version": "Graph version the snapshot was taken from"
+                    }
+                ]
+            },
+            {
+                "name": "Watch Stop",
+                "description": "Stops watching a repository and releases its in-memory graph.",
+                "request_parameters": [{"watch_id": "ID of the watch"}],
+                "request_endpoint": "/tools/watch/stop",
+                "response_parameters": [
+                    {
+                        "status": "Request status",
+                        "watch": "Final watch state"
                     }
                 ]
             },
             {
                 "name": "Query",
                 "description": "Queries the dependency graph using a connected LLM to gain insights into specific modules, their relationships, and their roles within the project architecture.",
-                "request_parameters": [{"query": "The query to be sent to the LLM"}, {"resource": "Path to the dependency graph file"}, {"session_id": "ID of the session"}],
+                "request_parameters": [{"query": "The query to be sent to the LLM"}, {"resource": "Path to the dependency graph file, or 'watch:<watch_id>' for a watched repository"}, {"session_id": "ID of the session"}, {"stream": "Optional, stream the answer as server-sent events (default: false)"}, {"context_mode": "Optional, 'subgraph' (modules named in the query and their neighbours) or 'full' (default: subgraph)"}, {"hops": "Optional, neighbourhood radius around the matched modules (default: 1)"}, {"token_budget": "Optional, token budget for the graph context (default: 6000)"}, {"history_budget": "Optional, token budget for the whole request; older turns beyond it are folded into a summary (default: 16000)"}, {"use_cache": "Optional, answer repeated questions from the response cache (default: true)"}, {"grounding": "Optional, add exact reachability, cycle and layer facts for the modules the query names (default: false)"}, {"symbols": "Optional, add symbol-level dependencies of the modules the query names, read from their source (default: false)"}],
                 "request_endpoint": "/tools/query",
                 "response_parameters": [
                     {
                         "status": "Request status",
-                        "response": "Response from the LLM based on the query"
+                        "response": "Response from the LLM based on the query (with stream: 'token' events, then a 'done' event, or an 'error' event if the model fails partway)",
+                        "cached": "Whether the answer came from the response cache"
+                    }
+                ]
+            },
+            {
+                "name": "Query Batch",
+                "description": "Answers many independent questions about the same dependency graph concurrently.",
+                "request_parameters": [{"queries": "List of questions (at most 100)"}, {"graph": "Path to the dependency graph file, or 'watch:<watch_id>' for a watched repository"}, {"context_mode": "Optional, as for Query"}, {"hops": "Optional, as for Query"}, {"token_budget": "Optional, as for Query"}, {"use_cache": "Optional, as for Query"}, {"grounding": "Optional, as for Query"}, {"symbols": "Optional, as for Query"}],
+                "request_endpoint": "/tools/query_batch",
+                "response_parameters": [
+                    {
+                        "status": "Request status",
+                        "results": "One entry per question, in order: query, status, response and cached"
                     }
                 ]
+            },
+            {
+                "name": "Dependencies",
+                "description": "Lists every module a module imports, directly or transitively, with the number of hops. Computed from the graph, no LLM.",
+                "request_parameters": [{"graph": "Path to the dependency graph file, or 'watch:<watch_id>' for a watched repository"}, {"module": "Module name or unique dotted suffix"}, {"max_depth": "Optional, stop after this many hops"}, {"limit": "Optional, most rows returned (default: 1000)"}],
+                "request_endpoint": "/tools/dependencies",
+                "response_parameters": [{"module": "Resolved module name", "dependencies": "Modules with their depth, nearest first", "total": "Number of modules reached"}]
+            },
+            {
+                "name": "Dependents",
+                "description": "Lists every module that imports a module, directly or transitively: what may break when it changes.",
+                "request_parameters": [{"graph": "Path to the dependency graph file, or 'watch:<watch_id>' for a watched repository"}, {"module": "Module name or unique dotted suffix"}, {"max_depth": "Optional, stop after this many hops"}, {"limit": "Optional, most rows returned (default: 1000)"}],
+                "request_endpoint": "/tools/dependents",
+                "response_parameters": [{"module": "Resolved module name", "dependents": "Modules with their depth, nearest first", "total": "Number of modules reached"}]
+            },
+            {
+                "name": "Dependency Path",
+                "description": "Shortest chain of imports from one module to another.",
+                "request_parameters": [{"graph": "Path to the dependency graph file, or 'watch:<watch_id>' for a watched repository"}, {"source": "Importing module"}, {"target": "Imported module"}],
+                "request_endpoint": "/tools/path",
+                "response_parameters": [{"path": "Arcs along the path with their symbols, or null when unreachable", "length": "Number of hops"}]
+            },
+            {
+                "name": "Cycles",
+                "description": "Import cycles, as strongly connected components of the graph, largest first.",
+                "request_parameters": [{"graph": "Path to the dependency graph file, or 'watch:<watch_id>' for a watched repository"}, {"min_size": "Optional, smallest cycle reported (default: 2)"}, {"limit": "Optional, most cycles returned"}],
+                "request_endpoint": "/tools/cycles",
+                "response_parameters": [{"cycles": "Lists of mutually dependent modules", "total": "Number of cycles"}]
+            },
+            {
+                "name": "Layers",
+                "description": "Topological layers: layer 0 imports nothing in the graph, each module sits above everything it imports; cycles share a layer.",
+                "request_parameters": [{"graph": "Path to the dependency graph file, or 'watch:<watch_id>' for a watched repository"}],
+                "request_endpoint": "/tools/layers",
+                "response_parameters": [{"layers": "Modules per layer, bottom first", "count": "Number of layers"}]
+            },
+            {
+                "name": "Ranking",
+                "description": "Modules with the most distinct dependents (fan_in) or dependencies (fan_out).",
+                "request_parameters": [{"graph": "Path to the dependency graph file, or 'watch:<watch_id>' for a watched repository"}, {"by": "Optional, 'fan_in' or 'fan_out' (default: fan_in)"}, {"limit": "Optional, number of modules (default: 20)"}],
+                "request_endpoint": "/tools/ranking",
+                "response_parameters": [{"by": "Ranking key", "modules": "Modules with their fan_in and fan_out"}]
+            },
+            {
+                "name": "Symbols",
+                "description": "Definitions of a module, or for one of its classes or functions what it uses and where it is referenced and called. Source files are parsed on demand, only for the module and the modules importing it.",
+                "request_parameters": [{"graph": "Path to the dependency graph file, or 'watch:<watch_id>' for a watched repository"}, {"module": "Module name or unique dotted suffix"}, {"symbol": "Optional, qualified name or unique suffix of a class or function in the module"}, {"git": "Optional, repository the graph was built from, when the graph store doesn't record it"}, {"limit": "Optional, most uses and references returned (default: 1000)"}],
+                "request_endpoint": "/tools/symbols",
+                "response_parameters": [{"module": "Resolved module name", "definitions": "Classes and functions with their lines (without symbol)", "symbol": "The definition (with symbol)", "uses": "Modules and symbols it refers to", "references": "Where it is referenced: module, enclosing definition, line and whether it is a call", "total": "Number of references"}]
             }
         ])
     ])
     return JSONResponse(content=response_data)
 
+@app.get("/metrics")
+async def metrics():
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {"status": "success", **(await asyncio.to_thread(serviceCore.cache_stats))}
+
+class CollectRequest(BaseModel):
+    dry_run: bool = False
+
+@app.post("/cache/gc")
+async def cache_gc(req: Optional[CollectRequest] = None):
+    # Removal walks the session folder, so it runs off the event loop
+    result = await asyncio.to_thread(collect_garbage, req.dry_run if req else False)
+    return {"status": "success", **result}
+
 class PromptRequest(BaseModel):
     prompt_name: str
 
 class ResourceRequest(BaseModel):
     resource_name: str
+    raw: bool = False
+    node_offset: Optional[int] = None
+    node_limit: Optional[int] = None
+    arc_offset: Optional[int] = None
+    arc_limit: Optional[int] = None
+    source: Optional[Union[str, List[str]]] = None
+    target: Optional[Union[str, List[str]]] = None
 
 class MessageRequest(BaseModel):
     session_id: str
+    offset: int = 0
+    limit: Optional[int] = None
 
 class AnalyzeRequest(BaseModel):
     git: str
+    parallel: Optional[bool] = None
+    workers: Optional[int] = None
+    chunksize: Optional[int] = None
+    use_cache: bool = True
+    use_git: bool = False
+    wait: bool = False
+    format: str = "json"
+    max_file_bytes: Optional[int] = None
+    large_files: Optional[str] = None
+    prefixes: Optional[Union[str, List[str]]] = None
+    shards: bool = False
+
+class JobRequest(BaseModel):
+    job_id: str
+
+class WatchRequest(BaseModel):
+    git: str
+    interval: Optional[float] = None
+    workers: Optional[int] = None
+    use_cache: bool = True
+    use_git: bool = False
+    max_file_bytes: Optional[int] = None
+    large_files: Optional[str] = None
+    prefixes: Optional[Union[str, List[str]]] = None
+
+class WatchIdRequest(BaseModel):
+    watch_id: str
+
+class SnapshotRequest(BaseModel):
+    watch_id: str
+    format: str = "json"
 
 class QueryRequest(BaseModel):
     query: str
     graph: str
     session_id: str
+    stream: bool = False
+    context_mode: str = "subgraph"
+    hops: int = DEFAULT_HOPS
+    token_budget: int = DEFAULT_TOKEN_BUDGET
+    history_budget: int = DEFAULT_REQUEST_BUDGET
+    use_cache: bool = True
+    grounding: bool = False
+    symbols: bool = False
+
+class BatchQueryRequest(BaseModel):
+    queries: List[str]
+    graph: str
+    context_mode: str = "subgraph"
+    hops: int = DEFAULT_HOPS
+    token_budget: int = DEFAULT_TOKEN_BUDGET
+    use_cache: bool = True
+    grounding: bool = False
+    symbols: bool = False
+
+class GraphRequest(BaseModel):
+    graph: str
+
+class ModuleQueryRequest(BaseModel):
+    graph: str
+    module: str
+    max_depth: Optional[int] = None
+    limit: int = ANALYTICS_ROW_LIMIT
+
+class SymbolRequest(BaseModel):
+    graph: str
+    module: str
+    symbol: Optional[str] = None
+    git: Optional[str] = None
+    limit: int = ANALYTICS_ROW_LIMIT
+
+class PathRequest(BaseModel):
+    graph: str
+    source: str
+    target: str
+
+class CyclesRequest(BaseModel):
+    graph: str
+    min_size: int = 2
+    limit: Optional[int] = None
+
+class RankingRequest(BaseModel):
+    graph: str
+    by: str = "fan_in"
+    limit: int = 20
 
 @app.post("/prompts/get")
 async def get_prompt(req: PromptRequest):
     if req.prompt_name != "Create Dependency Graph":
         raise HTTPException(status_code=404, detail=f"Prompt '{req.prompt_name}' not found")
-    return {"status": "success", "message": create_insturction(["List of nodes"], ["List of arcs"])}
+    return {"status": "success", "message": create_insturction(["package.module_a", "package.module_b"],
+                                                               [{"source": "package.module_a", "target": "package.module_b", "symbol": "name"}])}
+
+# Any of these in a /resources/get request asks for a page of the graph instead of all of it
+PAGE_PARAMETERS = ("node_offset", "node_limit", "arc_offset", "arc_limit", "source", "target")
+
+def _page_size(value: Optional[int]) -> int:
+    return value if value is not None else DEFAULT_PAGE_SIZE
+
+def _module_list(value) -> Optional[List[str]]:
+    if value is None:
+        return None
+    return [value] if isinstance(value, str) else list(value)
 
 @app.post("/resources/get")
 async def get_resource(req: ResourceRequest):
-    file_path = os.path.join('./files', req.resource_name)
-    if not os.path.isfile(file_path):
+    file_path = await asyncio.to_thread(serviceCore.resource_path, req.resource_name)
+    if file_path is None:
         raise HTTPException(status_code=404, detail=f"Resource '{req.resource_name}' not found")
-    with open(file_path, 'r') as file:
-        content = file.read()
+    if req.raw:
+        # The document itself, chunk by chunk, instead of a string inside another document
+        return StreamingResponse(stream_graph_json(file_path), media_type="application/json")
+    if any(getattr(req, key) is not None for key in PAGE_PARAMETERS):
+        page = await asyncio.to_thread(
+            serviceCore.get_resource_page, file_path, req.node_offset or 0, _page_size(req.node_limit),
+            req.arc_offset or 0, _page_size(req.arc_limit), _module_list(req.source), _module_list(req.target))
+        return {"status": "success", "resource": req.resource_name, **page}
+    content = await asyncio.to_thread(serviceCore.get_resource, file_path)
     return {"status": "success", "resource": content}
 
 @app.post("/messages/get")
 async def get_messages(req: MessageRequest):
-    file_path = os.path.join('./memory/sessions', req.session_id)
-    if not os.path.isfile(file_path):
+    page = await asyncio.to_thread(serviceCore.get_messages, req.session_id, req.offset, req.limit)
+    if page is None:
         raise HTTPException(status_code=404, detail=f"Session '{req.session_id}' not found")
-    with open(file_path, 'r') as file:
-        content = file.read()
-    return {"status": "success", "messages": content}
+    return {"status": "success", **page}
 
 @app.post("/tools/analyze")
 async def analyze_graph(req: AnalyzeRequest):
     if not os.path.isdir(req.git):
         raise HTTPException(status_code=400, detail=f"Provided path '{req.git}' is not a valid directory")
+    if req.workers is not None and req.workers < 1:
+        raise HTTPException(status_code=400, detail="'workers' must be at least 1")
+    job, shared = job_manager.submit(req.git, parallel=req.parallel, workers=req.workers, chunksize=req.chunksize,
+                                     use_cache=req.use_cache, use_git=req.use_git, format=req.format,
+                                     max_file_bytes=req.max_file_bytes, large_files=req.large_files,
+                                     prefixes=req.prefixes, shards=req.shards)
+    if not req.wait:
+        return {"status": "success", "job_id": job.job_id, "shared": shared, "job": job.to_dict()}
+    # Waiting on the job keeps the event loop free for other requests
+    await asyncio.wait([asyncio.wrap_future(job.future)])
+    if job.status != "done":
+        raise HTTPException(status_code=500, detail=job.error or f"Analysis {job.status}")
+    return {"status": "success", "graph_path": job.graph_path, "reused": job.reused, "session_id": job.session_id,
+            "job_id": job.job_id, "large_files": job.large_files, "timings": job.to_dict()["timings"]}
+
+@app.post("/tools/analyze/status")
+async def analyze_status(req: JobRequest):
+    job = job_manager.get(req.job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{req.job_id}' not found")
+    return {"status": "success", "job": job.to_dict()}
+
+@app.post("/tools/analyze/cancel")
+async def analyze_cancel(req: JobRequest):
+    job = job_manager.cancel(req.job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{req.job_id}' not found")
+    return {"status": "success", "job": job.to_dict()}
+
+@app.post("/tools/watch")
+async def watch_repo(req: WatchRequest):
+    if not os.path.isdir(req.git):
+        raise HTTPException(status_code=400, detail=f"Provided path '{req.git}' is not a valid directory")
+    if req.workers is not None and req.workers < 1:
+        raise HTTPException(status_code=400, detail="'workers' must be at least 1")
     try:
-        currGraph = GraphBuilder(req.git)
-        currGraph.build()
-        dependencyGraph = currGraph.export_graph()
-        session_id = create_session()
-        return {"status": "success", "graph_path": dependencyGraph, "session_id": session_id}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        watch, shared = watch_manager.start(req.git, interval=req.interval, workers=req.workers,
+                                            use_cache=req.use_cache, use_git=req.use_git,
+                                            max_file_bytes=req.max_file_bytes, large_files=req.large_files,
+                                            prefixes=req.prefixes)
+    except ValueError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"status": "success", "watch_id": watch.watch_id, "graph": watch.ref, "session_id": watch.session_id,
+            "shared": shared, "watch": watch.to_dict()}
+
+def _watch(watch_id: str):
+    watch = watch_manager.get(watch_id)
+    if watch is None:
+        raise HTTPException(status_code=404, detail=f"Watch '{watch_id}' not found")
+    return watch
+
+@app.post("/tools/watch/status")
+async def watch_status(req: WatchIdRequest):
+    return {"status": "success", "watch": _watch(req.watch_id).to_dict()}
+
+@app.post("/tools/watch/snapshot")
+async def watch_snapshot(req: SnapshotRequest):
+    watch = _watch(req.watch_id)
+    if watch.status != "watching":
+        raise HTTPException(status_code=409, detail=f"Watch '{req.watch_id}' is {watch.status}")
+    # Writing a large graph should not stall other requests
+    graph_path, version = await asyncio.to_thread(watch.live.snapshot, req.format)
+    return {"status": "success", "graph_path": graph_path, "version": version}
+
+@app.post("/tools/watch/stop")
+async def watch_stop(req: WatchIdRequest):
+    watch = watch_manager.stop(req.watch_id)
+    if watch is None:
+        raise HTTPException(status_code=404, detail=f"Watch '{req.watch_id}' not found")
+    return {"status": "success", "watch": watch.to_dict()}
 
 @app.post("/tools/query")
 async def query_graph(req: QueryRequest):
-    nodes, arcs = load_graph(req.graph)
     try:
-        session_path = os.path.join('./memory/sessions', req.session_id)
-        with open(session_path, 'r') as file:
-            content = file.read()
-        history = json.loads(content)
-        if not history["messages"]:
-            sys_msg = create_insturction(nodes, arcs)
-            history["messages"].append({"role": "system", "content": sys_msg})
-        history["messages"].append({"role": "user", "content": req.query})
-        llm_response = send_query_to_llm(history["messages"])
-        history["messages"].append({"role": "assistant", "content": llm_response})
-        with open(session_path, 'w') as file:
-            json.dump(history, file, indent=2)
-        return {"status": "success", "response": llm_response}
+        # Loading the graph and session and building the prompt read files, so they run off the event loop
+        turn = await asyncio.to_thread(serviceCore.prepare_query, req.graph, req.query, req.session_id,
+                                       req.context_mode, req.hops, req.token_budget, req.history_budget,
+                                       req.use_cache, req.grounding, req.symbols)
+        if req.stream:
+            events = (stream_cached_events(req.session_id, turn.new_msgs, turn.cached) if turn.cached is not None
+                      else astream_llm_events(req.session_id, turn.new_msgs, turn.msgs, turn.cache_key))
+            return StreamingResponse(events, media_type="text/event-stream",
+                                     headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        llm_response = turn.cached if turn.cached is not None else await async_send_query_to_llm(turn.msgs)
+        await asyncio.to_thread(serviceCore.finish_query, turn, llm_response)
+        return {"status": "success", "response": llm_response, "cached": turn.cached is not None}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/tools/query_batch")
+async def query_batch(req: BatchQueryRequest):
+    if not req.queries or len(req.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"Provide between 1 and {MAX_BATCH_QUERIES} queries")
+    try:
+        graph = await asyncio.to_thread(graph_cache.get, req.graph)
+        results = await answer_queries(graph, req.queries, context_mode=req.context_mode, hops=req.hops,
+                                       token_budget=req.token_budget, use_cache=req.use_cache,
+                                       grounding=req.grounding, symbols=req.symbols)
+        return {"status": "success", "results": results}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def _graph_query(path: str):
+    try:
+        query = await asyncio.to_thread(serviceCore.graph_query, path)
+    except WatchNotReady as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if query is None:
+        raise HTTPException(status_code=404, detail=f"Graph '{path}' not found")
+    return query
+
+@app.post("/tools/dependencies")
+async def dependencies(req: ModuleQueryRequest):
+    query = await _graph_query(req.graph)
+    try:
+        rows, total = query.dependencies(req.module, req.max_depth, req.limit)
+    except ModuleNotFound as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    return {"status": "success", "module": query.names[query.resolve(req.module)], "dependencies": rows, "total": total}
+
+@app.post("/tools/dependents")
+async def dependents(req: ModuleQueryRequest):
+    query = await _graph_query(req.graph)
+    try:
+        rows, total = query.dependents(req.module, req.max_depth, req.limit)
+    except ModuleNotFound as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    return {"status": "success", "module": query.names[query.resolve(req.module)], "dependents": rows, "total": total}
+
+@app.post("/tools/path")
+async def dependency_path(req: PathRequest):
+    query = await _graph_query(req.graph)
+    try:
+        path = query.shortest_path(req.source, req.target)
+    except ModuleNotFound as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    return {"status": "success", "path": path, "length": len(path) if path is not None else None}
+
+@app.post("/tools/cycles")
+async def cycles(req: CyclesRequest):
+    groups = (await _graph_query(req.graph)).cycles(req.min_size)
+    return {"status": "success", "cycles": groups[:req.limit], "total": len(groups)}
+
+@app.post("/tools/layers")
+async def layers(req: GraphRequest):
+    result = (await _graph_query(req.graph)).layers()
+    return {"status": "success", "layers": result, "count": len(result)}
+
+@app.post("/tools/ranking")
+async def ranking(req: RankingRequest):
+    try:
+        modules = (await _graph_query(req.graph)).ranking(req.by, req.limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "success", "by": req.by, "modules": modules}
+
+def _symbol_lookup(graph: str, module: str, symbol: str, repo: str, limit: int) -> dict:
+    # Parses source files on first use, so it runs off the event loop
+    index = cached_symbol_index(graph_cache.get(graph), repo)
+    if index is None:
+        raise HTTPException(status_code=400, detail=f"Repository of graph '{graph}' is not known, pass 'git'")
+    if not symbol:
+        return {"status": "success", "module": module, "definitions": index.module(module)["definitions"]}
+    definition = index.definition(module, symbol)
+    references = index.references(module, definition["name"])
+    return {"status": "success", "module": module, "symbol": definition,
+            "uses": index.uses(module, definition["name"])[:limit], "references": references[:limit],
+            "total": len(references)}
+
+@app.post("/tools/symbols")
+async def symbols(req: SymbolRequest):
+    query = await _graph_query(req.graph)
+    if req.git and not os.path.isdir(req.git):
+        raise HTTPException(status_code=400, detail=f"Provided path '{req.git}' is not a valid directory")
+    try:
+        module = query.names[query.resolve(req.module)]
+        return await asyncio.to_thread(_symbol_lookup, req.graph, module, req.symbol, req.git, req.limit)
+    except (ModuleNotFound, SymbolNotFound) as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
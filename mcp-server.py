@@ -1,14 +1,57 @@
-from flask import Flask, request, jsonify, Response
-from tools.readGraph import load_graph
+from flask import Flask, request, jsonify, Response, stream_with_context, g
+from tools.graphCache import graph_cache
+from tools.graphStream import stream_graph_json, DEFAULT_PAGE_SIZE
+from tools.graphQuery import ModuleNotFound
+from tools.symbolIndex import cached_symbol_index, SymbolNotFound
 from insturctions.instructionCreate import create_insturction
+from insturctions.contextBuilder import DEFAULT_HOPS, DEFAULT_TOKEN_BUDGET
 from messages.query_llm import send_query_to_llm
-from tools.GraphBuilder import GraphBuilder
-from memory.memoryOrch import create_session
+from messages.streaming import stream_llm_events, stream_cached_events
+from messages.asyncLLM import run_in_background_loop
+from messages.batchQuery import answer_queries, MAX_BATCH_QUERIES
+from memory.historyManager import DEFAULT_REQUEST_BUDGET
+from services import serviceCore
+from jobs.analyzeJobs import job_manager
+from jobs.watchers import watch_manager, WatchNotReady
+from jobs.retention import collect_garbage
+from tools.metrics import registry, start_trace, end_trace, HTTP_SECONDS, TRACE_HEADER, CONTENT_TYPE
+from concurrent.futures import wait
 import os
 from collections import OrderedDict
 import json
+import time
 
 app = Flask(__name__)
+# Rows returned by the dependencies/dependents tools unless the request sets a limit
+ANALYTICS_ROW_LIMIT = 1000
+
+# --------------- Tracing --------------- #
+
+@app.before_request
+def startTrace():
+    g.trace, g.trace_token = start_trace(request.headers.get(TRACE_HEADER))
+    g.trace_start = time.perf_counter()
+
+@app.after_request
+def traceHeaders(response):
+    # Every response carries a trace id (the client's X-Trace-Id if it sent one) and the
+    # time spent in each phase of handling it as a Server-Timing header
+    trace = g.get("trace")
+    if trace is None:
+        return response
+    HTTP_SECONDS.observe(time.perf_counter() - g.trace_start,
+                         route=request.url_rule.rule if request.url_rule else "unmatched",
+                         status=str(response.status_code))
+    response.headers[TRACE_HEADER] = trace.trace_id
+    if trace.timings:
+        response.headers["Server-Timing"] = trace.server_timing()
+    return response
+
+@app.teardown_request
+def endTrace(error=None):
+    token = g.pop("trace_token", None)
+    if token is not None:
+        end_trace(token)
 
 # --------------- MCP Server GET Requests --------------- #
 
@@ -57,19 +100,21 @@ def listPrompt():
 
 @app.route('/resources/list', methods=['GET'])
 def listResources():
-    files_folder = './files'
     try:
-        file_names = [f for f in os.listdir(files_folder) if os.path.isfile(os.path.join(files_folder, f))]
+        offset = request.args.get('offset', 0, type=int)
+        limit = request.args.get('limit', type=int)
+        page = serviceCore.list_resources(offset, limit, request.args.get('repo'))
         response_data = OrderedDict([
             ("status", "success"),
             ("message", "List of available resources"),
-            ("resources", file_names),
-            ("request_parameters", [{"resource_name": "Name of a resource from the list"}]),
+            *page.items(),
+            ("request_parameters", [{"resource_name": "Name of a resource from the list"}, {"raw": "Optional, stream the graph document itself as the response body (default: false)"}, {"node_offset": "Optional, index of the first node to return"}, {"node_limit": "Optional, number of nodes to return (default: 1000 when paging)"}, {"arc_offset": "Optional, index of the first matching arc to return"}, {"arc_limit": "Optional, number of arcs to return (default: 1000 when paging)"}, {"source": "Optional, module name or list of names: only arcs from these modules"}, {"target": "Optional, module name or list of names: only arcs to these modules"}]),
             ("request_endpoint", "/resources/get"),
             ("response_parameters", [
                 {
                     "status": "Request status",
-                    "resource": "A dependency graph file containing nodes and arcs"
+                    "resource": "A dependency graph file containing nodes and arcs",
+                    "nodes": "With paging or filters: the requested nodes, and arcs, total_nodes, total_arcs, matched_arcs"
                 }
             ])
         ])
@@ -79,14 +124,15 @@ def listResources():
 
 @app.route('/messages/list', methods=['GET'])
 def listMessages():
-    files_folder = './memory/sessions'
     try:
-        file_names = [f for f in os.listdir(files_folder) if os.path.isfile(os.path.join(files_folder, f))]
+        offset = request.args.get('offset', 0, type=int)
+        limit = request.args.get('limit', type=int)
+        page = serviceCore.list_messages(offset, limit)
         response_data = OrderedDict([
             ("status", "success"),
             ("message", "List of available sessions"),
-            ("resources", file_names),
-            ("request_parameters", [{"session_id": "ID of a session from the list"}]),
+            *page.items(),
+            ("request_parameters", [{"session_id": "ID of a session from the list"}, {"offset": "Optional, index of the first message to return (default: 0)"}, {"limit": "Optional, maximum number of messages to return (default: all)"}]),
             ("request_endpoint", "/messages/get"),
             ("response_parameters", [
                 {
@@ -108,32 +154,192 @@ def listTools():
             {
                 "name": "Analyze",
                 "description": "Analyzes a local Git repository to extract module-level dependencies and builds a structured dependency graph.",
-                "request_parameters": [{"git": "Path to the local Git repository"}],
+                "request_parameters": [{"git": "Path to the local Git repository"}, {"parallel": "Optional, parse modules in a process pool (default: only for large repos)"}, {"workers": "Optional, number of worker processes"}, {"chunksize": "Optional, number of files sent to a worker at a time"}, {"use_cache": "Optional, reuse cached results for unchanged files (default: true)"}, {"use_git": "Optional, take the file list from git ls-files instead of walking the tree"}, {"wait": "Optional, wait for the analysis and return the graph directly (default: false)"}, {"format": "Optional, 'json' or 'compact' (binary, memory-mapped) graph file (default: json)"}, {"max_file_bytes": "Optional, files above this size are scanned lightly or skipped (default: 2 MB)"}, {"large_files": "Optional, 'light' or 'skip' for files above max_file_bytes (default: light)"}, {"prefixes": "Optional, path prefix or list of prefixes (source roots) of the modules to analyze (default: src)"}, {"shards": "Optional, parse each top-level package under the prefixes in its own process and merge them; packages whose files didn't change are not parsed again (default: false)"}],
                 "request_endpoint": "/tools/analyze",
                 "response_parameters": [
                     {
                         "status": "Request status",
-                        "graph_path": "Path to the generated dependency graph file",
-                        "session_id": "ID of the session"
+                        "job_id": "ID of the analysis job, poll it with /tools/analyze/status",
+                        "shared": "True when an identical analysis was already running and is reused",
+                        "graph_path": "Path to the generated dependency graph file (only with wait)",
+                        "reused": "True when the repository was unchanged or produced an already stored graph, whose file is returned (only with wait)",
+                        "session_id": "ID of the session (only with wait)"
+                    }
+                ]
+            },
+            {
+                "name": "Analyze Status",
+                "description": "Reports the state and progress (files parsed / total) of an analysis job, and its graph and session once done.",
+                "request_parameters": [{"job_id": "ID of the analysis job"}],
+                "request_endpoint": "/tools/analyze/status",
+                "response_parameters": [
+                    {
+                        "status": "Request status",
+                        "job": "Job state: status, parsed, total, graph_path, session_id, error"
+                    }
+                ]
+            },
+            {
+                "name": "Analyze Cancel",
+                "description": "Cancels a queued or running analysis job.",
+                "request_parameters": [{"job_id": "ID of the analysis job"}],
+                "request_endpoint": "/tools/analyze/cancel",
+                "response_parameters": [
+                    {
+                        "status": "Request status",
+                        "job": "Job state after the cancellation request"
+                    }
+                ]
+            },
+            {
+                "name": "Watch",
+                "description": "Keeps the dependency graph of a repository in memory and re-analyzes only the modules whose files change. Queries and analytics tools take the returned graph reference and always see the current graph.",
+                "request_parameters": [{"git": "Path to the local Git repository"}, {"interval": "Optional, seconds between scans for changed files (default: 2)"}, {"workers": "Optional, as for Analyze"}, {"use_cache": "Optional, as for Analyze"}, {"use_git": "Optional, as for Analyze"}, {"max_file_bytes": "Optional, as for Analyze"}, {"large_files": "Optional, as for Analyze"}, {"prefixes": "Optional, as for Analyze"}],
+                "request_endpoint": "/tools/watch",
+                "response_parameters": [
+                    {
+                        "status": "Request status",
+                        "watch_id": "ID of the watch",
+                        "graph": "Graph reference ('watch:<watch_id>') to pass as graph to the other tools",
+                        "session_id": "ID of the session",
+                        "shared": "True when the repository was already being watched",
+                        "watch": "Watch state: status (building, watching, failed), version, modules, arcs, recent_changes"
+                    }
+                ]
+            },
+            {
+                "name": "Watch Status",
+                "description": "Reports the state of a watch: graph version, module and arc counts, and the most recent changes applied.",
+                "request_parameters": [{"watch_id": "ID of the watch"}],
+                "request_endpoint": "/tools/watch/status",
+                "response_parameters": [
+                    {
+                        "status": "Request status",
+                        "watch": "Watch state"
+                    }
+                ]
+            },
+            {
+                "name": "Watch Snapshot",
+                "description": "Writes the current in-memory graph of a watch to a graph file.",
+                "request_parameters": [{"watch_id": "ID of the watch"}, {"format": "Optional, 'json' or 'compact' (default: json)"}],
+                "request_endpoint": "/tools/watch/snapshot",
+                "response_parameters": [
+                    {
+                        "status": "Request status",
+                        "graph_path": "Path to the written graph file",
+                        "version": "Graph version the snapshot was taken from"
+                    }
+                ]
+            },
+            {
+                "name": "Watch Stop",
+                "description": "Stops watching a repository and releases its in-memory graph.",
+                "request_parameters": [{"watch_id": "ID of the watch"}],
+                "request_endpoint": "/tools/watch/stop",
+                "response_parameters": [
+                    {
+                        "status": "Request status",
+                        "watch": "Final watch state"
                     }
                 ]
             },
             {
                 "name": "Query",
                 "description": "Queries the dependency graph using a connected LLM to gain insights into specific modules, their relationships, and their roles within the project architecture.",
-                "request_parameters": [{"query": "The query to be sent to the LLM"}, {"resource": "Path to the dependency graph file"},{"session_id": "ID of the session"}],
+                "request_parameters": [{"query": "The query to be sent to the LLM"}, {"resource": "Path to the dependency graph file, or 'watch:<watch_id>' for a watched repository"},{"session_id": "ID of the session"}, {"stream": "Optional, stream the answer as server-sent events (default: false)"}, {"context_mode": "Optional, 'subgraph' (modules named in the query and their neighbours) or 'full' (default: subgraph)"}, {"hops": "Optional, neighbourhood radius around the matched modules (default: 1)"}, {"token_budget": "Optional, token budget for the graph context (default: 6000)"}, {"history_budget": "Optional, token budget for the whole request; older turns beyond it are folded into a summary (default: 16000)"}, {"use_cache": "Optional, answer repeated questions from the response cache (default: true)"}, {"grounding": "Optional, add exact reachability, cycle and layer facts for the modules the query names (default: false)"}, {"symbols": "Optional, add symbol-level dependencies of the modules the query names, read from their source (default: false)"}],
                 "request_endpoint": "/tools/query",
                 "response_parameters": [
                     {
                         "status": "Request status",
-                        "response": "Response from the LLM based on the query"
+                        "response": "Response from the LLM based on the query (with stream: 'token' events, then a 'done' event, or an 'error' event if the model fails partway)",
+                        "cached": "Whether the answer came from the response cache"
                     }
                 ]
+            },
+            {
+                "name": "Query Batch",
+                "description": "Answers many independent questions about the same dependency graph concurrently.",
+                "request_parameters": [{"queries": "List of questions (at most 100)"}, {"graph": "Path to the dependency graph file, or 'watch:<watch_id>' for a watched repository"}, {"context_mode": "Optional, as for Query"}, {"hops": "Optional, as for Query"}, {"token_budget": "Optional, as for Query"}, {"use_cache": "Optional, as for Query"}, {"grounding": "Optional, as for Query"}, {"symbols": "Optional, as for Query"}],
+                "request_endpoint": "/tools/query_batch",
+                "response_parameters": [
+                    {
+                        "status": "Request status",
+                        "results": "One entry per question, in order: query, status, response and cached"
+                    }
+                ]
+            },
+            {
+                "name": "Dependencies",
+                "description": "Lists every module a module imports, directly or transitively, with the number of hops. Computed from the graph, no LLM.",
+                "request_parameters": [{"graph": "Path to the dependency graph file, or 'watch:<watch_id>' for a watched repository"}, {"module": "Module name or unique dotted suffix"}, {"max_depth": "Optional, stop after this many hops"}, {"limit": "Optional, most rows returned (default: 1000)"}],
+                "request_endpoint": "/tools/dependencies",
+                "response_parameters": [{"module": "Resolved module name", "dependencies": "Modules with their depth, nearest first", "total": "Number of modules reached"}]
+            },
+            {
+                "name": "Dependents",
+                "description": "Lists every module that imports a module, directly or transitively: what may break when it changes.",
+                "request_parameters": [{"graph": "Path to the dependency graph file, or 'watch:<watch_id>' for a watched repository"}, {"module": "Module name or unique dotted suffix"}, {"max_depth": "Optional, stop after this many hops"}, {"limit": "Optional, most rows returned (default: 1000)"}],
+                "request_endpoint": "/tools/dependents",
+                "response_parameters": [{"module": "Resolved module name", "dependents": "Modules with their depth, nearest first", "total": "Number of modules reached"}]
+            },
+            {
+                "name": "Dependency Path",
+                "description": "Shortest chain of imports from one module to another.",
+                "request_parameters": [{"graph": "Path to the dependency graph file, or 'watch:<watch_id>' for a watched repository"}, {"source": "Importing module"}, {"target": "Imported module"}],
+                "request_endpoint": "/tools/path",
+                "response_parameters": [{"path": "Arcs along the path with their symbols, or null when unreachable", "length": "Number of hops"}]
+            },
+            {
+                "name": "Cycles",
+                "description": "Import cycles, as strongly connected components of the graph, largest first.",
+                "request_parameters": [{"graph": "Path to the dependency graph file, or 'watch:<watch_id>' for a watched repository"}, {"min_size": "Optional, smallest cycle reported (default: 2)"}, {"limit": "Optional, most cycles returned"}],
+                "request_endpoint": "/tools/cycles",
+                "response_parameters": [{"cycles": "Lists of mutually dependent modules", "total": "Number of cycles"}]
+            },
+            {
+                "name": "Layers",
+                "description": "Topological layers: layer 0 imports nothing in the graph, each module sits above everything it imports; cycles share a layer.",
+                "request_parameters": [{"graph": "Path to the dependency graph file, or 'watch:<watch_id>' for a watched repository"}],
+                "request_endpoint": "/tools/layers",
+                "response_parameters": [{"layers": "Modules per layer, bottom first", "count": "Number of layers"}]
+            },
+            {
+                "name": "Ranking",
+                "description": "Modules with the most distinct dependents (fan_in) or dependencies (fan_out).",
+                "request_parameters": [{"graph": "Path to the dependency graph file, or 'watch:<watch_id>' for a watched repository"}, {"by": "Optional, 'fan_in' or 'fan_out' (default: fan_in)"}, {"limit": "Optional, number of modules (default: 20)"}],
+                "request_endpoint": "/tools/ranking",
+                "response_parameters": [{"by": "Ranking key", "modules": "Modules with their fan_in and fan_out"}]
+            },
+            {
+                "name": "Symbols",
+                "description": "Definitions of a module, or for one of its classes or functions what it uses and where it is referenced and called. Source files are parsed on demand, only for the module and the modules importing it.",
+                "request_parameters": [{"graph": "Path to the dependency graph file, or 'watch:<watch_id>' for a watched repository"}, {"module": "Module name or unique dotted suffix"}, {"symbol": "Optional, qualified name or unique suffix of a class or function in the module"}, {"git": "Optional, repository the graph was built from, when the graph store doesn't record it"}, {"limit": "Optional, most uses and references returned (default: 1000)"}],
+                "request_endpoint": "/tools/symbols",
+                "response_parameters": [{"module": "Resolved module name", "definitions": "Classes and functions with their lines (without symbol)", "symbol": "The definition (with symbol)", "uses": "Modules and symbols it refers to", "references": "Where it is referenced: module, enclosing definition, line and whether it is a call", "total": "Number of references"}]
             }
         ])
     ])
     return Response(json.dumps(response_data), mimetype='application/json')
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(registry.render(), content_type=CONTENT_TYPE)
+
+@app.route('/cache/stats', methods=['GET'])
+def cacheStats():
+    return jsonify({
+        "status": "success",
+        **serviceCore.cache_stats()}), 200
+
+@app.route('/cache/gc', methods=['POST'])
+def cacheGc():
+    # The body is optional; {"dry_run": true} only reports what would be removed
+    data = request.get_json(silent=True) or {}
+    return jsonify({
+        "status": "success",
+        **collect_garbage(bool(data.get('dry_run')))}), 200
+
 # --------------- MCP Server POST Requests --------------- #
 
 @app.route('/prompts/get', methods=['POST'])
@@ -154,7 +360,19 @@ def getPrompt():
             "error": f"Prompt '{prompt_name}' not found"}), 404
     return jsonify({
         "status": "success",
-        "message": create_insturction(["List of nodes"],["List of arcs"]),})
+        "message": create_insturction(["package.module_a", "package.module_b"],
+                                      [{"source": "package.module_a", "target": "package.module_b", "symbol": "name"}]),})
+
+# Any of these in a /resources/get request asks for a page of the graph instead of all of it
+PAGE_PARAMETERS = ('node_offset', 'node_limit', 'arc_offset', 'arc_limit', 'source', 'target')
+
+def _pageSize(value):
+    return int(value) if value is not None else DEFAULT_PAGE_SIZE
+
+def _moduleList(value):
+    if value is None:
+        return None
+    return [value] if isinstance(value, str) else list(value)
 
 @app.route('/resources/get', methods=['POST'])
 def getResource():
@@ -168,13 +386,24 @@ def getResource():
         return jsonify({
             "status": "error",
             "error": "Missing 'resource_name' in payload"}), 400
-    file_path = os.path.join('./files', resource_name)
-    if not os.path.isfile(file_path):
+    file_path = serviceCore.resource_path(resource_name)
+    if file_path is None:
         return jsonify({
             "status": "error",
             "error": f"Resource '{resource_name}' not found"}), 404
-    with open(file_path, 'r') as file:
-        content = file.read()
+    if data.get('raw'):
+        # The document itself, chunk by chunk, instead of a string inside another document
+        return Response(stream_with_context(stream_graph_json(file_path)), mimetype='application/json')
+    if any(data.get(key) is not None for key in PAGE_PARAMETERS):
+        page = serviceCore.get_resource_page(file_path, int(data.get('node_offset') or 0),
+                                             _pageSize(data.get('node_limit')), int(data.get('arc_offset') or 0),
+                                             _pageSize(data.get('arc_limit')), _moduleList(data.get('source')),
+                                             _moduleList(data.get('target')))
+        return jsonify({
+            "status": "success",
+            "resource": resource_name,
+            **page}), 200
+    content = serviceCore.get_resource(file_path)
     return jsonify({
         "status": "success",
         "resource": content}), 200
@@ -191,16 +420,16 @@ def getMessages():
         return jsonify({
             "status": "error",
             "error": "Missing 'session_id' in payload"}), 400
-    file_path = os.path.join('./memory/sessions', session_id)
-    if not os.path.isfile(file_path):
+    limit = data.get('limit')
+    page = serviceCore.get_messages(session_id, int(data.get('offset', 0)),
+                                    int(limit) if limit is not None else None)
+    if page is None:
         return jsonify({
             "status": "error",
             "error": f"Session '{session_id}' not found"}), 404
-    with open(file_path, 'r') as file:
-        content = file.read()
     return jsonify({
         "status": "success",
-        "messages": content}), 200
+        **page}), 200
 
 @app.route('/tools/analyze', methods=['POST'])
 def analyzeGraph():
@@ -219,19 +448,145 @@ def analyzeGraph():
         return jsonify({
             "status": "error",
             "error": f"Provided path '{git_repo}' is not a valid directory"}), 400
-    #Build dependency graph
-    try:
-        currGraph = GraphBuilder(git_repo)
-        currGraph.build()
-        dependencyGraph = currGraph.export_graph()
-        session_id = create_session()
+    if data.get('workers') is not None and data['workers'] < 1:
+        return jsonify({
+            "status": "error",
+            "error": "'workers' must be at least 1"}), 400
+    #Submit the build as a background job
+    job, shared = job_manager.submit(git_repo, parallel=data.get('parallel'), workers=data.get('workers'),
+                                     chunksize=data.get('chunksize'), use_cache=data.get('use_cache', True),
+                                     use_git=bool(data.get('use_git')), format=data.get('format'),
+                                     max_file_bytes=data.get('max_file_bytes'), large_files=data.get('large_files'),
+                                     prefixes=data.get('prefixes'), shards=bool(data.get('shards')))
+    if not data.get('wait'):
         return jsonify({
             "status": "success",
-            "graph_path": dependencyGraph,
-            "session_id":session_id}), 200
+            "job_id": job.job_id,
+            "shared": shared,
+            "job": job.to_dict()}), 200
+    wait([job.future])
+    if job.status != "done":
+        return jsonify({"error": f"Internal server error: {job.error or 'Analysis ' + job.status}"}), 500
+    return jsonify({
+        "status": "success",
+        "graph_path": job.graph_path,
+        "reused": job.reused,
+        "session_id": job.session_id,
+        "job_id": job.job_id,
+        "large_files": job.large_files,
+        "timings": job.to_dict()["timings"]}), 200
 
-    except Exception as e:
-        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+@app.route('/tools/analyze/status', methods=['POST'])
+def analyzeStatus():
+    data = request.get_json()
+    if not data or not data.get('job_id'):
+        return jsonify({
+            "status": "error",
+            "error": "Missing 'job_id' in payload"}), 400
+    job = job_manager.get(data['job_id'])
+    if job is None:
+        return jsonify({
+            "status": "error",
+            "error": f"Job '{data['job_id']}' not found"}), 404
+    return jsonify({
+        "status": "success",
+        "job": job.to_dict()}), 200
+
+@app.route('/tools/analyze/cancel', methods=['POST'])
+def analyzeCancel():
+    data = request.get_json()
+    if not data or not data.get('job_id'):
+        return jsonify({
+            "status": "error",
+            "error": "Missing 'job_id' in payload"}), 400
+    job = job_manager.cancel(data['job_id'])
+    if job is None:
+        return jsonify({
+            "status": "error",
+            "error": f"Job '{data['job_id']}' not found"}), 404
+    return jsonify({
+        "status": "success",
+        "job": job.to_dict()}), 200
+
+@app.route('/tools/watch', methods=['POST'])
+def watchRepo():
+    data = request.get_json()
+    if not data or not data.get('git'):
+        return jsonify({
+            "status": "error",
+            "error": "Missing 'git' path in payload"}), 400
+    if not os.path.isdir(data['git']):
+        return jsonify({
+            "status": "error",
+            "error": f"Provided path '{data['git']}' is not a valid directory"}), 400
+    if data.get('workers') is not None and data['workers'] < 1:
+        return jsonify({
+            "status": "error",
+            "error": "'workers' must be at least 1"}), 400
+    try:
+        watch, shared = watch_manager.start(data['git'], interval=data.get('interval'), workers=data.get('workers'),
+                                            use_cache=data.get('use_cache', True), use_git=bool(data.get('use_git')),
+                                            max_file_bytes=data.get('max_file_bytes'),
+                                            large_files=data.get('large_files'), prefixes=data.get('prefixes'))
+    except ValueError as e:
+        return jsonify({
+            "status": "error",
+            "error": str(e)}), 429
+    return jsonify({
+        "status": "success",
+        "watch_id": watch.watch_id,
+        "graph": watch.ref,
+        "session_id": watch.session_id,
+        "shared": shared,
+        "watch": watch.to_dict()}), 200
+
+def _getWatch(data: dict):
+    # Returns (Watch, None) or (None, error response)
+    if not data or not data.get('watch_id'):
+        return None, (jsonify({"status": "error", "error": "Missing 'watch_id' in payload"}), 400)
+    watch = watch_manager.get(data['watch_id'])
+    if watch is None:
+        return None, (jsonify({"status": "error", "error": f"Watch '{data['watch_id']}' not found"}), 404)
+    return watch, None
+
+@app.route('/tools/watch/status', methods=['POST'])
+def watchStatus():
+    watch, error = _getWatch(request.get_json())
+    if error:
+        return error
+    return jsonify({
+        "status": "success",
+        "watch": watch.to_dict()}), 200
+
+@app.route('/tools/watch/snapshot', methods=['POST'])
+def watchSnapshot():
+    data = request.get_json()
+    watch, error = _getWatch(data)
+    if error:
+        return error
+    if watch.status != "watching":
+        return jsonify({"status": "error", "error": f"Watch '{watch.watch_id}' is {watch.status}"}), 409
+    graph_path, version = watch.live.snapshot(data.get('format') or "json")
+    return jsonify({
+        "status": "success",
+        "graph_path": graph_path,
+        "version": version}), 200
+
+@app.route('/tools/watch/stop', methods=['POST'])
+def watchStop():
+    data = request.get_json()
+    if not data or not data.get('watch_id'):
+        return jsonify({
+            "status": "error",
+            "error": "Missing 'watch_id' in payload"}), 400
+    watch = watch_manager.stop(data['watch_id'])
+    if watch is None:
+        return jsonify({
+            "status": "error",
+            "error": f"Watch '{data['watch_id']}' not found"}), 404
+    return jsonify({
+        "status": "success",
+        "watch": watch.to_dict()}), 200
 
 @app.route('/tools/query', methods=['POST'])
 def queryGraph():
@@ -243,31 +598,179 @@ def queryGraph():
     session_id = data.get('session_id')
     if (not query) or (not graph) or (not session_id):
         return jsonify({"error": "Missing Atrributes query/graph"}), 400
-    nodes, arcs = load_graph(graph)
     try:
-        with open(os.path.join('./memory/sessions', session_id), 'r') as file:
-            content = file.read()
-        history = json.loads(content)
-        if history["messages"] == []:
-            sys_msg = create_insturction(nodes,arcs)
-            history["messages"].append({"role": "system", "content": sys_msg})
-            history["messages"].append({"role": "user", "content": query})
-            llm_response = send_query_to_llm(history["messages"])
-            history["messages"].append({"role": "assistant", "content": llm_response})
-            with open(os.path.join('./memory/sessions', session_id), 'w') as file:
-                json.dump(history, file, indent=2)
-        else:
-            sys_msg = history["messages"][0]["content"]
-            history["messages"].append({"role": "user", "content": query})
-            llm_response = send_query_to_llm(history["messages"])
-            history["messages"].append({"role": "assistant", "content": llm_response})
-            with open(os.path.join('./memory/sessions', session_id), 'w') as file:
-                json.dump(history, file, indent=2)
+        turn = serviceCore.prepare_query(graph, query, session_id, data.get('context_mode', "subgraph"),
+                                         data.get('hops', DEFAULT_HOPS), data.get('token_budget', DEFAULT_TOKEN_BUDGET),
+                                         data.get('history_budget', DEFAULT_REQUEST_BUDGET),
+                                         data.get('use_cache', True), bool(data.get('grounding')),
+                                         bool(data.get('symbols')))
+        if data.get('stream'):
+            events = (stream_cached_events(session_id, turn.new_msgs, turn.cached) if turn.cached is not None
+                      else stream_llm_events(session_id, turn.new_msgs, turn.msgs, turn.cache_key))
+            return Response(stream_with_context(events),
+                            mimetype='text/event-stream',
+                            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        llm_response = turn.cached if turn.cached is not None else send_query_to_llm(turn.msgs)
+        serviceCore.finish_query(turn, llm_response)
         return jsonify({
             "status": "success",
-            "response":llm_response}), 200
+            "response":llm_response,
+            "cached": turn.cached is not None}), 200
     except Exception as e:
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
+@app.route('/tools/query_batch', methods=['POST'])
+def queryBatch():
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "Missing JSON payload"}), 400
+    queries = data.get('queries')
+    graph = data.get('graph')
+    if (not queries) or (not graph) or not isinstance(queries, list):
+        return jsonify({"error": "Missing Atrributes queries/graph"}), 400
+    if len(queries) > MAX_BATCH_QUERIES:
+        return jsonify({"error": f"At most {MAX_BATCH_QUERIES} queries per batch"}), 400
+    try:
+        graph_entry = graph_cache.get(graph)
+        # Flask handlers are synchronous, so the batch runs on the shared background loop
+        results = run_in_background_loop(answer_queries(graph_entry, queries,
+                                                        context_mode=data.get('context_mode', "subgraph"),
+                                                        hops=data.get('hops', DEFAULT_HOPS),
+                                                        token_budget=data.get('token_budget', DEFAULT_TOKEN_BUDGET),
+                                                        use_cache=data.get('use_cache', True),
+                                                        grounding=bool(data.get('grounding')),
+                                                        symbols=bool(data.get('symbols'))))
+        return jsonify({
+            "status": "success",
+            "results": results}), 200
+    except Exception as e:
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+def _graphQuery(data: dict):
+    # Returns (GraphQuery, None) or (None, error response)
+    if not data or not data.get('graph'):
+        return None, (jsonify({"error": "Missing Atrributes graph"}), 400)
+    try:
+        query = serviceCore.graph_query(data['graph'])
+    except WatchNotReady as e:
+        return None, (jsonify({"error": str(e)}), 409)
+    if query is None:
+        return None, (jsonify({"error": f"Graph '{data['graph']}' not found"}), 404)
+    return query, None
+
+def _closureResponse(data: dict, key: str):
+    query, error = _graphQuery(data)
+    if error:
+        return error
+    if not data.get('module'):
+        return jsonify({"error": "Missing Atrributes module"}), 400
+    try:
+        closure = query.dependencies if key == "dependencies" else query.dependents
+        rows, total = closure(data['module'], data.get('max_depth'), data.get('limit', ANALYTICS_ROW_LIMIT))
+    except ModuleNotFound as e:
+        return jsonify({"error": e.args[0]}), 404
+    return jsonify({
+        "status": "success",
+        "module": query.names[query.resolve(data['module'])],
+        key: rows,
+        "total": total}), 200
+
+@app.route('/tools/dependencies', methods=['POST'])
+def dependencies():
+    return _closureResponse(request.get_json(), "dependencies")
+
+@app.route('/tools/dependents', methods=['POST'])
+def dependents():
+    return _closureResponse(request.get_json(), "dependents")
+
+@app.route('/tools/path', methods=['POST'])
+def dependencyPath():
+    data = request.get_json()
+    query, error = _graphQuery(data)
+    if error:
+        return error
+    if (not data.get('source')) or (not data.get('target')):
+        return jsonify({"error": "Missing Atrributes source/target"}), 400
+    try:
+        path = query.shortest_path(data['source'], data['target'])
+    except ModuleNotFound as e:
+        return jsonify({"error": e.args[0]}), 404
+    return jsonify({
+        "status": "success",
+        "path": path,
+        "length": len(path) if path is not None else None}), 200
+
+@app.route('/tools/cycles', methods=['POST'])
+def cycles():
+    data = request.get_json()
+    query, error = _graphQuery(data)
+    if error:
+        return error
+    groups = query.cycles(data.get('min_size', 2))
+    return jsonify({
+        "status": "success",
+        "cycles": groups[:data.get('limit')],
+        "total": len(groups)}), 200
+
+@app.route('/tools/layers', methods=['POST'])
+def layers():
+    query, error = _graphQuery(request.get_json())
+    if error:
+        return error
+    result = query.layers()
+    return jsonify({
+        "status": "success",
+        "layers": result,
+        "count": len(result)}), 200
+
+@app.route('/tools/ranking', methods=['POST'])
+def ranking():
+    data = request.get_json()
+    query, error = _graphQuery(data)
+    if error:
+        return error
+    by = data.get('by', "fan_in")
+    try:
+        modules = query.ranking(by, data.get('limit', 20))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({
+        "status": "success",
+        "by": by,
+        "modules": modules}), 200
+
+@app.route('/tools/symbols', methods=['POST'])
+def symbols():
+    data = request.get_json()
+    query, error = _graphQuery(data)
+    if error:
+        return error
+    if not data.get('module'):
+        return jsonify({"error": "Missing Atrributes module"}), 400
+    if data.get('git') and not os.path.isdir(data['git']):
+        return jsonify({"error": f"Provided path '{data['git']}' is not a valid directory"}), 400
+    index = cached_symbol_index(graph_cache.get(data['graph']), data.get('git'))
+    if index is None:
+        return jsonify({"error": f"Repository of graph '{data['graph']}' is not known, pass 'git'"}), 400
+    limit = data.get('limit', ANALYTICS_ROW_LIMIT)
+    try:
+        module = query.names[query.resolve(data['module'])]
+        if not data.get('symbol'):
+            return jsonify({
+                "status": "success",
+                "module": module,
+                "definitions": index.module(module)["definitions"]}), 200
+        definition = index.definition(module, data['symbol'])
+        references = index.references(module, definition["name"])
+        return jsonify({
+            "status": "success",
+            "module": module,
+            "symbol": definition,
+            "uses": index.uses(module, definition["name"])[:limit],
+            "references": references[:limit],
+            "total": len(references)}), 200
+    except (ModuleNotFound, SymbolNotFound) as e:
+        return jsonify({"error": e.args[0]}), 404
+
 if __name__ == "__main__":
     app.run(debug=True,port=5000)
@@ -0,0 +1,99 @@
+import os
+from messages.tokens import count_tokens
+from .memoryOrch import get_session_meta, set_session_meta
+
+# Token budget for everything sent to the LLM in one request: system prompt, summary and turns
+DEFAULT_REQUEST_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "16000"))
+# Most recent messages (user and assistant) kept verbatim whenever they fit the budget
+KEEP_RECENT_MESSAGES = 6
+# Share of the budget the rolling summary may take
+SUMMARY_SHARE = 0.25
+# "extractive" (default, no LLM call) or "llm"
+HISTORY_SUMMARIZER = os.getenv("HISTORY_SUMMARIZER", "extractive")
+
+SUMMARY_HEADER = "Summary of the earlier conversation:"
+# Characters of each folded message that survive extractive summarization
+EXCERPT_CHARS = 240
+# Per-message overhead the chat format adds on top of the content
+MESSAGE_OVERHEAD = 4
+
+def message_tokens(message: dict) -> int:
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD
+
+def _excerpt(text: str) -> str:
+    text = " ".join(text.split())
+    # First sentence is usually the question or the gist of the answer
+    end = text.find(". ")
+    if 0 < end < EXCERPT_CHARS:
+        return text[:end + 1]
+    return text if len(text) <= EXCERPT_CHARS else text[:EXCERPT_CHARS].rstrip() + "..."
+
+def extractive_summary(previous: str, messages: list, max_tokens: int) -> str:
+    # One line per folded message; the oldest lines go first once the summary is over its budget
+    lines = previous.splitlines() if previous else []
+    lines.extend(f"- {m['role']}: {_excerpt(m['content'])}" for m in messages)
+    while len(lines) > 1 and count_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+def llm_summary(previous: str, messages: list, max_tokens: int) -> str:
+    from messages.query_llm import send_query_to_llm
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    prompt = (f"Update the running summary of a conversation about a code dependency graph. "
+              f"Keep module names, findings and open questions. Answer in at most {max_tokens} tokens.\n\n"
+              f"Current summary:\n{previous or '(empty)'}\n\nNew messages:\n{transcript}")
+    summary = send_query_to_llm([{"role": "user", "content": prompt}])
+    if summary.startswith("[LLM Error]") or count_tokens(summary) > max_tokens:
+        # The call failed or the model ignored the limit; an error text must never become the
+        # summary sent with every later turn, and the request must still fit its budget
+        return extractive_summary(previous, messages, max_tokens)
+    return summary
+
+SUMMARIZERS = {
+    "extractive": extractive_summary,
+    "llm": llm_summary,
+}
+
+def fit_history(session_id: str, system_prompt: str, conversation: list, token_budget: int = None,
+                summarizer: str = None) -> list:
+    # Messages for one request: the system prompt, a rolling summary of older turns and the
+    # most recent turns verbatim. conversation is every non-system message so far, oldest
+    # first, ending with the new user message. The session log on disk is left untouched.
+    token_budget = token_budget or DEFAULT_REQUEST_BUDGET
+    system = {"role": "system", "content": system_prompt}
+    used = message_tokens(system)
+    if used + sum(message_tokens(m) for m in conversation) <= token_budget:
+        return [system] + conversation
+
+    # Newest first, keep what fits; the new user message is always sent
+    summary_budget = int(token_budget * SUMMARY_SHARE)
+    keep = 0
+    for message in reversed(conversation):
+        cost = message_tokens(message)
+        if keep and (keep >= KEEP_RECENT_MESSAGES or used + cost > token_budget - summary_budget):
+            break
+        used += cost
+        keep += 1
+    # Start the verbatim part on a question rather than on half of an exchange
+    while keep > 1 and conversation[-keep]["role"] != "user":
+        keep -= 1
+    folded = len(conversation) - keep
+
+    # The summary covers conversation[:upto] and only grows, so each message is summarized once
+    meta = get_session_meta(session_id)
+    state = meta.get("history_summary") or {}
+    upto, summary = state.get("upto", 0), state.get("summary", "")
+    if upto > folded:
+        # Recent turns got shorter than when the summary was made; start over
+        upto, summary = 0, ""
+    if folded > upto:
+        summarize = SUMMARIZERS.get(summarizer or HISTORY_SUMMARIZER, extractive_summary)
+        summary = summarize(summary, conversation[upto:folded], summary_budget)
+        upto = folded
+        meta["history_summary"] = {"upto": upto, "summary": summary}
+        set_session_meta(session_id, meta)
+
+    msgs = [system]
+    if summary:
+        msgs.append({"role": "system", "content": f"{SUMMARY_HEADER}\n{summary}"})
+    return msgs + conversation[folded:]
@@ -1,19 +1,47 @@
-import json
-import os
-import uuid
+from tools.metrics import phase
+from .sessionStore import get_store
+
+# Backend picked by SESSION_BACKEND: "jsonl" (default, one append log per session) or "sqlite"
+store = get_store()
 
 def create_session() -> str:
-    base_dir = os.path.abspath(".")
-    output_folder = os.path.join(base_dir, "memory", "sessions")
-    os.makedirs(output_folder, exist_ok=True)  # Force creation if missing
-    uid = str(uuid.uuid4())
-    filename = f"{uid}.json"
-    filepath = os.path.normpath(os.path.join(output_folder, filename))
-    data = {
-        "session_id": uid,
-        "messages": [],
-    }
-    # Actually save the file
-    with open(filepath, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
-    return uid
\ No newline at end of file
+    return store.create()
+
+def session_exists(session_id: str) -> bool:
+    try:
+        return store.exists(session_id)
+    except ValueError:
+        return False
+
+def list_sessions(offset: int = 0, limit: int = None) -> list:
+    return store.list(offset, limit)
+
+def count_sessions() -> int:
+    return store.count()
+
+def expire_sessions(idle_seconds: float, empty_seconds: float, dry_run: bool = False) -> list:
+    # Returns the ids of the sessions removed (or that would be, with dry_run)
+    return store.expire(idle_seconds, empty_seconds, dry_run)
+
+def load_session(session_id: str) -> dict:
+    with phase("session_read"):
+        messages, _ = store.read(session_id)
+    return {"session_id": session_id, "messages": messages}
+
+def read_messages(session_id: str, offset: int = 0, limit: int = None):
+    # Returns (page of messages, total number of messages)
+    with phase("session_read"):
+        return store.read(session_id, offset, limit)
+
+def append_messages(session_id: str, messages: list):
+    # Only the new messages of a turn are written, never the whole history
+    with phase("session_write"):
+        store.append(session_id, messages)
+
+def get_session_meta(session_id: str) -> dict:
+    with phase("session_read"):
+        return store.get_meta(session_id)
+
+def set_session_meta(session_id: str, meta: dict):
+    with phase("session_write"):
+        store.set_meta(session_id, meta)
@@ -0,0 +1,331 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "jsonl")
+_SESSION_ID = re.compile(r"^[\w-]+$")
+
+def normalize_session_id(session_id: str) -> str:
+    # Accept the bare id as well as the file names older versions listed
+    for ext in (".jsonl", ".json"):
+        if session_id.endswith(ext):
+            session_id = session_id[:-len(ext)]
+    if not _SESSION_ID.match(session_id):
+        raise ValueError(f"Invalid session id '{session_id}'")
+    return session_id
+
+@contextmanager
+def _file_lock(f, exclusive: bool):
+    # Advisory lock shared by every process using the same file, e.g. several uvicorn workers
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        return
+    pos = f.tell()
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            break
+        except OSError:
+            time.sleep(0.05)
+    try:
+        f.seek(pos)
+        yield
+    finally:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _opens_with_system(messages: list) -> bool:
+    # The first turn of a session starts with its system prompt. Two first turns running at
+    # once both carry one, so the stores write it only while the session is still empty,
+    # checked under the same lock as the write itself.
+    return bool(messages) and messages[0]["role"] == "system"
+
+class JSONLSessionStore:
+    # memory/sessions/<id>.jsonl: a header line, then one message per line. A turn is
+    # a single O_APPEND write under the file lock, so it costs the same at any history length.
+    def __init__(self, folder: str = None):
+        self.folder = folder or os.path.join(os.path.abspath("."), "memory", "sessions")
+
+    def _path(self, session_id: str) -> str:
+        return os.path.join(self.folder, f"{session_id}.jsonl")
+
+    def _legacy_path(self, session_id: str) -> str:
+        return os.path.join(self.folder, f"{session_id}.json")
+
+    def create(self) -> str:
+        os.makedirs(self.folder, exist_ok=True)  # Force creation if missing
+        uid = str(uuid.uuid4())
+        with open(self._path(uid), "x", encoding="utf-8") as f:
+            f.write(json.dumps({"session_id": uid, "created": time.time()}) + "\n")
+        return uid
+
+    def exists(self, session_id: str) -> bool:
+        session_id = normalize_session_id(session_id)
+        return os.path.isfile(self._path(session_id)) or os.path.isfile(self._legacy_path(session_id))
+
+    def _ids(self) -> list:
+        if not os.path.isdir(self.folder):
+            return []
+        return sorted(set(name.rsplit(".", 1)[0] for name in os.listdir(self.folder)
+                          if name.endswith((".jsonl", ".json")) and not name.endswith(".meta.json")))
+
+    def list(self, offset: int = 0, limit: int = None) -> list:
+        return self._ids()[offset:offset + limit if limit is not None else None]
+
+    def count(self) -> int:
+        return len(self._ids())
+
+    def expire(self, idle_seconds: float, empty_seconds: float, dry_run: bool = False) -> list:
+        # Removes sessions without a new message for idle_seconds, and sessions that never
+        # got one after empty_seconds. Every append moves the log's mtime forward.
+        now = time.time()
+        expired = []
+        for session_id in self._ids():
+            path = self._path(session_id)
+            if not os.path.isfile(path):
+                path = self._legacy_path(session_id)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            idle = now - st.st_mtime
+            if idle_seconds and idle > idle_seconds:
+                expired.append(session_id)
+            elif empty_seconds and idle > empty_seconds and path.endswith(".jsonl") and self._is_empty(path):
+                expired.append(session_id)
+        if not dry_run:
+            for session_id in expired:
+                for path in (self._path(session_id), self._legacy_path(session_id), self._meta_path(session_id)):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+        return expired
+
+    def _is_empty(self, path: str) -> bool:
+        with open(path, "r", encoding="utf-8") as f:
+            f.readline()  # header
+            return not any(line.strip() for line in f)
+
+    def _migrate(self, session_id: str):
+        # Sessions written as a single JSON document become an append log on first write
+        legacy = self._legacy_path(session_id)
+        if os.path.isfile(self._path(session_id)) or not os.path.isfile(legacy):
+            return
+        with open(legacy, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        tmp = self._path(session_id) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"session_id": session_id, "created": os.path.getmtime(legacy)}) + "\n")
+            for message in data.get("messages", []):
+                f.write(json.dumps(message) + "\n")
+        os.replace(tmp, self._path(session_id))
+        os.remove(legacy)
+
+    def read(self, session_id: str, offset: int = 0, limit: int = None):
+        # Returns (messages in the page, total number of messages)
+        session_id = normalize_session_id(session_id)
+        path = self._path(session_id)
+        if not os.path.isfile(path):
+            legacy = self._legacy_path(session_id)
+            if not os.path.isfile(legacy):
+                raise FileNotFoundError(f"Session '{session_id}' not found")
+            with open(legacy, "r", encoding="utf-8") as f:
+                messages = json.load(f).get("messages", [])
+            return messages[offset:offset + limit if limit is not None else None], len(messages)
+        stop = offset + limit if limit is not None else None
+        page = []
+        total = 0
+        with open(path, "r", encoding="utf-8") as f:
+            with _file_lock(f, exclusive=False):
+                f.readline()  # header
+                for line in f:
+                    if not line.strip():
+                        continue
+                    # Only the lines in the page are decoded
+                    if total >= offset and (stop is None or total < stop):
+                        page.append(json.loads(line))
+                    total += 1
+        return page, total
+
+    def append(self, session_id: str, messages: list):
+        # A leading system message is only written to an empty session (see _opens_with_system)
+        session_id = normalize_session_id(session_id)
+        if not os.path.isfile(self._path(session_id)):
+            if not os.path.isfile(self._legacy_path(session_id)):
+                raise FileNotFoundError(f"Session '{session_id}' not found")
+            with self._migration_lock(session_id):
+                self._migrate(session_id)
+        # Without O_CREAT: a session removed by retention in the middle of a turn stays removed
+        # instead of coming back as a log without its header line
+        fd = os.open(self._path(session_id), os.O_RDWR | os.O_APPEND | getattr(os, "O_BINARY", 0))
+        with os.fdopen(fd, "a+", encoding="utf-8") as f:
+            with _file_lock(f, exclusive=True):
+                if _opens_with_system(messages):
+                    f.seek(0)
+                    f.readline()  # header
+                    if f.readline().strip():
+                        messages = messages[1:]
+                f.write("".join(json.dumps(m) + "\n" for m in messages))
+                f.flush()
+
+    def _meta_path(self, session_id: str) -> str:
+        return os.path.join(self.folder, f"{session_id}.meta.json")
+
+    def get_meta(self, session_id: str) -> dict:
+        # Small per-session state kept next to the log (e.g. the rolling history summary)
+        try:
+            with open(self._meta_path(normalize_session_id(session_id)), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def set_meta(self, session_id: str, meta: dict):
+        path = self._meta_path(normalize_session_id(session_id))
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, path)
+
+    @contextmanager
+    def _migration_lock(self, session_id: str):
+        os.makedirs(self.folder, exist_ok=True)
+        lock_path = os.path.join(self.folder, f"{session_id}.lock")
+        with open(lock_path, "a+") as f:
+            with _file_lock(f, exclusive=True):
+                yield
+                # Later appends find the .jsonl and never take this lock again
+                try:
+                    os.remove(lock_path)
+                except OSError:
+                    pass
+
+class SQLiteSessionStore:
+    # One database for all sessions; WAL keeps readers unblocked while a worker appends
+    def __init__(self, path: str = None):
+        self.path = path or os.path.join(os.path.abspath("."), "memory", "sessions.sqlite")
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, created REAL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages (session_id TEXT, seq INTEGER, role TEXT, content TEXT, "
+                "extra TEXT, PRIMARY KEY (session_id, seq))")
+            conn.execute("CREATE TABLE IF NOT EXISTS session_meta (session_id TEXT PRIMARY KEY, meta TEXT)")
+            # Time of the last appended message, for expiring idle sessions
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(sessions)")]
+            if "updated" not in columns:
+                conn.execute("ALTER TABLE sessions ADD COLUMN updated REAL")
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared between threads, so each thread gets its own
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def create(self) -> str:
+        uid = str(uuid.uuid4())
+        with self._conn() as conn:
+            conn.execute("INSERT INTO sessions (session_id, created) VALUES (?, ?)", (uid, time.time()))
+        return uid
+
+    def exists(self, session_id: str) -> bool:
+        session_id = normalize_session_id(session_id)
+        row = self._conn().execute("SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row is not None
+
+    def list(self, offset: int = 0, limit: int = None) -> list:
+        rows = self._conn().execute(
+            "SELECT session_id FROM sessions ORDER BY session_id LIMIT ? OFFSET ?",
+            (-1 if limit is None else limit, offset)).fetchall()
+        return [r[0] for r in rows]
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def expire(self, idle_seconds: float, empty_seconds: float, dry_run: bool = False) -> list:
+        # Same policy as the JSONL store; a session without messages has no updated time
+        now = time.time()
+        conn = self._conn()
+        expired = [r[0] for r in conn.execute(
+            "SELECT session_id FROM sessions WHERE (? > 0 AND COALESCE(updated, created) < ?) "
+            "OR (? > 0 AND updated IS NULL AND created < ?)",
+            (idle_seconds, now - idle_seconds, empty_seconds, now - empty_seconds))]
+        if not dry_run:
+            with conn:
+                for session_id in expired:
+                    for table in ("messages", "session_meta", "sessions"):
+                        conn.execute(f"DELETE FROM {table} WHERE session_id = ?", (session_id,))
+        return expired
+
+    def read(self, session_id: str, offset: int = 0, limit: int = None):
+        session_id = normalize_session_id(session_id)
+        if not self.exists(session_id):
+            raise FileNotFoundError(f"Session '{session_id}' not found")
+        conn = self._conn()
+        total = conn.execute("SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)).fetchone()[0]
+        rows = conn.execute(
+            "SELECT role, content, extra FROM messages WHERE session_id = ? ORDER BY seq LIMIT ? OFFSET ?",
+            (session_id, -1 if limit is None else limit, offset)).fetchall()
+        messages = []
+        for role, content, extra in rows:
+            message = {"role": role, "content": content}
+            if extra:
+                message.update(json.loads(extra))
+            messages.append(message)
+        return messages, total
+
+    def append(self, session_id: str, messages: list):
+        session_id = normalize_session_id(session_id)
+        if not self.exists(session_id):
+            raise FileNotFoundError(f"Session '{session_id}' not found")
+        conn = self._conn()
+        with conn:
+            # IMMEDIATE takes the write lock up front, so concurrent appends get distinct seqs
+            conn.execute("BEGIN IMMEDIATE")
+            seq = conn.execute("SELECT COALESCE(MAX(seq), -1) FROM messages WHERE session_id = ?",
+                               (session_id,)).fetchone()[0]
+            if seq >= 0 and _opens_with_system(messages):
+                messages = messages[1:]
+            rows = []
+            for message in messages:
+                seq += 1
+                extra = {k: v for k, v in message.items() if k not in ("role", "content")}
+                rows.append((session_id, seq, message["role"], message["content"], json.dumps(extra) if extra else None))
+            conn.executemany("INSERT INTO messages (session_id, seq, role, content, extra) VALUES (?, ?, ?, ?, ?)", rows)
+            conn.execute("UPDATE sessions SET updated = ? WHERE session_id = ?", (time.time(), session_id))
+
+    def get_meta(self, session_id: str) -> dict:
+        row = self._conn().execute("SELECT meta FROM session_meta WHERE session_id = ?",
+                                   (normalize_session_id(session_id),)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def set_meta(self, session_id: str, meta: dict):
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO session_meta (session_id, meta) VALUES (?, ?)",
+                         (normalize_session_id(session_id), json.dumps(meta)))
+
+def get_store(backend: str = SESSION_BACKEND):
+    if backend == "sqlite":
+        return SQLiteSessionStore()
+    return JSONLSessionStore()
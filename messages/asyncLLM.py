@@ -0,0 +1,161 @@
+import asyncio
+import os
+import random
+import threading
+import weakref
+from tools.metrics import phase, LLM_REQUESTS
+from .query_llm import api_key, api_version, azure_endpoint, deployment_name, llm_backend, llm_timeout, llm_max_retries
+from .query_llm import record_completion, LLMStreamError
+
+# Completions in flight at once per process; the rest wait for a slot
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Backoff before retry n is a random delay up to min(BACKOFF_MAX, BACKOFF_BASE * 2**n)
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 20.0
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+class LLMRequestError(Exception):
+    pass
+
+def _retryable(error: Exception) -> bool:
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRY_STATUS
+    # Timeouts and dropped connections carry no status
+    return isinstance(error, (asyncio.TimeoutError, ConnectionError)) or \
+        type(error).__name__ in ("APITimeoutError", "APIConnectionError")
+
+def _retry_after(error: Exception):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt: int, error: Exception = None) -> float:
+    # Full jitter keeps many clients that failed together from retrying together
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    hint = _retry_after(error) if error is not None else None
+    return max(delay, min(hint, BACKOFF_MAX)) if hint is not None else delay
+
+class AsyncLLMClient:
+    # One pooled client and one concurrency limit per event loop. They are created on first
+    # use because both are bound to the loop that is running at that point.
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, timeout: float = llm_timeout,
+                 max_retries: int = llm_max_retries):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._per_loop = weakref.WeakKeyDictionary()
+        self.in_flight = 0
+        self.retries = 0
+
+    def _make_client(self):
+        if llm_backend == "fake":
+            from .fakeLLM import FakeAsyncClient
+            return FakeAsyncClient()
+        import httpx
+        from openai import AsyncAzureOpenAI
+        # Keep-alive connections are reused across requests instead of a TLS handshake each
+        http_client = httpx.AsyncClient(limits=httpx.Limits(max_connections=self.max_concurrency,
+                                                            max_keepalive_connections=self.max_concurrency))
+        return AsyncAzureOpenAI(api_key=api_key, api_version=api_version, azure_endpoint=azure_endpoint,
+                                http_client=http_client, max_retries=0)
+
+    def _ensure(self):
+        # (client, semaphore) for the running loop: FastAPI has one, a Flask batch runs its own
+        loop = asyncio.get_running_loop()
+        state = self._per_loop.get(loop)
+        if state is None:
+            state = self._per_loop[loop] = (self._make_client(), asyncio.Semaphore(self.max_concurrency))
+        return state
+
+    async def _create(self, msgs: list, stream: bool):
+        client, _ = self._ensure()
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await asyncio.wait_for(
+                    client.chat.completions.create(model=deployment_name, messages=msgs, temperature=0.4,
+                                                   stream=stream),
+                    self.timeout)
+            except Exception as e:
+                if attempt == self.max_retries or not _retryable(e):
+                    raise LLMRequestError(str(e) or type(e).__name__) from e
+                self.retries += 1
+                await asyncio.sleep(backoff_delay(attempt, e))
+
+    async def complete(self, msgs: list) -> str:
+        _, semaphore = self._ensure()
+        async with semaphore:
+            self.in_flight += 1
+            try:
+                response = await self._create(msgs, stream=False)
+            finally:
+                self.in_flight -= 1
+        text = response.choices[0].message.content.strip()
+        record_completion(msgs, text, getattr(response, "usage", None))
+        return text
+
+    async def stream(self, msgs: list):
+        # The slot is held until the last token arrives; only opening the stream is retried.
+        # Each chunk must arrive within the timeout, so a stalled stream gives its slot back.
+        _, semaphore = self._ensure()
+        async with semaphore:
+            self.in_flight += 1
+            try:
+                stream = await self._create(msgs, stream=True)
+                chunks = stream.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), self.timeout)
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        raise LLMRequestError(f"Stream stalled: no data for {self.timeout:g} seconds") from None
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {"max_concurrency": self.max_concurrency, "in_flight": self.in_flight, "retries": self.retries}
+
+# Shared by every request handled by this process
+llm_client = AsyncLLMClient()
+
+_background_loop = None
+_background_lock = threading.Lock()
+
+def run_in_background_loop(coro):
+    # Runs a coroutine from synchronous code (Flask handlers) and waits for its result. All
+    # of them share one long-lived loop in a daemon thread, so they share its pooled client
+    # and concurrency limit; a loop per call would open a client and connections every time.
+    global _background_loop
+    if _background_loop is None:
+        with _background_lock:
+            if _background_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-loop", daemon=True).start()
+                _background_loop = loop
+    return asyncio.run_coroutine_threadsafe(coro, _background_loop).result()
+
+async def async_send_query_to_llm(msgs: list) -> str:
+    try:
+        # Includes the wait for a concurrency slot and any retries
+        with phase("llm"):
+            return await llm_client.complete(msgs)
+    except Exception as e:
+        LLM_REQUESTS.inc(outcome="error")
+        return f"[LLM Error] {str(e)}"
+
+async def async_stream_query_to_llm(msgs: list):
+    parts = []
+    try:
+        with phase("llm"):
+            async for token in llm_client.stream(msgs):
+                parts.append(token)
+                yield token
+        record_completion(msgs, "".join(parts))
+    except Exception as e:
+        LLM_REQUESTS.inc(outcome="error")
+        raise LLMStreamError(str(e) or type(e).__name__) from e
@@ -0,0 +1,50 @@
+import asyncio
+from collections import OrderedDict
+from insturctions.contextBuilder import cached_system_prompt, grounding_facts, symbol_facts, DEFAULT_HOPS, DEFAULT_TOKEN_BUDGET
+from messages.asyncLLM import async_send_query_to_llm
+from messages.responseCache import response_cache, query_cache_key
+
+# Largest number of questions accepted in one /tools/query_batch call
+MAX_BATCH_QUERIES = 100
+
+def _prepare_query(graph, query: str, context_mode: str, hops: int, token_budget: int, use_cache: bool,
+                   grounding: bool, symbols: bool):
+    # Prompt building reads sources and the response cache, so it runs in a worker thread
+    sys_msg = cached_system_prompt(graph, query, context_mode, hops, token_budget)
+    if grounding:
+        facts = grounding_facts(graph, query)
+        sys_msg = f"{sys_msg}\n\n{facts}" if facts else sys_msg
+    if symbols:
+        facts = symbol_facts(graph, query)
+        sys_msg = f"{sys_msg}\n\n{facts}" if facts else sys_msg
+    msgs = [{"role": "system", "content": sys_msg}, {"role": "user", "content": query}]
+    cache_key = None
+    cached = None
+    if use_cache and response_cache.enabled:
+        cache_key = query_cache_key(graph, query, msgs, {"context_mode": context_mode, "hops": hops,
+                                                         "token_budget": token_budget, "grounding": grounding,
+                                                         "symbols": symbols})
+        cached = response_cache.get(cache_key)
+    return msgs, cache_key, cached
+
+async def answer_query(graph, query: str, context_mode: str = "subgraph", hops: int = DEFAULT_HOPS,
+                       token_budget: int = DEFAULT_TOKEN_BUDGET, use_cache: bool = True,
+                       grounding: bool = False, symbols: bool = False) -> OrderedDict:
+    # A standalone question against the graph, without session history
+    msgs, cache_key, cached = await asyncio.to_thread(_prepare_query, graph, query, context_mode, hops,
+                                                      token_budget, use_cache, grounding, symbols)
+    llm_response = cached if cached is not None else await async_send_query_to_llm(msgs)
+    if cache_key is not None and cached is None:
+        await asyncio.to_thread(response_cache.put, cache_key, llm_response)
+    failed = llm_response.startswith("[LLM Error]")
+    return OrderedDict([
+        ("query", query),
+        ("status", "error" if failed else "success"),
+        ("response", llm_response),
+        ("cached", cached is not None),
+    ])
+
+async def answer_queries(graph, queries: list, **options) -> list:
+    # All questions are sent at once; the client's semaphore decides how many run together.
+    # Results come back in the order of the questions.
+    return list(await asyncio.gather(*(answer_query(graph, q, **options) for q in queries)))
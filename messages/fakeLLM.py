@@ -0,0 +1,66 @@
+import asyncio
+import os
+import random
+import time
+from types import SimpleNamespace
+
+# Seconds to wait between streamed tokens, to mimic generation speed
+FAKE_LLM_DELAY = float(os.getenv("FAKE_LLM_DELAY", "0"))
+# Seconds per completion and share of requests answered with a 429, for offline load tests
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0"))
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+
+class FakeRateLimitError(Exception):
+    status_code = 429
+    response = None
+
+def fake_completion(msgs: list) -> str:
+    # Deterministic answer so offline runs can assert on it
+    question = next((m["content"] for m in reversed(msgs) if m["role"] == "user"), "")
+    context = sum(len(m["content"]) for m in msgs if m["role"] == "system")
+    return f"[fake] Answer to: {question} (context: {context} characters, {len(msgs)} messages)"
+
+class _Completions:
+    def create(self, model=None, messages=None, temperature=None, stream=False, **kwargs):
+        text = fake_completion(messages)
+        if not stream:
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+        return self._stream(text)
+
+    def _stream(self, text: str):
+        for i, word in enumerate(text.split(" ")):
+            if FAKE_LLM_DELAY:
+                time.sleep(FAKE_LLM_DELAY)
+            token = word if i == 0 else " " + word
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+
+class FakeClient:
+    # Stands in for AzureOpenAI: same chat.completions.create() call shape, no network
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=_Completions())
+
+class _AsyncCompletions:
+    async def create(self, model=None, messages=None, temperature=None, stream=False, **kwargs):
+        if FAKE_LLM_LATENCY:
+            await asyncio.sleep(FAKE_LLM_LATENCY)
+        if FAKE_LLM_ERROR_RATE and random.random() < FAKE_LLM_ERROR_RATE:
+            raise FakeRateLimitError("Rate limit reached (fake)")
+        text = fake_completion(messages)
+        if not stream:
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+        return self._stream(text)
+
+    async def _stream(self, text: str):
+        for i, word in enumerate(text.split(" ")):
+            if FAKE_LLM_DELAY:
+                await asyncio.sleep(FAKE_LLM_DELAY)
+            token = word if i == 0 else " " + word
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+
+class FakeAsyncClient:
+    # Stands in for AsyncAzureOpenAI
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=_AsyncCompletions())
+
+    async def close(self):
+        pass
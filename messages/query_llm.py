@@ -1,6 +1,8 @@
 import os
-from openai import AzureOpenAI
+import threading
 from dotenv import load_dotenv
+from tools.metrics import phase, LLM_REQUESTS, LLM_TOKENS
+from .tokens import count_tokens
 
 # Load environment variables from .env file in the root directory
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "..", ".env"))
@@ -9,21 +11,88 @@ api_key = os.getenv("AZURE_OPENAI_API_KEY")
 api_version = os.getenv("AZURE_OPENAI_API_VERSION")
 azure_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
 deployment_name = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME") 
+# "fake" answers locally without credentials or network, for offline runs
+llm_backend = os.getenv("LLM_BACKEND", "azure")
+# Seconds before a completion request is abandoned, and retries on 429/5xx and timeouts
+llm_timeout = float(os.getenv("LLM_TIMEOUT", "60"))
+llm_max_retries = int(os.getenv("LLM_MAX_RETRIES", "3"))
 
-# Initialize the Azure OpenAI client
-client = AzureOpenAI(
-    api_key=api_key,
-    api_version=api_version,
-    azure_endpoint=azure_endpoint
-)
+_client = None
+_client_lock = threading.Lock()
+
+class LLMStreamError(Exception):
+    # A stream that broke partway; the tokens already yielded are not a complete answer
+    pass
+
+def _make_client():
+    if llm_backend == "fake":
+        from .fakeLLM import FakeClient
+        return FakeClient()
+    from openai import AzureOpenAI
+    return AzureOpenAI(
+        api_key=api_key,
+        api_version=api_version,
+        azure_endpoint=azure_endpoint,
+        timeout=llm_timeout,
+        max_retries=llm_max_retries,  # exponential backoff with jitter, honouring Retry-After
+    )
+
+def get_client():
+    # Created on first use, so importing this module needs neither the openai package nor
+    # credentials: a server starts without them and a misconfigured backend fails the
+    # requests that use it, as an "[LLM Error]" answer
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _make_client()
+    return _client
+
+def record_completion(msgs: list, text: str, usage=None):
+    # Token counts reported by the service, or estimated locally when it reports none
+    LLM_REQUESTS.inc(outcome="success")
+    prompt_tokens = getattr(usage, "prompt_tokens", None)
+    completion_tokens = getattr(usage, "completion_tokens", None)
+    if prompt_tokens is None:
+        prompt_tokens = sum(count_tokens(m["content"]) for m in msgs)
+    if completion_tokens is None:
+        completion_tokens = count_tokens(text)
+    LLM_TOKENS.observe(prompt_tokens, kind="prompt")
+    LLM_TOKENS.observe(completion_tokens, kind="completion")
 
 def send_query_to_llm(msgs:list) -> str:
     try:
-        response = client.chat.completions.create(
-            model=deployment_name,  # Use your deployment name here
-            messages=msgs,
-            temperature=0.4,
-        )
-        return response.choices[0].message.content.strip()
+        with phase("llm"):
+            response = get_client().chat.completions.create(
+                model=deployment_name,  # Use your deployment name here
+                messages=msgs,
+                temperature=0.4,
+            )
+        text = response.choices[0].message.content.strip()
+        record_completion(msgs, text, getattr(response, "usage", None))
+        return text
     except Exception as e:
+        LLM_REQUESTS.inc(outcome="error")
         return f"[LLM Error] {str(e)}"
+
+def stream_query_to_llm(msgs:list):
+    # Yields the completion piece by piece as the model produces it
+    # The llm phase of a stream lasts until its last token
+    parts = []
+    try:
+        with phase("llm"):
+            stream = get_client().chat.completions.create(
+                model=deployment_name,
+                messages=msgs,
+                temperature=0.4,
+                stream=True,
+            )
+            for chunk in stream:
+                # Azure sends chunks without choices (e.g. content filter results)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield parts[-1]
+        record_completion(msgs, "".join(parts))
+    except Exception as e:
+        LLM_REQUESTS.inc(outcome="error")
+        raise LLMStreamError(str(e) or type(e).__name__) from e
@@ -0,0 +1,194 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from tools.graphCache import graph_cache
+from tools.metrics import CACHE_LOOKUPS
+
+# "memory" (per process, default), "disk" (SQLite shared by every worker) or "off"
+LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "memory")
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "86400"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+DEFAULT_CACHE_PATH = os.path.join(".", "cache", "responses.sqlite")
+
+def normalize_query(query: str) -> str:
+    # "What does X do?" and "What does  X do" ask the same thing; case is kept because
+    # module and symbol names are case-sensitive (Parser and parser are different names)
+    return re.sub(r"\s+", " ", query).strip().rstrip("?!. ")
+
+def graph_digest(path: str) -> str:
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def live_graph_digest(nodes: list, arcs: list) -> str:
+    # Graphs kept in memory by watch mode have no file to hash: their content is hashed instead
+    h = hashlib.blake2b(digest_size=20)
+    h.update(json.dumps([sorted(nodes), sorted((a["source"], a["target"], a["symbol"]) for a in arcs)]).encode("utf-8"))
+    return h.hexdigest()
+
+def response_key(graph_hash: str, query: str, history: list, options: dict = None) -> str:
+    # history is what the model sees before the question (summary and earlier turns);
+    # options are the settings that shape the prompt (context mode, hops, budgets, model)
+    payload = json.dumps([graph_hash, normalize_query(query),
+                          [(m["role"], m["content"]) for m in history], options or {}], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def query_cache_key(graph, query: str, msgs: list, options: dict) -> str:
+    # graph is a tools.graphCache entry, so the graph is hashed once per load (or watch version), not per query
+    if graph.path in graph_cache.live:
+        graph_hash = graph.memo("content_hash", lambda: live_graph_digest(graph.nodes, graph.arcs))
+    else:
+        graph_hash = graph.memo("content_hash", lambda: graph_digest(graph.path))
+    options = dict(options, backend=os.getenv("LLM_BACKEND", "azure"),
+                   model=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"))
+    return response_key(graph_hash, query, msgs[1:-1], options)
+
+def cacheable(response: str) -> bool:
+    return bool(response) and not response.startswith("[LLM Error]")
+
+class MemoryResponseStore:
+    # LRU dict for a single process
+    def __init__(self, ttl: int = LLM_CACHE_TTL, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            created, response = entry
+            if time.time() - created > self.ttl:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return response
+
+    def put(self, key: str, response: str):
+        with self.lock:
+            self.entries[key] = (time.time(), response)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+class SQLiteResponseStore:
+    # On-disk store shared by every server worker; WAL keeps lookups unblocked during writes
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl: int = LLM_CACHE_TTL,
+                 max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._conn() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT, "
+                         "created REAL, last_used REAL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        conn = self._conn()
+        row = conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        with conn:
+            if now - row[1] > self.ttl:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def put(self, key: str, response: str):
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO responses (key, response, created, last_used) VALUES (?, ?, ?, ?)",
+                         (key, response, now, now))
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self.evict()
+
+    def evict(self):
+        # Expired rows first, then the least recently used beyond max_entries
+        with self._conn() as conn:
+            conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+            conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_used DESC "
+                "LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+    def clear(self):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM responses")
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+class ResponseCache:
+    def __init__(self, store=None):
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.store is not None
+
+    def get(self, key: str):
+        if self.store is None:
+            return None
+        response = self.store.get(key)
+        if response is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        CACHE_LOOKUPS.inc(cache="response", result="miss" if response is None else "hit")
+        return response
+
+    def put(self, key: str, response: str):
+        if self.store is not None and cacheable(response):
+            self.store.put(key, response)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.store).__name__ if self.store is not None else None,
+            "entries": len(self.store) if self.store is not None else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+def get_response_store(backend: str = LLM_CACHE_BACKEND):
+    if backend == "disk":
+        return SQLiteResponseStore()
+    if backend == "memory":
+        return MemoryResponseStore()
+    return None
+
+# Shared by every request handled by this process
+response_cache = ResponseCache(get_response_store())
@@ -0,0 +1,56 @@
+import asyncio
+import json
+from messages.query_llm import stream_query_to_llm, LLMStreamError
+from messages.asyncLLM import async_stream_query_to_llm
+from messages.responseCache import response_cache
+from memory.memoryOrch import append_messages
+
+def format_sse(data: dict, event: str = None) -> str:
+    lines = [f"event: {event}"] if event else []
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+def error_event(parts: list, error: Exception) -> str:
+    # A broken stream ends with an 'error' event instead of 'done'; the partial answer is
+    # neither cached nor recorded in the session, so the question can simply be asked again
+    return format_sse({"status": "error", "error": f"[LLM Error] {error}", "partial": "".join(parts)},
+                      event="error")
+
+def stream_llm_events(session_id: str, new_msgs: list, msgs: list, cache_key: str = None):
+    # Forwards tokens as server-sent events, then records the turn with the full answer
+    parts = []
+    try:
+        for token in stream_query_to_llm(msgs):
+            parts.append(token)
+            yield format_sse({"token": token}, event="token")
+    except LLMStreamError as e:
+        yield error_event(parts, e)
+        return
+    llm_response = "".join(parts).strip()
+    append_messages(session_id, new_msgs + [{"role": "assistant", "content": llm_response}])
+    if cache_key is not None:
+        response_cache.put(cache_key, llm_response)
+    yield format_sse({"status": "success", "response": llm_response, "cached": False}, event="done")
+
+async def astream_llm_events(session_id: str, new_msgs: list, msgs: list, cache_key: str = None):
+    # Same events as stream_llm_events, for async servers; waiting on the model never blocks the loop
+    parts = []
+    try:
+        async for token in async_stream_query_to_llm(msgs):
+            parts.append(token)
+            yield format_sse({"token": token}, event="token")
+    except LLMStreamError as e:
+        yield error_event(parts, e)
+        return
+    llm_response = "".join(parts).strip()
+    # Session and cache writes go to disk, off the event loop
+    await asyncio.to_thread(append_messages, session_id, new_msgs + [{"role": "assistant", "content": llm_response}])
+    if cache_key is not None:
+        await asyncio.to_thread(response_cache.put, cache_key, llm_response)
+    yield format_sse({"status": "success", "response": llm_response, "cached": False}, event="done")
+
+def stream_cached_events(session_id: str, new_msgs: list, llm_response: str):
+    # A cached answer is sent as one token so clients handle both cases the same way
+    append_messages(session_id, new_msgs + [{"role": "assistant", "content": llm_response}])
+    yield format_sse({"token": llm_response}, event="token")
+    yield format_sse({"status": "success", "response": llm_response, "cached": True}, event="done")
@@ -0,0 +1,11 @@
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken is optional, fall back to a character estimate
+    _encoding = None
+
+def count_tokens(text: str) -> int:
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    # Roughly four characters per token for English text and code identifiers
+    return len(text) // 4 + 1
@@ -0,0 +1,113 @@
+import json
+import os
+from insturctions.contextBuilder import cached_system_prompt, grounding_facts, symbol_facts, DEFAULT_HOPS, DEFAULT_TOKEN_BUDGET
+from memory.historyManager import fit_history, DEFAULT_REQUEST_BUDGET
+from memory.memoryOrch import load_session, append_messages, session_exists, list_sessions, read_messages, count_sessions
+from messages.asyncLLM import llm_client
+from messages.responseCache import response_cache, query_cache_key
+from tools.graphCache import graph_cache
+from tools.graphStore import graph_store
+from tools.graphStream import read_graph_page, DEFAULT_PAGE_SIZE
+from tools.graphQuery import cached_graph_query
+from tools.readGraph import read_graph_json
+
+# Request handling shared by the Flask and the FastAPI server. Every function here is
+# plain blocking code: the Flask server calls it directly, the FastAPI server through
+# asyncio.to_thread so disk and SQLite reads never run on its event loop.
+
+RESOURCE_FOLDER = os.path.join(".", "files")
+
+def list_resources(offset: int = 0, limit: int = None, repo: str = None) -> dict:
+    graphs, total = graph_store.list(offset, limit, repo)
+    return {"resources": [entry["name"] for entry in graphs], "graphs": graphs, "offset": offset,
+            "limit": limit, "total": total}
+
+def list_messages(offset: int = 0, limit: int = None) -> dict:
+    return {"resources": list_sessions(offset, limit), "offset": offset, "limit": limit,
+            "total": count_sessions()}
+
+def resource_path(resource_name: str):
+    # Path of a stored graph, marked as used; None when there is no such file
+    file_path = os.path.join(RESOURCE_FOLDER, resource_name)
+    if not os.path.isfile(file_path):
+        return None
+    graph_store.touch(file_path)
+    return file_path
+
+def get_resource(file_path: str) -> str:
+    return read_graph_json(file_path)
+
+def get_resource_page(file_path: str, node_offset: int = 0, node_limit: int = None, arc_offset: int = 0,
+                      arc_limit: int = None, sources=None, targets=None) -> dict:
+    return read_graph_page(file_path, node_offset, DEFAULT_PAGE_SIZE if node_limit is None else node_limit,
+                           arc_offset, DEFAULT_PAGE_SIZE if arc_limit is None else arc_limit, sources, targets)
+
+def get_messages(session_id: str, offset: int = 0, limit: int = None):
+    # None when the session doesn't exist
+    if not session_exists(session_id):
+        return None
+    messages, total = read_messages(session_id, offset, limit)
+    # Same document shape the session files used to have, limited to the requested page
+    content = json.dumps({"session_id": session_id, "messages": messages}, indent=2)
+    return {"messages": content, "offset": offset, "limit": limit, "total": total}
+
+def graph_query(graph: str):
+    # None when there is no such graph. Loading the graph and building its index are the
+    # slow parts of an analytics call.
+    if not graph_cache.exists(graph):
+        return None
+    return cached_graph_query(graph_cache.get(graph))
+
+def cache_stats() -> dict:
+    # The response cache counts its entries in SQLite when it is on disk
+    return {"graph_cache": graph_cache.stats(), "response_cache": response_cache.stats(),
+            "llm_client": llm_client.stats()}
+
+class QueryTurn:
+    # One question in a session, ready to be sent: the messages to append to the session
+    # when the answer arrives, the messages sent to the model, and the response cache entry
+    def __init__(self, session_id: str, new_msgs: list, msgs: list, cache_key: str = None, cached: str = None):
+        self.session_id = session_id
+        self.new_msgs = new_msgs
+        self.msgs = msgs
+        self.cache_key = cache_key
+        self.cached = cached
+
+def prepare_query(graph: str, query: str, session_id: str, context_mode: str = "subgraph", hops: int = DEFAULT_HOPS,
+                  token_budget: int = DEFAULT_TOKEN_BUDGET, history_budget: int = DEFAULT_REQUEST_BUDGET,
+                  use_cache: bool = True, grounding: bool = False, symbols: bool = False) -> QueryTurn:
+    graph_entry = graph_cache.get(graph)
+    history = load_session(session_id)
+    if context_mode == "full" and history["messages"]:
+        sys_msg = history["messages"][0]["content"]
+    else:
+        sys_msg = cached_system_prompt(graph_entry, query, context_mode, hops, token_budget)
+    # When two first turns of a session run at once, both carry the system prompt; the
+    # session store only writes it to a session that is still empty
+    new_msgs = [] if history["messages"] else [{"role": "system", "content": sys_msg}]
+    new_msgs.append({"role": "user", "content": query})
+    prompt = sys_msg
+    if grounding:
+        facts = grounding_facts(graph_entry, query)
+        prompt = f"{prompt}\n\n{facts}" if facts else prompt
+    if symbols:
+        facts = symbol_facts(graph_entry, query)
+        prompt = f"{prompt}\n\n{facts}" if facts else prompt
+    # Each question is sent with the graph context selected for it; older turns past the budget are summarized
+    msgs = fit_history(session_id, prompt, (history["messages"] + new_msgs)[1:], history_budget)
+    turn = QueryTurn(session_id, new_msgs, msgs)
+    if use_cache and response_cache.enabled:
+        turn.cache_key = query_cache_key(graph_entry, query, msgs, {
+            "context_mode": context_mode,
+            "hops": hops,
+            "token_budget": token_budget,
+            "grounding": grounding,
+            "symbols": symbols})
+        turn.cached = response_cache.get(turn.cache_key)
+    return turn
+
+def finish_query(turn: QueryTurn, llm_response: str):
+    # Records the answered turn; a fresh answer also goes into the response cache
+    append_messages(turn.session_id, turn.new_msgs + [{"role": "assistant", "content": llm_response}])
+    if turn.cache_key is not None and turn.cached is None:
+        response_cache.put(turn.cache_key, llm_response)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Tests import the repository's top-level packages and never reach a real model: the LLM
+# modules read LLM_BACKEND when they are imported, so it is set before any test module loads
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ["LLM_BACKEND"] = "fake"
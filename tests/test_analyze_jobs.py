@@ -0,0 +1,63 @@
+import os
+import pytest
+import jobs.analyzeJobs as analyzeJobs
+from jobs.analyzeJobs import JobManager
+import tools.GraphBuilder as GraphBuilderModule
+from tools.GraphBuilder import GraphBuilder
+from tools.graphStore import GraphStore
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    repo = tmp_path / "repo" / "src" / "pkg"
+    os.makedirs(repo)
+    (repo / "a.py").write_text("from pkg.b import helper\n\nhelper()\n", encoding="utf-8")
+    (repo / "b.py").write_text("def helper():\n    pass\n", encoding="utf-8")
+    monkeypatch.chdir(tmp_path)
+    store = GraphStore(folder=str(tmp_path / "files"), index_path=str(tmp_path / "graphs.sqlite"))
+    monkeypatch.setattr(analyzeJobs, "graph_store", store)
+    monkeypatch.setattr(GraphBuilderModule, "graph_store", store)
+    monkeypatch.setattr(analyzeJobs, "maybe_collect", lambda: None)
+    sessions = []
+    monkeypatch.setattr(analyzeJobs, "create_session", lambda: sessions.append("session") or "session")
+    jobs = JobManager(max_workers=1)
+    jobs.sessions = sessions
+    jobs.repo = str(tmp_path / "repo")
+    jobs.store = store
+    yield jobs
+    jobs.executor.shutdown(wait=True)
+
+def _cancel_during(monkeypatch, manager, target, name: str):
+    # Cancels the job while the patched step runs, after the builder's own checks
+    original = getattr(target, name)
+
+    def step(*args, **kwargs):
+        result = original(*args, **kwargs)
+        for job in manager.jobs.values():
+            manager.cancel(job.job_id)
+        return result
+    monkeypatch.setattr(target, name, step)
+
+def test_cancel_of_a_reused_graph_hands_out_no_session(manager, monkeypatch):
+    first, _ = manager.submit(manager.repo)
+    first.future.result(timeout=30)
+    manager.sessions.clear()
+    # The second run finds the stored graph and never reaches the builder's checks
+    _cancel_during(monkeypatch, manager, analyzeJobs, "source_fingerprint")
+    job, _ = manager.submit(manager.repo)
+    job.future.result(timeout=30)
+    assert job.status == "cancelled"
+    assert job.session_id is None and manager.sessions == []
+
+def test_cancel_after_the_build_stops_before_export(manager, monkeypatch):
+    _cancel_during(monkeypatch, manager, GraphBuilder, "build")
+    job, _ = manager.submit(manager.repo)
+    job.future.result(timeout=30)
+    assert job.status == "cancelled"
+    assert job.graph_path is None and job.session_id is None
+    assert manager.sessions == [] and manager.store.list() == ([], 0)
+
+def test_uncancelled_job_exports_and_hands_out_a_session(manager):
+    job, _ = manager.submit(manager.repo)
+    job.future.result(timeout=30)
+    assert job.status == "done", job.error
+    assert job.session_id == "session" and os.path.isfile(job.graph_path)
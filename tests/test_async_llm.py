@@ -0,0 +1,152 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+import messages.asyncLLM as asyncLLM
+import messages.fakeLLM as fakeLLM
+from messages.asyncLLM import AsyncLLMClient, LLMRequestError, backoff_delay, run_in_background_loop
+from messages.query_llm import LLMStreamError
+
+QUESTION = [{"role": "system", "content": "graph"}, {"role": "user", "content": "What does pkg.a do?"}]
+
+class _StatusError(Exception):
+    def __init__(self, status_code: int, retry_after: str = None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers={"retry-after": retry_after} if retry_after else {})
+
+def _chunk(text: str):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    # Backoff delays that would have been slept, without waiting for them
+    delays = []
+    real_sleep = asyncio.sleep
+
+    async def sleep(delay, *args):
+        delays.append(delay)
+        await real_sleep(0)
+    monkeypatch.setattr(asyncio, "sleep", sleep)
+    return delays
+
+def _failing_first(monkeypatch, errors: list):
+    # The stub raises the given errors on its first calls, then answers
+    calls = []
+    create = fakeLLM._AsyncCompletions.create
+
+    async def flaky(self, **kwargs):
+        calls.append(kwargs)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return await create(self, **kwargs)
+    monkeypatch.setattr(fakeLLM._AsyncCompletions, "create", flaky)
+    return calls
+
+def test_rate_limited_request_is_retried_after_the_hint(monkeypatch, sleeps):
+    calls = _failing_first(monkeypatch, [_StatusError(429, "3"), fakeLLM.FakeRateLimitError("slow down")])
+    client = AsyncLLMClient(max_retries=3)
+    assert asyncio.run(client.complete(QUESTION)) == fakeLLM.fake_completion(QUESTION)
+    assert len(calls) == 3 and client.retries == 2
+    # The first wait honours Retry-After; the second has no hint and stays within its backoff window
+    assert sleeps[0] >= 3
+    assert 0 <= sleeps[1] <= asyncLLM.BACKOFF_BASE * 2
+    assert client.in_flight == 0
+
+def test_errors_that_cannot_succeed_are_not_retried(monkeypatch, sleeps):
+    calls = _failing_first(monkeypatch, [_StatusError(400)])
+    client = AsyncLLMClient(max_retries=3)
+    with pytest.raises(LLMRequestError, match="HTTP 400"):
+        asyncio.run(client.complete(QUESTION))
+    assert len(calls) == 1 and client.retries == 0 and sleeps == []
+
+def test_retries_give_up_after_max_retries(monkeypatch, sleeps):
+    calls = _failing_first(monkeypatch, [ConnectionError("reset")] * 10)
+    client = AsyncLLMClient(max_retries=2)
+    with pytest.raises(LLMRequestError, match="reset"):
+        asyncio.run(client.complete(QUESTION))
+    assert len(calls) == 3 and client.retries == 2 and len(sleeps) == 2
+
+def test_backoff_delay_uses_full_jitter_and_caps_the_hint():
+    for attempt in range(8):
+        window = min(asyncLLM.BACKOFF_MAX, asyncLLM.BACKOFF_BASE * 2 ** attempt)
+        delays = [backoff_delay(attempt) for _ in range(200)]
+        assert all(0 <= d <= window for d in delays)
+        # Jittered, not a fixed schedule
+        assert len(set(delays)) > 1
+    assert all(backoff_delay(0, _StatusError(429, "3")) >= 3 for _ in range(50))
+    assert backoff_delay(0, _StatusError(429, "600")) == asyncLLM.BACKOFF_MAX
+    assert backoff_delay(0, _StatusError(429, "soon")) <= asyncLLM.BACKOFF_BASE
+
+def test_stalled_stream_times_out_and_frees_its_slot(monkeypatch):
+    async def stalled(self, text):
+        yield _chunk("The module")
+        await asyncio.sleep(60)
+        yield _chunk(" never")
+    monkeypatch.setattr(fakeLLM._AsyncCompletions, "_stream", stalled)
+    client = AsyncLLMClient(max_concurrency=1, timeout=0.05)
+
+    async def run():
+        tokens = []
+        with pytest.raises(LLMRequestError, match="Stream stalled"):
+            async for token in client.stream(QUESTION):
+                tokens.append(token)
+        assert tokens == ["The module"] and client.in_flight == 0
+        # With a single slot, this only completes if the stalled stream gave it back
+        return await asyncio.wait_for(client.complete(QUESTION), 1)
+    assert asyncio.run(run()) == fakeLLM.fake_completion(QUESTION)
+
+def test_stalled_stream_surfaces_as_stream_error(monkeypatch):
+    async def stalled(self, text):
+        yield _chunk("The module")
+        await asyncio.sleep(60)
+    monkeypatch.setattr(fakeLLM._AsyncCompletions, "_stream", stalled)
+    monkeypatch.setattr(asyncLLM, "llm_client", AsyncLLMClient(timeout=0.05))
+
+    async def run():
+        return [token async for token in asyncLLM.async_stream_query_to_llm(QUESTION)]
+    with pytest.raises(LLMStreamError, match="Stream stalled"):
+        asyncio.run(run())
+
+def test_concurrency_is_limited_per_loop(monkeypatch):
+    active, peak = [0], [0]
+    create = fakeLLM._AsyncCompletions.create
+
+    async def slow(self, **kwargs):
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+        try:
+            await asyncio.sleep(0.01)
+            return await create(self, **kwargs)
+        finally:
+            active[0] -= 1
+    monkeypatch.setattr(fakeLLM._AsyncCompletions, "create", slow)
+    client = AsyncLLMClient(max_concurrency=3)
+
+    async def run():
+        return await asyncio.gather(*(client.complete(QUESTION) for _ in range(10)))
+    assert len(asyncio.run(run())) == 10
+    assert peak[0] == 3 and client.in_flight == 0
+
+def test_each_loop_gets_its_own_client_and_limit():
+    client = AsyncLLMClient()
+
+    async def state():
+        first = client._ensure()
+        assert client._ensure() is first
+        return asyncio.get_running_loop(), first
+    loop_a, state_a = asyncio.run(state())
+    loop_b, state_b = asyncio.run(state())
+    assert loop_a is not loop_b
+    assert state_a[0] is not state_b[0] and state_a[1] is not state_b[1]
+    assert set(client._per_loop.keys()) >= {loop_a, loop_b}
+
+def test_background_loop_is_shared_between_calls():
+    client = AsyncLLMClient()
+
+    async def state():
+        return asyncio.get_running_loop(), client._ensure()
+    loop_a, state_a = run_in_background_loop(state())
+    loop_b, state_b = run_in_background_loop(state())
+    assert loop_a is loop_b and state_a is state_b
+    assert len(client._per_loop) == 1
+    assert run_in_background_loop(client.complete(QUESTION)) == fakeLLM.fake_completion(QUESTION)
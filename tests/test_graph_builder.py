@@ -0,0 +1,47 @@
+import os
+import pytest
+from tools.GraphBuilder import GraphBuilder
+from tools.shardedBuilder import ShardedBuilder
+
+FIXTURE = {
+    "src/app/__init__.py": "",
+    "src/app/main.py": "from app.core import engine\nfrom app.util.text import slug, unused\n\n"
+                       "def run():\n    return engine.start(slug('x'))\n",
+    "src/app/core/__init__.py": "from .engine import Engine\n\nEngine\n",
+    "src/app/core/engine.py": "from ..util import text\nfrom . import config\n\n"
+                              "def start(name):\n    return text.slug(name), config.LEVEL\n",
+    "src/app/core/config.py": "import os\n\nLEVEL = os.getenv('LEVEL')\n",
+    "src/app/util/__init__.py": "",
+    "src/app/util/text.py": "from app.core.config import LEVEL\n\ndef slug(s):\n    return s + str(LEVEL)\n\n"
+                            "def unused():\n    pass\n",
+    "src/app/util/broken.py": "def oops(:\n",
+}
+
+@pytest.fixture
+def repo(tmp_path):
+    for rel_path, text in FIXTURE.items():
+        path = tmp_path / rel_path
+        os.makedirs(path.parent, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+    return str(tmp_path)
+
+def _snapshot(graph) -> tuple:
+    return (sorted((name, node.path) for name, node in graph.nodes.items()),
+            [(a.source.name, a.target.name, a.symbol) for a in graph.arcs])
+
+def test_parallel_and_serial_builds_are_identical(repo):
+    serial = GraphBuilder(repo, workers=1).build(parallel=False)
+    parallel = GraphBuilder(repo, workers=2, chunksize=1).build(parallel=True)
+    assert _snapshot(parallel) == _snapshot(serial)
+    arcs = _snapshot(serial)[1]
+    assert ("src.app.main", "src.app.core.engine", "engine") in arcs
+    assert ("src.app.core.engine", "src.app.core.config", "config") in arcs
+    # Package __init__ files are not modules of the graph
+    assert len(serial.nodes) == sum(not path.endswith("__init__.py") for path in FIXTURE)
+
+@pytest.mark.parametrize("workers", [0, -1])
+def test_workers_below_one_are_rejected(repo, workers):
+    with pytest.raises(ValueError):
+        GraphBuilder(repo, workers=workers)
+    with pytest.raises(ValueError):
+        ShardedBuilder(repo, workers=workers)
@@ -0,0 +1,24 @@
+import pytest
+from tools.GraphBuilder import GraphBuilder
+from tools.graphQuery import GraphQuery, ModuleNotFound
+
+def test_resolve_by_name_and_unique_suffix():
+    query = GraphQuery(["src.app.main", "src.app.core.engine", "src.app.util.engine"], [])
+    assert query.names[query.resolve("src.app.main")] == "src.app.main"
+    assert query.names[query.resolve("main")] == "src.app.main"
+    assert query.names[query.resolve("core.engine")] == "src.app.core.engine"
+    with pytest.raises(ModuleNotFound, match="ambiguous"):
+        query.resolve("engine")
+    with pytest.raises(ModuleNotFound, match="not found"):
+        query.resolve("ain")
+
+def test_packages_are_not_modules(tmp_path):
+    # The builder skips __init__ files, so a package name names no module of the graph
+    package = tmp_path / "src" / "app"
+    package.mkdir(parents=True)
+    (package / "__init__.py").write_text("from .main import run\n", encoding="utf-8")
+    (package / "main.py").write_text("def run():\n    pass\n", encoding="utf-8")
+    query = GraphQuery.from_graph(GraphBuilder(str(tmp_path), workers=1).build(parallel=False))
+    assert query.names == ["src.app.main"]
+    with pytest.raises(ModuleNotFound):
+        query.resolve("src.app")
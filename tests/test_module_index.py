@@ -0,0 +1,41 @@
+from tools.ModuleIndex import ModuleIndex, relative_target
+
+MODULES = ["src.app.main", "src.app.core.engine", "src.app.core.config", "src.app.util.text",
+           "src.app.util._internal_utils", "src.other.utils"]
+
+def test_suffixes_match_whole_components():
+    index = ModuleIndex(MODULES)
+    assert index.resolve("src.app.main", "core.engine") == ("src.app.core.engine",)
+    assert index.resolve("src.app.main", "utils") == ("src.other.utils",)
+    assert index.resolve("src.app.main", "ngine") == ()
+
+def test_relative_imports():
+    index = ModuleIndex(MODULES)
+    assert relative_target("src.app.core.engine", ".") == "src.app.core"
+    assert relative_target("src.app.core.engine", "..util") == "src.app.util"
+    assert relative_target("src.app.main", "....") is None
+    # from .config import LEVEL
+    assert index.resolve("src.app.core.engine", ".config", "LEVEL") == ("src.app.core.config",)
+    # from ..util import text
+    assert index.resolve("src.app.core.engine", "..util", "text") == ("src.app.util.text",)
+    # from . import config
+    assert index.resolve("src.app.core.engine", ".", "config") == ("src.app.core.config",)
+    assert index.resolve("src.app.core.engine", ".", "missing") == ()
+    assert index.resolve("src.app.main", "....", "x") == ()
+
+def test_absolute_from_package_import_submodule():
+    # from app.core import engine: app.core is a package, never a node, so the submodule is the target
+    index = ModuleIndex(MODULES)
+    assert index.resolve("src.app.main", "app.core", "engine") == ("src.app.core.engine",)
+    assert index.resolve("src.app.main", "app.core", "missing") == ()
+    # A module named like the import still wins over the submodule
+    assert index.resolve("src.app.main", "util.text", "slug") == ("src.app.util.text",)
+    assert index.resolve("src.app.main", "app.core") == ()
+
+def test_resolve_returns_a_snapshot():
+    index = ModuleIndex(MODULES)
+    targets = index.resolve("src.app.main", "utils")
+    index.add("src.app.utils")
+    index.remove("src.other.utils")
+    assert targets == ("src.other.utils",)
+    assert index.resolve("src.app.main", "utils") == ("src.app.utils",)
@@ -0,0 +1,10 @@
+from messages.responseCache import normalize_query, response_key
+
+def test_normalize_query_collapses_whitespace_and_trailing_punctuation():
+    assert normalize_query("  What does\n pkg.a   do?! ") == "What does pkg.a do"
+    assert response_key("g", "What does pkg.a do?", []) == response_key("g", "What does  pkg.a do", [])
+
+def test_normalize_query_keeps_case():
+    # Parser and parser can be different modules or symbols
+    assert normalize_query("What calls Parser?") == "What calls Parser"
+    assert response_key("g", "What calls Parser?", []) != response_key("g", "What calls parser?", [])
@@ -0,0 +1,116 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import pytest
+from memory.sessionStore import JSONLSessionStore, SQLiteSessionStore
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+WORKERS = 4
+TURNS = 25
+
+# Appends TURNS turns to one session from a separate interpreter, as another server worker would
+_WORKER = """
+import sys
+from memory.sessionStore import JSONLSessionStore, SQLiteSessionStore
+backend, location, session_id, worker, turns = sys.argv[1:6]
+store = JSONLSessionStore(location) if backend == "jsonl" else SQLiteSessionStore(location)
+for i in range(int(turns)):
+    store.append(session_id, [{"role": "user", "content": f"{worker}:{i}"},
+                              {"role": "assistant", "content": f"{worker}:{i}"}])
+"""
+
+@pytest.fixture(params=["jsonl", "sqlite"])
+def backend(request, tmp_path):
+    location = str(tmp_path / "sessions") if request.param == "jsonl" else str(tmp_path / "sessions.sqlite")
+    store = JSONLSessionStore(location) if request.param == "jsonl" else SQLiteSessionStore(location)
+    return request.param, location, store
+
+def _turn(tag: str) -> list:
+    return [{"role": "user", "content": tag}, {"role": "assistant", "content": tag}]
+
+def _assert_whole_turns(messages: list, tags: set):
+    # Every turn is complete and adjacent: no write was lost, torn or interleaved
+    assert len(messages) == 2 * len(tags)
+    pairs = list(zip(messages[0::2], messages[1::2]))
+    assert all(user["role"] == "user" and answer["role"] == "assistant" and user["content"] == answer["content"]
+               for user, answer in pairs)
+    assert set(user["content"] for user, _ in pairs) == tags
+
+def test_concurrent_appends_from_threads(backend):
+    _, _, store = backend
+    session_id = store.create()
+
+    def worker(w: int):
+        for i in range(TURNS):
+            store.append(session_id, _turn(f"{w}:{i}"))
+    threads = [threading.Thread(target=worker, args=(w,)) for w in range(WORKERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    messages, total = store.read(session_id)
+    assert total == 2 * WORKERS * TURNS
+    _assert_whole_turns(messages, {f"{w}:{i}" for w in range(WORKERS) for i in range(TURNS)})
+
+def test_concurrent_appends_from_processes(backend):
+    name, location, store = backend
+    session_id = store.create()
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    workers = [subprocess.Popen([sys.executable, "-c", _WORKER, name, location, session_id, str(w), str(TURNS)],
+                                env=env) for w in range(WORKERS)]
+    assert [p.wait(timeout=60) for p in workers] == [0] * WORKERS
+    messages, total = store.read(session_id)
+    assert total == 2 * WORKERS * TURNS
+    _assert_whole_turns(messages, {f"{w}:{i}" for w in range(WORKERS) for i in range(TURNS)})
+
+def test_concurrent_first_turns_keep_one_system_prompt(backend):
+    _, _, store = backend
+    session_id = store.create()
+    system = {"role": "system", "content": "graph"}
+    threads = [threading.Thread(target=store.append, args=(session_id, [system] + _turn(str(w))))
+               for w in range(WORKERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    messages, total = store.read(session_id)
+    assert total == 1 + 2 * WORKERS
+    assert messages[0] == system
+    _assert_whole_turns(messages[1:], {str(w) for w in range(WORKERS)})
+
+def test_read_pages(backend):
+    _, _, store = backend
+    session_id = store.create()
+    for i in range(10):
+        store.append(session_id, _turn(str(i)))
+    everything, total = store.read(session_id)
+    assert total == 20
+    assert store.read(session_id, 0, 4) == (everything[:4], 20)
+    assert store.read(session_id, 6, 5) == (everything[6:11], 20)
+    assert store.read(session_id, 18, 10) == (everything[18:], 20)
+    assert store.read(session_id, 25, 5) == ([], 20)
+    assert store.read(session_id, 4) == (everything[4:], 20)
+
+def test_append_to_removed_session_fails(backend):
+    _, _, store = backend
+    session_id = store.create()
+    store.expire(idle_seconds=1e-9, empty_seconds=0)
+    with pytest.raises(FileNotFoundError):
+        store.append(session_id, _turn("late"))
+    assert not store.exists(session_id)
+
+def test_legacy_session_is_read_then_migrated(tmp_path):
+    store = JSONLSessionStore(str(tmp_path))
+    legacy = [{"role": "system", "content": "graph"}] + _turn("old")
+    with open(tmp_path / "legacy-session.json", "w", encoding="utf-8") as f:
+        json.dump({"session_id": "legacy-session", "messages": legacy}, f)
+    assert store.exists("legacy-session") and store.list() == ["legacy-session"]
+    assert store.read("legacy-session", 1, 1) == ([legacy[1]], 3)
+    store.append("legacy-session", _turn("new"))
+    assert not (tmp_path / "legacy-session.json").exists()
+    assert (tmp_path / "legacy-session.jsonl").exists()
+    assert store.read("legacy-session") == (legacy + _turn("new"), 5)
+    # File names listed by older versions still resolve
+    assert store.read("legacy-session.json", 0, 1) == ([legacy[0]], 5)
@@ -0,0 +1,83 @@
+import asyncio
+import json
+from types import SimpleNamespace
+import pytest
+import memory.memoryOrch as memoryOrch
+import messages.fakeLLM as fakeLLM
+from messages.responseCache import response_cache, MemoryResponseStore
+from messages.streaming import stream_llm_events, astream_llm_events, stream_cached_events
+
+QUESTION = [{"role": "system", "content": "graph"}, {"role": "user", "content": "What does pkg.a do?"}]
+
+def _chunk(text: str):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+def parse_events(stream: list) -> list:
+    # (event name, decoded data) per server-sent event
+    events = []
+    for raw in stream:
+        fields = dict(line.split(": ", 1) for line in raw.strip().split("\n"))
+        events.append((fields.get("event"), json.loads(fields["data"])))
+    return events
+
+async def _collect(agen) -> list:
+    return [event async for event in agen]
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    monkeypatch.setattr(memoryOrch.store, "folder", str(tmp_path / "sessions"))
+    monkeypatch.setattr(response_cache, "store", MemoryResponseStore())
+    return memoryOrch.create_session()
+
+@pytest.fixture
+def broken_stream(monkeypatch):
+    # The stub stream sends two chunks, then the connection drops
+    def stream(self, text):
+        yield _chunk("The module")
+        yield _chunk(" imports")
+        raise ConnectionError("connection reset")
+
+    async def astream(self, text):
+        yield _chunk("The module")
+        yield _chunk(" imports")
+        raise ConnectionError("connection reset")
+
+    monkeypatch.setattr(fakeLLM._Completions, "_stream", stream)
+    monkeypatch.setattr(fakeLLM._AsyncCompletions, "_stream", astream)
+
+def _run(kind: str, session_id: str, cache_key: str) -> list:
+    new_msgs = [QUESTION[1]]
+    if kind == "sync":
+        return parse_events(list(stream_llm_events(session_id, new_msgs, QUESTION, cache_key)))
+    return parse_events(asyncio.run(_collect(astream_llm_events(session_id, new_msgs, QUESTION, cache_key))))
+
+@pytest.mark.parametrize("kind", ["sync", "async"])
+def test_stream_sends_named_events_and_records_turn(session, kind):
+    events = _run(kind, session, "key-" + kind)
+    names = [name for name, _ in events]
+    assert names[-1] == "done" and set(names[:-1]) == {"token"}
+    answer = "".join(data["token"] for _, data in events[:-1]).strip()
+    assert answer == fakeLLM.fake_completion(QUESTION)
+    done = events[-1][1]
+    assert done == {"status": "success", "response": answer, "cached": False}
+    messages, total = memoryOrch.read_messages(session)
+    assert total == 2
+    assert messages == [QUESTION[1], {"role": "assistant", "content": answer}]
+    assert response_cache.get("key-" + kind) == answer
+
+@pytest.mark.parametrize("kind", ["sync", "async"])
+def test_broken_stream_is_neither_cached_nor_persisted(session, broken_stream, kind):
+    events = _run(kind, session, "broken-" + kind)
+    assert [name for name, _ in events] == ["token", "token", "error"]
+    error = events[-1][1]
+    assert error["status"] == "error"
+    assert error["partial"] == "The module imports"
+    assert "connection reset" in error["error"]
+    assert response_cache.get("broken-" + kind) is None
+    assert memoryOrch.read_messages(session) == ([], 0)
+
+def test_cached_answer_streams_as_one_token(session):
+    events = parse_events(list(stream_cached_events(session, [QUESTION[1]], "Cached answer")))
+    assert events == [("token", {"token": "Cached answer"}),
+                      ("done", {"status": "success", "response": "Cached answer", "cached": True})]
+    assert memoryOrch.read_messages(session)[0][-1] == {"role": "assistant", "content": "Cached answer"}
@@ -0,0 +1,36 @@
+import os
+import time
+import memory.memoryOrch as memoryOrch
+from jobs.watchers import watch_manager
+from messages.responseCache import response_cache
+from services import serviceCore
+
+def _write(path: str, text: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+def _wait_watching(watch, timeout: float = 10.0):
+    deadline = time.time() + timeout
+    while watch.status == "building" and time.time() < deadline:
+        time.sleep(0.05)
+    assert watch.status == "watching", watch.error
+
+def test_query_watch_ref_with_response_cache(tmp_path, monkeypatch):
+    repo = tmp_path / "repo"
+    _write(str(repo / "src" / "pkg" / "a.py"), "from pkg.b import helper\n\ndef run():\n    return helper()\n")
+    _write(str(repo / "src" / "pkg" / "b.py"), "def helper():\n    return 1\n")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(memoryOrch.store, "folder", str(tmp_path / "sessions"))
+    assert response_cache.enabled
+    watch, _ = watch_manager.start(str(repo), interval=60)
+    try:
+        _wait_watching(watch)
+        turn = serviceCore.prepare_query(watch.ref, "What does pkg.a do?", watch.session_id, use_cache=True)
+        assert turn.cache_key is not None and turn.cached is None
+        serviceCore.finish_query(turn, "It runs the helper.")
+        again = serviceCore.prepare_query(watch.ref, "What does pkg.a do?", memoryOrch.create_session())
+        assert again.cache_key == turn.cache_key
+        assert again.cached == "It runs the helper."
+    finally:
+        watch_manager.stop(watch.watch_id)
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from .DependencyAnalyzer import ANALYZER_VERSION
+
+DEFAULT_CACHE_PATH = os.path.join(".", "cache", "analysis.sqlite")
+DEFAULT_MAX_ENTRIES = 200_000
+
+def file_digest(file_path: str) -> str:
+    with open(file_path, "rb") as f:
+        return hashlib.blake2b(f.read(), digest_size=20).hexdigest()
+
+class AnalysisCache:
+    # On-disk cache of per-file import summaries, shared by every server worker.
+    # A file is a hit when its size and mtime are unchanged, or, failing that, when
+    # its content hash matches an entry (touched, moved or copied files).
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._pending = {}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # WAL lets readers in other workers proceed while one worker writes
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, digest TEXT, "
+                "summary TEXT, last_used REAL)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS entries_digest ON entries (digest)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self._check_version()
+
+    def _check_version(self):
+        # Results from another analyzer version may differ, so drop them all
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'analyzer_version'").fetchone()
+            if row is None or row[0] != str(ANALYZER_VERSION):
+                self.conn.execute("DELETE FROM entries")
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('analyzer_version', ?)",
+                    (str(ANALYZER_VERSION),))
+
+    def lookup(self, paths: list):
+        # Returns ({path: summary} for hits, [paths that must be parsed])
+        found = {}
+        missing = []
+        touched = []
+        now = time.time()
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                missing.append(path)
+                continue
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, digest, summary FROM entries WHERE path = ?", (path,)).fetchone()
+            if row is not None and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+                found[path] = json.loads(row[3])
+                touched.append((now, path))
+                continue
+            digest = file_digest(path)
+            if row is None or row[2] != digest:
+                row = self.conn.execute(
+                    "SELECT size, mtime_ns, digest, summary FROM entries WHERE digest = ? LIMIT 1",
+                    (digest,)).fetchone()
+            if row is not None and row[2] == digest:
+                found[path] = json.loads(row[3])
+                self._pending[path] = (st.st_size, st.st_mtime_ns, digest, row[3])
+                continue
+            self._pending[path] = (st.st_size, st.st_mtime_ns, digest, None)
+            missing.append(path)
+        self.hits += len(found)
+        self.misses += len(missing)
+        with self.conn:
+            self.conn.executemany("UPDATE entries SET last_used = ? WHERE path = ?", touched)
+            # Content hits under a new stat (or new path) are recorded right away
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO entries (path, size, mtime_ns, digest, summary, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(path, *fp[:3], fp[3], now) for path, fp in self._pending.items() if fp[3] is not None])
+        self._pending = {path: fp for path, fp in self._pending.items() if fp[3] is None}
+        return found, missing
+
+    def store(self, results):
+        now = time.time()
+        rows = []
+        for path, summary in results:
+            fp = self._pending.pop(path, None)
+            if fp is None:
+                # Parsed despite a cache hit (e.g. analyzed differently this time)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                fp = (st.st_size, st.st_mtime_ns, file_digest(path))
+            rows.append((path, fp[0], fp[1], fp[2], json.dumps(summary), now))
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO entries (path, size, mtime_ns, digest, summary, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows)
+        self.evict()
+
+    def evict(self):
+        # Least recently used entries go first once the cache is over its bound
+        with self.conn:
+            count = self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            if count > self.max_entries:
+                self.conn.execute(
+                    "DELETE FROM entries WHERE path IN "
+                    "(SELECT path FROM entries ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,))
+
+    def clear(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM entries")
+
+    def close(self):
+        self.conn.close()
@@ -1,14 +1,57 @@
 import ast
+import io
+import os
+import re
+import tokenize
+
+# Bump whenever analyze() output changes so cached results are invalidated
+ANALYZER_VERSION = 3
+
+# Files above this size (usually generated code) get a light scan or are skipped
+MAX_FILE_BYTES = int(os.getenv("ANALYZER_MAX_FILE_BYTES", str(2 * 1024 * 1024)))
+# "light" or "skip"
+LARGE_FILES = os.getenv("ANALYZER_LARGE_FILES", "light")
+
+# Statements that can hold other statements, and the fields holding them
+_BLOCK_FIELDS = {"body", "orelse", "finalbody", "handlers", "cases"}
+# A parenthesised name list, or names up to the end of the line with backslash continuations
+_FROM_IMPORT = re.compile(r"^[ \t]*from[ \t]+(\.*[\w.]*)[ \t]+import[ \t]+(\([^)]*\)|(?:\\\n|[^\n#;\\])*)",
+                          re.MULTILINE)
+_IMPORT = re.compile(r"^[ \t]*import[ \t]+((?:\\\n|[^\n#;\\])+)", re.MULTILINE)
+_IDENTIFIER = re.compile(r"[A-Za-z_]\w*")
+_COMMENT = re.compile(r"#[^\n]*")
+
+def read_source(file_path: str) -> str:
+    # Honours a BOM or a PEP 263 coding line; undecodable bytes become U+FFFD
+    # instead of failing the whole file
+    with open(file_path, "rb") as f:
+        data = f.read()
+    try:
+        encoding, _ = tokenize.detect_encoding(io.BytesIO(data).readline)
+    except SyntaxError:
+        encoding = "utf-8"
+    try:
+        return data.decode(encoding, errors="replace")
+    except LookupError:
+        return data.decode("utf-8", errors="replace")
+
+def analysis_mode(size: int, max_bytes: int = MAX_FILE_BYTES, large_files: str = LARGE_FILES) -> str:
+    if max_bytes is None or size <= max_bytes:
+        return "full"
+    return "skipped" if large_files == "skip" else "light"
 
 class DependencyAnalyzer:
-    def __init__(self, file_path):
+    def __init__(self, file_path, max_bytes: int = MAX_FILE_BYTES, large_files: str = LARGE_FILES):
         self.file_path = file_path
+        self.max_bytes = max_bytes
+        self.large_files = large_files
+        # How the last analyze_used() call read the file: "full", "light" or "skipped"
+        self.mode = None
 
     def analyze(self):
         try:
-            with open(self.file_path, 'r', encoding='utf-8') as f:
-                tree = ast.parse(f.read(), filename=self.file_path)
-        except SyntaxError:
+            tree = ast.parse(read_source(self.file_path), filename=self.file_path)
+        except (SyntaxError, ValueError):
             return [], []
 
         imports = []
@@ -16,9 +59,10 @@ class DependencyAnalyzer:
 
         class Analyzer(ast.NodeVisitor):
             def visit_ImportFrom(self, node):
-                if node.module:
-                    for alias in node.names:
-                        imports.append((node.module, alias.name))
+                # Relative imports keep their leading dots so the builder can resolve them
+                module = "." * node.level + (node.module or "")
+                for alias in node.names:
+                    imports.append((module, alias.name))
 
             def visit_Import(self, node):
                 for alias in node.names:
@@ -29,3 +73,197 @@ class DependencyAnalyzer:
 
         Analyzer().visit(tree)
         return imports, usages
+
+    def analyze_used(self):
+        # Returns (imports, used) where used is the set of imported names the module
+        # actually references; the same arcs as analyze() for a fraction of the work
+        self.mode = analysis_mode(os.path.getsize(self.file_path), self.max_bytes, self.large_files)
+        if self.mode == "skipped":
+            return [], set()
+        source = read_source(self.file_path)
+        if self.mode == "light":
+            return self._scan(source)
+        try:
+            tree = ast.parse(source, filename=self.file_path)
+        except (SyntaxError, ValueError):
+            return [], set()
+        imports = self._imports(tree)
+        wanted = set(name for _, name in imports if name is not None)
+        return imports, self._used(tree, wanted) if wanted else set()
+
+    def _imports(self, tree) -> list:
+        # Imports are statements, so only statement bodies are visited, never expressions
+        imports = []
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            children = [child for field in node._fields if field in _BLOCK_FIELDS
+                        for child in getattr(node, field)]
+            stack.extend(reversed(children))
+            if isinstance(node, ast.ImportFrom):
+                module = "." * node.level + (node.module or "")
+                imports.extend((module, alias.name) for alias in node.names)
+            elif isinstance(node, ast.Import):
+                imports.extend((alias.name, None) for alias in node.names)
+        # Source order, the same order analyze() reports them in
+        return imports
+
+    def _used(self, tree, wanted: set) -> set:
+        # Only names that were imported matter; constants hold none and the walk stops
+        # as soon as every imported name has been seen
+        used = set()
+        name_type, constant_type = ast.Name, ast.Constant
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            node_type = type(node)
+            if node_type is name_type:
+                if node.id in wanted:
+                    used.add(node.id)
+                    if len(used) == len(wanted):
+                        break
+                continue
+            if node_type is constant_type:
+                continue
+            for field in node._fields:
+                if field == "ctx":
+                    continue
+                value = getattr(node, field, None)
+                if isinstance(value, list):
+                    stack.extend(v for v in value if isinstance(v, ast.AST))
+                elif isinstance(value, ast.AST):
+                    stack.append(value)
+        return used
+
+    def symbols(self) -> dict:
+        # Symbol-level view of the module for the symbol index, parsed on demand rather than
+        # during graph builds: imports by local name, definitions (classes, functions and
+        # methods by qualified name) with their lines, and every reference a definition makes
+        # to an imported name or to a definition of the module. Large files are not parsed.
+        self.mode = analysis_mode(os.path.getsize(self.file_path), self.max_bytes, self.large_files)
+        result = {"imports": {}, "definitions": [], "references": []}
+        if self.mode != "full":
+            return result
+        try:
+            tree = ast.parse(read_source(self.file_path), filename=self.file_path)
+        except (SyntaxError, ValueError):
+            return result
+        visitor = _SymbolVisitor()
+        visitor.visit(tree)
+        defined = set(name for name, _, _, _ in visitor.definitions)
+        known = set(visitor.imports).union(name.split(".", 1)[0] for name in defined)
+        references = []
+        for scope, dotted, line, call, owner in visitor.references:
+            root, _, rest = dotted.partition(".")
+            if root in ("self", "cls") and owner and rest:
+                # A method or attribute of the enclosing class
+                dotted = f"{owner}.{rest.split('.', 1)[0]}"
+                if dotted not in defined:
+                    continue
+            elif root not in known:
+                continue
+            references.append([scope, dotted, line, call])
+        result.update(imports=visitor.imports, definitions=visitor.definitions, references=references)
+        return result
+
+    def _scan(self, source: str):
+        # Light scan for very large files: import lines by pattern, usages by identifier.
+        # Names mentioned only in strings or comments count as used here.
+        imports = []
+        for module, names in _FROM_IMPORT.findall(source):
+            names = _COMMENT.sub("", names).strip("()").replace("\\", " ")
+            for part in names.split(","):
+                if part.strip():
+                    imports.append((module, part.split()[0]))
+        for names in _IMPORT.findall(source):
+            for part in names.replace("\\", " ").split(","):
+                if part.strip():
+                    imports.append((part.split()[0], None))
+        wanted = set(name for _, name in imports if name is not None)
+        used = wanted.intersection(_IDENTIFIER.findall(source)) if wanted else set()
+        return imports, used
+
+def _dotted(node):
+    # "a.b.c" for a chain of attributes on a name, None for anything else
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    parts.append(node.id)
+    return ".".join(reversed(parts))
+
+class _SymbolVisitor(ast.NodeVisitor):
+    # Collects what DependencyAnalyzer.symbols() returns, keeping track of the enclosing
+    # definition of every reference and of the class "self" and "cls" stand for
+    def __init__(self):
+        self.scope = []
+        self.owner = None
+        self.imports = {}
+        self.definitions = []
+        self.references = []
+
+    def visit_ImportFrom(self, node):
+        module = "." * node.level + (node.module or "")
+        for alias in node.names:
+            if alias.name != "*":
+                self.imports[alias.asname or alias.name] = [module, alias.name]
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            if alias.asname:
+                self.imports[alias.asname] = [alias.name, None]
+            else:
+                # "import a.b" binds "a"; references spell out the rest
+                root = alias.name.split(".", 1)[0]
+                self.imports.setdefault(root, [root, None])
+
+    def _define(self, node, kind: str):
+        for child in node.decorator_list:
+            self.visit(child)
+        qualified = ".".join(self.scope + [node.name])
+        self.definitions.append([qualified, kind, node.lineno, getattr(node, "end_lineno", node.lineno)])
+        owner = self.owner
+        if kind == "class":
+            self.owner = qualified
+        self.scope.append(node.name)
+        for field in ("bases", "keywords", "args", "returns", "body"):
+            value = getattr(node, field, None)
+            if isinstance(value, list):
+                for child in value:
+                    self.visit(child)
+            elif isinstance(value, ast.AST):
+                self.visit(value)
+        self.scope.pop()
+        self.owner = owner
+
+    def visit_ClassDef(self, node):
+        self._define(node, "class")
+
+    def visit_FunctionDef(self, node):
+        self._define(node, "function")
+
+    def visit_AsyncFunctionDef(self, node):
+        self._define(node, "function")
+
+    def _reference(self, node, call: bool) -> bool:
+        dotted = _dotted(node)
+        if dotted is None:
+            return False
+        self.references.append([".".join(self.scope), dotted, node.lineno, call, self.owner])
+        return True
+
+    def visit_Call(self, node):
+        if not self._reference(node.func, True):
+            self.visit(node.func)
+        for child in node.args + node.keywords:
+            self.visit(child)
+
+    def visit_Attribute(self, node):
+        if not self._reference(node, False):
+            self.generic_visit(node)
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Load):
+            self._reference(node, False)
@@ -1,34 +1,143 @@
+from array import array
+
+# Out-degree above which a module's duplicate check uses a set instead of scanning its arcs
+HUB_DEGREE = 256
+
 class Node:
-    def __init__(self, name: str, path: str):
-        self.name = name 
-        self.path = path  
+    __slots__ = ("name", "path", "id")
+
+    def __init__(self, name: str, path: str, node_id: int = None):
+        self.name = name
+        self.path = path
+        self.id = node_id
 
 class Arc:
+    # Built on demand from the graph's arc columns; the graph itself stores no Arc objects
+    __slots__ = ("source", "target", "symbol")
+
     def __init__(self, source: Node, target: Node, symbol: str):
         self.source = source
         self.target = target
-        self.symbol = symbol 
+        self.symbol = symbol
+
+class ArcView:
+    # Read-only sequence of the graph's arcs in insertion order
+    __slots__ = ("graph",)
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __len__(self):
+        return len(self.graph._arc_source)
+
+    def __getitem__(self, i: int) -> Arc:
+        g = self.graph
+        if i < 0:
+            i += len(self)
+        return Arc(g._node_list[g._arc_source[i]], g._node_list[g._arc_target[i]], g._symbols[g._arc_symbol[i]])
+
+    def __iter__(self):
+        g = self.graph
+        nodes, symbols = g._node_list, g._symbols
+        for s, t, y in zip(g._arc_source, g._arc_target, g._arc_symbol):
+            yield Arc(nodes[s], nodes[t], symbols[y])
 
 class Graph:
+    # Modules and symbols are interned to integer ids and arcs are three uint32 columns,
+    # so an arc costs a few dozen bytes instead of a Python object with its own dict.
+    # Each node keeps the ids of its outgoing and incoming arcs, so neighbours are O(degree).
     def __init__(self):
         self.nodes = {}
-        self.arcs = []
+        self._node_list = []
+        self._symbols = []
+        self._symbol_ids = {}
+        self._arc_source = array("I")
+        self._arc_target = array("I")
+        self._arc_symbol = array("I")
+        # Per node: (target id << 32 | symbol id) of its outgoing arcs, for deduplication
+        self._out_keys = []
+        self._out = []
+        self._in = []
+
+    @property
+    def arcs(self) -> ArcView:
+        return ArcView(self)
 
     def add_node(self, name: str, path: str):
-        node = Node(name, path)
+        node = self.nodes.get(name)
+        if node is not None:
+            node.path = path
+            return node
+        node = Node(name, path, len(self._node_list))
         self.nodes[name] = node
+        self._node_list.append(node)
+        self._out.append(array("I"))
+        self._in.append(array("I"))
+        self._out_keys.append(array("Q"))
         return node
 
-    def add_arc(self, source: Node, target: Node, symbol: str):
-        arc = Arc(source, target, symbol)
-        self.arcs.append(arc)
+    def _symbol_id(self, symbol: str) -> int:
+        sid = self._symbol_ids.get(symbol)
+        if sid is None:
+            sid = self._symbol_ids[symbol] = len(self._symbols)
+            self._symbols.append(symbol)
+        return sid
+
+    def add_arc(self, source: Node, target: Node, symbol: str) -> bool:
+        # Returns False when the same (source, target, symbol) arc is already in the graph
+        sid = self._symbol_id(symbol)
+        key = (target.id << 32) | sid
+        seen = self._out_keys[source.id]
+        # A C-level scan of the source's own arcs; modules with many arcs switch to a set
+        if key in seen:
+            return False
+        if isinstance(seen, array):
+            seen.append(key)
+            if len(seen) > HUB_DEGREE:
+                self._out_keys[source.id] = set(seen)
+        else:
+            seen.add(key)
+        arc_id = len(self._arc_source)
+        self._arc_source.append(source.id)
+        self._arc_target.append(target.id)
+        self._arc_symbol.append(sid)
+        self._out[source.id].append(arc_id)
+        self._in[target.id].append(arc_id)
+        return True
+
+    def successors(self, name: str) -> list:
+        # Modules that name imports, in first-seen order
+        targets = dict.fromkeys(self._arc_target[a] for a in self._out[self.nodes[name].id])
+        return [self._node_list[t].name for t in targets]
+
+    def predecessors(self, name: str) -> list:
+        # Modules that import name, in first-seen order
+        sources = dict.fromkeys(self._arc_source[a] for a in self._in[self.nodes[name].id])
+        return [self._node_list[s].name for s in sources]
+
+    def out_arcs(self, name: str) -> list:
+        view = self.arcs
+        return [view[a] for a in self._out[self.nodes[name].id]]
+
+    def in_arcs(self, name: str) -> list:
+        view = self.arcs
+        return [view[a] for a in self._in[self.nodes[name].id]]
+
+    def iter_arc_names(self):
+        # (source, target, symbol) of every arc in insertion order, for writers that
+        # stream the graph instead of building to_dict()
+        names = [node.name for node in self._node_list]
+        symbols = self._symbols
+        for s, t, y in zip(self._arc_source, self._arc_target, self._arc_symbol):
+            yield names[s], names[t], symbols[y]
 
     def to_dict(self):
+        names = [node.name for node in self._node_list]
+        symbols = self._symbols
         return {
             "nodes": list(self.nodes.keys()),
             "arcs": [
-                {"source": arc.source.name, "target": arc.target.name, "symbol": arc.symbol}
-                for arc in self.arcs
+                {"source": names[s], "target": names[t], "symbol": symbols[y]}
+                for s, t, y in zip(self._arc_source, self._arc_target, self._arc_symbol)
             ]
         }
-
@@ -1,52 +1,183 @@
 import os
-import json
-import uuid
+from concurrent.futures import ProcessPoolExecutor
 from .Graph import Graph
-from .DependencyAnalyzer import DependencyAnalyzer
+from functools import partial
+from .DependencyAnalyzer import DependencyAnalyzer, analysis_mode, MAX_FILE_BYTES, LARGE_FILES
+from .ModuleIndex import ModuleIndex
+from .AnalysisCache import AnalysisCache
+from .repoWalker import iter_source_files
+from .graphStore import graph_store, GraphStore
+from .metrics import phase, FILES_TOTAL, ARCS_TOTAL, CACHE_LOOKUPS
+
+# Below this many modules the process pool startup costs more than it saves
+PARALLEL_MIN_FILES = 200
+DEFAULT_CHUNKSIZE = 16
+
+class BuildCancelled(Exception):
+    pass
+
+def write_graph(nodes: list, arcs, fmt: str = "json", repo: str = None, large_files: list = None,
+                store: GraphStore = None):
+    # Saves nodes and (source, target, symbol) arcs in the graph store (./files unless another
+    # store is given), named by content, and returns (path, reused) where reused means an
+    # identical graph was already there. Arcs are written as they are iterated, never
+    # collected into one document.
+    filepath, reused = (store or graph_store).save(nodes, arcs, fmt, repo=repo, large_files=large_files)
+    print(f"{'Reusing' if reused else 'Saving to'}: {filepath}")
+    return filepath, reused
+
+def pool_size(workers: int = None) -> int:
+    # Worker processes for a build: the given number, or one per CPU when it is None
+    if workers is not None and workers < 1:
+        raise ValueError(f"workers must be at least 1, got {workers}")
+    return workers or os.cpu_count() or 1
+
+def link_module(graph: Graph, index: ModuleIndex, source_node, imports: list) -> int:
+    # Adds the arcs of one module's imports; returns how many were new
+    nodes = graph.nodes
+    created = 0
+    for imported_module, imported_name in imports:
+        for target_name in index.resolve(source_node.name, imported_module, imported_name):
+            created += graph.add_arc(source_node, nodes[target_name], imported_name)
+    return created
+
+def summarize_module(file_path: str, max_bytes: int = MAX_FILE_BYTES, large_files: str = LARGE_FILES) -> list:
+    # Only the imports whose name is actually used can produce an arc, so that is
+    # all a worker needs to send back, with how the file was read
+    analyzer = DependencyAnalyzer(file_path, max_bytes, large_files)
+    imports, used = analyzer.analyze_used()
+    return [[(module, name) for module, name in imports if name is not None and name in used], analyzer.mode]
 
 class GraphBuilder:
-    def __init__(self, repo_path: str, filter_prefix: str = "src"):
+    def __init__(self, repo_path: str, filter_prefix="src", workers: int = None, chunksize: int = None,
+                 cache: AnalysisCache = None, use_git: bool = False, max_file_bytes: int = MAX_FILE_BYTES,
+                 large_files: str = LARGE_FILES, files: list = None, store: GraphStore = None):
+        # filter_prefix is one prefix or a list of them; files, when given, are the
+        # (relative path, full path) pairs to analyze instead of walking the prefixes.
+        # store is where export_graph writes (default: the shared store under ./files).
         self.repo_path = repo_path
+        self.store = store
+        self.files = files
+        self.max_file_bytes = max_file_bytes
+        self.large_files = large_files
+        # Files above max_file_bytes and how they were handled ("light" or "skipped")
+        self.large_file_report = []
+        # Seconds spent in each phase of the last build and export
+        self.timings = {}
+        # Import summaries of the last build, in node order
+        self.summaries = []
+        # Whether the last export found the same graph already stored
+        self.reused = False
+        self.use_git = use_git
+        self.cache = cache
         self.filter_prefix = filter_prefix
+        self.workers = pool_size(workers)
+        self.chunksize = chunksize or DEFAULT_CHUNKSIZE
         self.graph = Graph()
+        self.progress = None
+        self.cancel_event = None
+
+    def build(self, parallel: bool = None, progress=None, cancel_event=None):
+        # progress(parsed, total) is called as modules are parsed; setting cancel_event
+        # stops the build with BuildCancelled at the next file
+        summaries = self.summarize(parallel, progress, cancel_event)
+        # Step 3: Create arcs
+        with phase("link", self.timings):
+            self._link(summaries)
+        return self.graph
 
-    def build(self):
+    def summarize(self, parallel: bool = None, progress=None, cancel_event=None) -> list:
+        # Nodes and their import summaries, without resolving them into arcs
+        self.progress = progress
+        self.cancel_event = cancel_event
         # Step 1: Create nodes
-        for root, _, files in os.walk(self.repo_path):
-            if any(part.startswith('.') for part in root.split(os.sep)):
-                continue
-            for file in files:
-                if file.endswith(".py") and not file.startswith("__init__"):
-                    full_path = os.path.join(root, file)
-                    rel_path = os.path.relpath(full_path, self.repo_path)
-                    if not rel_path.startswith(self.filter_prefix):
-                        continue
-                    mod_name = rel_path.replace(os.sep, ".").replace(".py", "")
-                    self.graph.add_node(mod_name, full_path)
-
-        # Step 2: Create arcs
-        for source_name, source_node in self.graph.nodes.items():
-            analyzer = DependencyAnalyzer(source_node.path)
-            imports, usages = analyzer.analyze()
-            usage_set = set(usages)
-
-            for imported_module, imported_name in imports:
-                for target_name, target_node in self.graph.nodes.items():
-                    if target_name.endswith(imported_module) or target_name == imported_module:
-                        if imported_name is None:
-                            continue
-                        if imported_name in usage_set:
-                            self.graph.add_arc(source_node, target_node, imported_name)
+        with phase("walk", self.timings):
+            self._collect_nodes()
+        # Step 2: Parse modules
+        with phase("parse", self.timings):
+            self.summaries = self._parse(parallel)
+        return self.summaries
 
-        return self.graph
-    def export_graph(self) -> str:
-        base_dir = os.path.abspath(".")
-        output_folder = os.path.join(base_dir, "files")
-        uid = str(uuid.uuid4())
-        filename = f"{uid}.json"
-        filepath = os.path.normpath(os.path.join(output_folder, filename))
-        print(f"Saving to: {filepath}")
-        # Actually save the file
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(self.graph.to_dict(), f, indent=2)
-        return filepath
+    def _check_cancelled(self):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise BuildCancelled("Build cancelled")
+
+    def _report(self, parsed: int, total: int):
+        if self.progress is not None:
+            self.progress(parsed, total)
+
+    def _collect_nodes(self):
+        # Hidden, ignored and out-of-prefix directories are pruned before descending
+        files = self.files if self.files is not None else \
+            iter_source_files(self.repo_path, self.filter_prefix, self.use_git)
+        for rel_path, full_path in files:
+            self._check_cancelled()
+            mod_name = rel_path[:-len(".py")].replace("/", ".")
+            self.graph.add_node(mod_name, full_path)
+
+    def _parse(self, parallel: bool = None) -> list:
+        paths = [node.path for node in self.graph.nodes.values()]
+        found, missing = {}, paths
+        if self.cache is not None:
+            # Only files that changed since they were last analyzed get parsed again
+            found, missing = self.cache.lookup(paths)
+            # A cached light scan is redone in full once the size limit allows it, and vice versa
+            for path, (_, mode) in list(found.items()):
+                if mode != analysis_mode(os.path.getsize(path), self.max_file_bytes, self.large_files):
+                    del found[path]
+                    missing.append(path)
+            CACHE_LOOKUPS.inc(len(found), cache="analysis", result="hit")
+            CACHE_LOOKUPS.inc(len(missing), cache="analysis", result="miss")
+        if parallel is None:
+            parallel = self.workers > 1 and len(missing) >= PARALLEL_MIN_FILES
+        self._report(len(found), len(paths))
+        parsed = self._parse_parallel(missing, len(found), len(paths)) if parallel and missing \
+            else self._parse_serial(missing, len(found), len(paths))
+        found.update(zip(missing, parsed))
+        if self.cache is not None:
+            self.cache.store(zip(missing, parsed))
+        FILES_TOTAL.inc(len(paths) - len(missing), mode="cached")
+        for _, mode in parsed:
+            FILES_TOTAL.inc(mode=mode)
+        self.large_file_report = [{"path": os.path.relpath(p, self.repo_path).replace(os.sep, "/"),
+                                   "size": os.path.getsize(p), "mode": found[p][1]}
+                                  for p in paths if found[p][1] != "full"]
+        return [found[p][0] for p in paths]
+
+    def _link(self, summaries: list):
+        # Resolve every import with one index lookup instead of scanning all nodes
+        index = ModuleIndex(self.graph.nodes.keys())
+        created = 0
+        for source_node, imports in zip(list(self.graph.nodes.values()), summaries):
+            created += link_module(self.graph, index, source_node, imports)
+        ARCS_TOTAL.inc(created)
+
+    def _parse_serial(self, paths: list, done: int, total: int) -> list:
+        parsed = []
+        for path in paths:
+            self._check_cancelled()
+            parsed.append(summarize_module(path, self.max_file_bytes, self.large_files))
+            self._report(done + len(parsed), total)
+        return parsed
+
+    def _parse_parallel(self, paths: list, done: int, total: int) -> list:
+        # map() keeps input order, so arcs come out in the same order as a serial build
+        pool = ProcessPoolExecutor(max_workers=self.workers)
+        parsed = []
+        try:
+            summarize = partial(summarize_module, max_bytes=self.max_file_bytes, large_files=self.large_files)
+            for summary in pool.map(summarize, paths, chunksize=self.chunksize):
+                parsed.append(summary)
+                self._report(done + len(parsed), total)
+                self._check_cancelled()
+        finally:
+            # On cancellation, drop the chunks that have not started yet
+            pool.shutdown(wait=True, cancel_futures=True)
+        return parsed
+
+    def export_graph(self, fmt: str = "json") -> str:
+        with phase("export", self.timings):
+            path, self.reused = write_graph(list(self.graph.nodes), self.graph.iter_arc_names(), fmt,
+                                            repo=self.repo_path, large_files=self.large_file_report,
+                                            store=self.store)
+            return path
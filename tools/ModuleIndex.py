@@ -0,0 +1,66 @@
+def suffixes(name: str) -> list:
+    parts = name.split(".")
+    return [".".join(parts[i:]) for i in range(len(parts))]
+
+def relative_target(source_name: str, imported_module: str):
+    # Absolute name a relative import points at, None when it climbs above the top package
+    rest = imported_module.lstrip(".")
+    level = len(imported_module) - len(rest)
+    parts = source_name.split(".")
+    if level >= len(parts):
+        return None
+    # A module's own package is one level up, each extra dot goes one more level up
+    base = parts[:-level]
+    if rest:
+        base = base + rest.split(".")
+    return ".".join(base)
+
+class ModuleIndex:
+    def __init__(self, names):
+        # Map every dotted suffix of every module name to the modules ending with it,
+        # e.g. "src.pkg.mod" is reachable as "mod", "pkg.mod" and "src.pkg.mod"
+        self.names = set()
+        self.by_suffix = {}
+        for name in names:
+            self.add(name)
+
+    def add(self, name: str):
+        if name in self.names:
+            return
+        self.names.add(name)
+        for suffix in suffixes(name):
+            self.by_suffix.setdefault(suffix, []).append(name)
+
+    def remove(self, name: str):
+        if name not in self.names:
+            return
+        self.names.discard(name)
+        for suffix in suffixes(name):
+            matches = self.by_suffix[suffix]
+            matches.remove(name)
+            if not matches:
+                del self.by_suffix[suffix]
+
+    def resolve(self, source_name: str, imported_module: str, imported_name: str = None) -> tuple:
+        # Returns a tuple: the lists in by_suffix are the index's own and change with it
+        if imported_module.startswith("."):
+            return self._resolve_relative(source_name, imported_module, imported_name)
+        targets = self.by_suffix.get(imported_module)
+        if targets:
+            return tuple(targets)
+        # "from pkg import submodule" where pkg itself is not a node (packages never are)
+        if imported_name:
+            return tuple(self.by_suffix.get(f"{imported_module}.{imported_name}", ()))
+        return ()
+
+    def _resolve_relative(self, source_name: str, imported_module: str, imported_name: str = None) -> tuple:
+        target = relative_target(source_name, imported_module)
+        if target is None:
+            return ()
+        if target in self.names:
+            return (target,)
+        if imported_name:
+            submodule = f"{target}.{imported_name}"
+            if submodule in self.names:
+                return (submodule,)
+        return ()
@@ -0,0 +1,166 @@
+import json
+import mmap
+import struct
+import sys
+from array import array
+
+# Layout (little-endian):
+#   header   magic "MCPG", version, #strings, #nodes, #arcs, blob size   (6 x 4 bytes)
+#   offsets  #strings + 1 uint32, byte offsets of each string in the blob
+#   nodes    #nodes uint32 string ids, in graph order
+#   source   #arcs uint32 string ids   \
+#   target   #arcs uint32 string ids    > one column per arc field
+#   symbol   #arcs uint32 string ids   /
+#   blob     every distinct module and symbol name, utf-8, back to back
+MAGIC = b"MCPG"
+VERSION = 1
+COMPACT_EXTENSION = ".mcpg"
+_HEADER = struct.Struct("<4s5I")
+# Columns can be used in place only when the machine layout matches the file layout
+_NATIVE = sys.byteorder == "little" and array("I").itemsize == 4
+
+def is_compact_file(filepath: str) -> bool:
+    with open(filepath, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def _u32(values) -> array:
+    col = array("I", values)
+    if col.itemsize != 4:
+        col = array("L", values)
+    if sys.byteorder != "little":
+        col.byteswap()
+    return col
+
+def write_compact(graph_dict: dict, filepath: str) -> str:
+    arcs = ((a["source"], a["target"], a["symbol"]) for a in graph_dict.get("arcs", []))
+    write_compact_arcs(graph_dict.get("nodes", []), arcs, filepath)
+    return filepath
+
+def write_compact_arcs(nodes, arcs, filepath: str) -> int:
+    # Writes nodes and (source, target, symbol) tuples from any iterable. The arcs are
+    # interned into uint32 columns as they come, so no per-arc object is kept; the
+    # columns follow the header, which needs the counts, so they are written at the end.
+    # Returns the number of arcs written.
+    strings = {}
+    def intern(s: str) -> int:
+        sid = strings.get(s)
+        if sid is None:
+            sid = strings[s] = len(strings)
+        return sid
+    node_ids = _u32([intern(n) for n in nodes])
+    source, target, symbol = array("I"), array("I"), array("I")
+    for s, t, y in arcs:
+        source.append(intern(s))
+        target.append(intern(t))
+        symbol.append(intern(y))
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = [0]
+    for b in encoded:
+        offsets.append(offsets[-1] + len(b))
+    with open(filepath, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(encoded), len(node_ids), len(source), offsets[-1]))
+        _u32(offsets).tofile(f)
+        node_ids.tofile(f)
+        for col in (source, target, symbol):
+            (col if _NATIVE else _u32(col)).tofile(f)
+        f.write(b"".join(encoded))
+    return len(source)
+
+class CompactGraph:
+    # Memory-mapped view of a compact graph file; nothing is decoded until asked for
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self._file = open(filepath, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n_strings, n_nodes, n_arcs, blob_size = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"'{filepath}' is not a compact graph file (version {VERSION})")
+        self.string_count = n_strings
+        self.node_count = n_nodes
+        self.arc_count = n_arcs
+        pos = _HEADER.size
+        self.offsets, pos = self._column(pos, n_strings + 1)
+        self.node_ids, pos = self._column(pos, n_nodes)
+        self.source_ids, pos = self._column(pos, n_arcs)
+        self.target_ids, pos = self._column(pos, n_arcs)
+        self.symbol_ids, pos = self._column(pos, n_arcs)
+        self._blob = memoryview(self._map)[pos:pos + blob_size]
+        self._strings = None
+
+    def _column(self, pos: int, count: int):
+        end = pos + 4 * count
+        if _NATIVE:
+            return memoryview(self._map)[pos:end].cast("I"), end
+        col = array("I" if array("I").itemsize == 4 else "L")
+        col.frombytes(self._map[pos:end])
+        if sys.byteorder != "little":
+            col.byteswap()
+        return col, end
+
+    def string(self, sid: int) -> str:
+        if self._strings is not None:
+            return self._strings[sid]
+        return str(self._blob[self.offsets[sid]:self.offsets[sid + 1]], "utf-8")
+
+    def strings(self) -> list:
+        # Decoding the whole table once is cheaper than decoding per arc field
+        if self._strings is None:
+            blob = bytes(self._blob)
+            offsets = self.offsets
+            self._strings = [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(self.string_count)]
+        return self._strings
+
+    def nodes(self) -> list:
+        table = self.strings()
+        return [table[i] for i in self.node_ids]
+
+    def iter_arcs(self, start: int = 0, stop: int = None):
+        table = self.strings()
+        stop = self.arc_count if stop is None else min(stop, self.arc_count)
+        for i in range(start, stop):
+            yield {"source": table[self.source_ids[i]], "target": table[self.target_ids[i]],
+                   "symbol": table[self.symbol_ids[i]]}
+
+    def arcs(self) -> list:
+        table = self.strings()
+        return [{"source": table[s], "target": table[t], "symbol": table[y]}
+                for s, t, y in zip(self.source_ids, self.target_ids, self.symbol_ids)]
+
+    def to_dict(self) -> dict:
+        return {"nodes": self.nodes(), "arcs": self.arcs()}
+
+    def close(self):
+        for name in ("offsets", "node_ids", "source_ids", "target_ids", "symbol_ids", "_blob"):
+            view = getattr(self, name, None)
+            if isinstance(view, memoryview):
+                view.release()
+        if getattr(self, "_map", None) is not None:
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def json_to_compact(json_path: str, compact_path: str) -> str:
+    with open(json_path, "r", encoding="utf-8") as f:
+        return write_compact(json.load(f), compact_path)
+
+def compact_to_json(compact_path: str, json_path: str) -> str:
+    with CompactGraph(compact_path) as graph:
+        data = graph.to_dict()
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    return json_path
+
+if __name__ == "__main__":
+    # python -m tools.compactGraph in.json out.mcpg   (or the reverse)
+    src, dst = sys.argv[1], sys.argv[2]
+    if is_compact_file(src):
+        compact_to_json(src, dst)
+    else:
+        json_to_compact(src, dst)
+    print(f"Saved {dst}")
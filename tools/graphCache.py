@@ -0,0 +1,126 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+from .readGraph import load_graph
+from .graphStore import graph_store
+from .metrics import CACHE_LOOKUPS
+
+DEFAULT_MAX_BYTES = int(os.getenv("GRAPH_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+def _estimate_bytes(nodes: list, arcs: list) -> int:
+    # Rough resident size: a 3-key dict per arc plus its strings, a string per node
+    text = sum(len(n) for n in nodes) + sum(len(a["source"]) + len(a["target"]) + len(a["symbol"]) for a in arcs)
+    return text + 60 * len(nodes) + 330 * len(arcs)
+
+class CachedGraph:
+    def __init__(self, path: str, stamp: tuple, nodes: list, arcs: list, repo: str = None):
+        self.path = path
+        self.stamp = stamp
+        self.nodes = nodes
+        self.arcs = arcs
+        # Repository the graph was built from, when the graph itself knows it
+        self.repo = repo
+        self.base_bytes = _estimate_bytes(nodes, arcs)
+        self.derived = {}
+        self.lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        extra = 0
+        for value in list(self.derived.values()):
+            extra += sys.getsizeof(value) if isinstance(value, str) else getattr(value, "nbytes", 0)
+        return self.base_bytes + extra
+
+    def memo(self, key: str, builder):
+        # Values derived from the graph (rendered prompts, indexes) live as long as the graph does
+        value = self.derived.get(key)
+        if value is None:
+            with self.lock:
+                value = self.derived.get(key)
+                if value is None:
+                    value = self.derived[key] = builder()
+        return value
+
+class GraphCache:
+    # Process-wide LRU of loaded graphs keyed by file path, invalidated when the file's
+    # mtime or size changes and bounded by an estimate of resident memory
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Graphs kept in memory by watch mode: reference -> callable returning the current
+        # CachedGraph. They are never evicted and never read from disk.
+        self.live = {}
+
+    def register_live(self, ref: str, provider):
+        with self.lock:
+            self.live[ref] = provider
+
+    def unregister_live(self, ref: str):
+        with self.lock:
+            self.live.pop(ref, None)
+
+    def exists(self, ref: str) -> bool:
+        return ref in self.live or os.path.isfile(ref)
+
+    def get(self, filepath: str) -> CachedGraph:
+        provider = self.live.get(filepath)
+        if provider is not None:
+            return provider()
+        path = os.path.realpath(filepath)
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry.stamp == stamp:
+                self.entries.move_to_end(path)
+                self.hits += 1
+                CACHE_LOOKUPS.inc(cache="graph", result="hit")
+                return entry
+            self.misses += 1
+        CACHE_LOOKUPS.inc(cache="graph", result="miss")
+        nodes, arcs = load_graph(path)
+        graph_store.touch(path)
+        entry = CachedGraph(path, stamp, nodes, arcs)
+        with self.lock:
+            self.entries[path] = entry
+            self.entries.move_to_end(path)
+            self._evict()
+        return entry
+
+    def _evict(self):
+        # The entry just used is never evicted, even if it alone exceeds the budget
+        total = sum(e.nbytes for e in self.entries.values())
+        while total > self.max_bytes and len(self.entries) > 1:
+            _, entry = self.entries.popitem(last=False)
+            total -= entry.nbytes
+            self.evictions += 1
+
+    def invalidate(self, filepath: str = None):
+        with self.lock:
+            if filepath is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(os.path.realpath(filepath), None)
+
+    def stats(self) -> dict:
+        with self.lock:
+            self._evict()
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "live": len(self.live),
+                "bytes": sum(e.nbytes for e in self.entries.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+# Shared by every request handled by this process
+graph_cache = GraphCache()
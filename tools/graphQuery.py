@@ -0,0 +1,236 @@
+from collections import deque
+
+# Arcs point from the importing module to the imported one, so "dependencies" follow
+# arcs forwards and "dependents" (what may break when a module changes) follow them backwards.
+
+class ModuleNotFound(KeyError):
+    pass
+
+class GraphQuery:
+    # Integer-indexed adjacency built once per graph; every query below is a plain
+    # traversal over it, so answers are exact and need no LLM call
+    def __init__(self, nodes: list, arcs: list):
+        self.names = list(nodes)
+        ids = self.ids = {name: i for i, name in enumerate(self.names)}
+        out_sets = [set() for _ in self.names]
+        in_sets = [set() for _ in self.names]
+        symbols = self.symbols = {}
+        for arc in arcs:
+            source, target = arc["source"], arc["target"]
+            s, t = ids.get(source), ids.get(target)
+            if s is None or t is None:
+                # Arc endpoints missing from the node list still become modules
+                s, t = self._add_name(source, out_sets, in_sets), self._add_name(target, out_sets, in_sets)
+            pair_symbols = symbols.get((s, t))
+            if pair_symbols is None:
+                pair_symbols = symbols[(s, t)] = set()
+                out_sets[s].add(t)
+                in_sets[t].add(s)
+            pair_symbols.add(arc["symbol"])
+        self.out_edges = [sorted(e) for e in out_sets]
+        self.in_edges = [sorted(e) for e in in_sets]
+        # Alphabetical position of every module, so results sort on integers
+        self.by_rank = sorted(range(len(self.names)), key=self.names.__getitem__)
+        self.rank = [0] * len(self.names)
+        for position, i in enumerate(self.by_rank):
+            self.rank[i] = position
+        self._rankings = {}
+        self._components = None
+        self._layers = None
+        self._by_last = None
+        self.nbytes = 120 * len(self.symbols) + 150 * len(self.names)
+
+    def _add_name(self, name: str, out_sets: list, in_sets: list) -> int:
+        i = self.ids.get(name)
+        if i is None:
+            i = self.ids[name] = len(self.names)
+            self.names.append(name)
+            out_sets.append(set())
+            in_sets.append(set())
+        return i
+
+    @classmethod
+    def from_graph(cls, graph):
+        # graph is a tools.Graph.Graph
+        data = graph.to_dict()
+        return cls(data["nodes"], data["arcs"])
+
+    def resolve(self, module: str) -> int:
+        # Exact name, or a dotted suffix that names exactly one module ("GraphBuilder" for "tools.GraphBuilder")
+        if module in self.ids:
+            return self.ids[module]
+        if self._by_last is None:
+            self._by_last = {}
+            for i, name in enumerate(self.names):
+                self._by_last.setdefault(name.rsplit(".", 1)[-1], []).append(i)
+        suffix = "." + module
+        matches = [i for i in self._by_last.get(module.rsplit(".", 1)[-1], ()) if self.names[i].endswith(suffix)]
+        if len(matches) == 1:
+            return matches[0]
+        if not matches:
+            raise ModuleNotFound(f"Module '{module}' not found in the graph")
+        shown = ", ".join(sorted(self.names[i] for i in matches)[:10])
+        raise ModuleNotFound(f"Module '{module}' is ambiguous: {shown}")
+
+    def _closure(self, start: int, edges: list, max_depth: int = None) -> list:
+        # Breadth-first, so modules come out nearest first; returns [(id, depth)]
+        depth = [-1] * len(self.names)
+        depth[start] = 0
+        order = [start]
+        head = 0
+        while head < len(order):
+            node = order[head]
+            head += 1
+            d = depth[node] + 1
+            if max_depth is not None and d > max_depth:
+                break
+            for other in edges[node]:
+                if depth[other] == -1:
+                    depth[other] = d
+                    order.append(other)
+        # Alphabetical within a depth, via precomputed name ranks rather than string compares
+        n = len(self.names)
+        rank = self.rank
+        keys = sorted(depth[i] * n + rank[i] for i in order[1:])
+        by_rank = self.by_rank
+        return [(by_rank[k % n], k // n) for k in keys]
+
+    def _rows(self, closure: list, limit: int = None) -> list:
+        return [{"module": self.names[i], "depth": d} for i, d in closure[:limit]]
+
+    def dependencies(self, module: str, max_depth: int = None, limit: int = None):
+        # Modules reachable from module with the number of import hops to each: (rows, total)
+        closure = self._closure(self.resolve(module), self.out_edges, max_depth)
+        return self._rows(closure, limit), len(closure)
+
+    def dependents(self, module: str, max_depth: int = None, limit: int = None):
+        # Modules that import module directly or through others: (rows, total)
+        closure = self._closure(self.resolve(module), self.in_edges, max_depth)
+        return self._rows(closure, limit), len(closure)
+
+    def shortest_path(self, source: str, target: str):
+        # Fewest import hops from source to target, or None when target is unreachable
+        start, goal = self.resolve(source), self.resolve(target)
+        previous = {start: None}
+        queue = deque([start])
+        while queue and goal not in previous:
+            node = queue.popleft()
+            for other in self.out_edges[node]:
+                if other not in previous:
+                    previous[other] = node
+                    queue.append(other)
+        if goal not in previous:
+            return None
+        path = [goal]
+        while previous[path[-1]] is not None:
+            path.append(previous[path[-1]])
+        path.reverse()
+        return [{"source": self.names[a], "target": self.names[b], "symbols": sorted(self.symbols[(a, b)])}
+                for a, b in zip(path, path[1:])]
+
+    def components(self) -> list:
+        # Strongly connected components (Tarjan, iterative), dependencies before their dependents
+        if self._components is not None:
+            return self._components
+        index = [-1] * len(self.names)
+        low = [0] * len(self.names)
+        on_stack = [False] * len(self.names)
+        stack = []
+        result = []
+        counter = 0
+        for root in range(len(self.names)):
+            if index[root] != -1:
+                continue
+            work = [(root, 0)]
+            while work:
+                node, pos = work.pop()
+                if pos == 0:
+                    index[node] = low[node] = counter
+                    counter += 1
+                    stack.append(node)
+                    on_stack[node] = True
+                edges = self.out_edges[node]
+                while pos < len(edges):
+                    other = edges[pos]
+                    pos += 1
+                    if index[other] == -1:
+                        work.append((node, pos))
+                        work.append((other, 0))
+                        break
+                    if on_stack[other]:
+                        low[node] = min(low[node], index[other])
+                else:
+                    if low[node] == index[node]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack[member] = False
+                            component.append(member)
+                            if member == node:
+                                break
+                        result.append(component)
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[node])
+        self._components = result
+        return result
+
+    def cycles(self, min_size: int = 2) -> list:
+        # Import cycles as groups of mutually dependent modules, largest first
+        groups = [sorted(self.names[i] for i in c) for c in self.components() if len(c) >= max(min_size, 2)]
+        return sorted(groups, key=lambda g: (-len(g), g))
+
+    def layers(self) -> list:
+        # Layer 0 imports nothing inside the graph; every other module sits one layer above the
+        # highest module it imports. Members of a cycle share a layer.
+        if self._layers is not None:
+            return self._layers
+        component_of = [0] * len(self.names)
+        components = self.components()
+        for c, members in enumerate(components):
+            for member in members:
+                component_of[member] = c
+        level = [0] * len(components)
+        # Tarjan emits a component only after everything it reaches, so one pass suffices
+        for c, members in enumerate(components):
+            level[c] = max((level[component_of[o]] + 1 for m in members for o in self.out_edges[m]
+                            if component_of[o] != c), default=0)
+        layers = [[] for _ in range(max(level, default=-1) + 1)]
+        self._layer_of = [0] * len(self.names)
+        for node, c in enumerate(component_of):
+            layers[level[c]].append(self.names[node])
+            self._layer_of[node] = level[c]
+        self._layers = [sorted(layer) for layer in layers]
+        return self._layers
+
+    def layer_of(self, module: str) -> int:
+        self.layers()
+        return self._layer_of[self.resolve(module)]
+
+    def ranking(self, by: str = "fan_in", limit: int = 20) -> list:
+        # Modules with the most distinct dependents (fan_in) or dependencies (fan_out)
+        if by not in ("fan_in", "fan_out"):
+            raise ValueError("by must be 'fan_in' or 'fan_out'")
+        order = self._rankings.get(by)
+        if order is None:
+            primary = self.in_edges if by == "fan_in" else self.out_edges
+            order = self._rankings[by] = sorted(self.by_rank, key=lambda i: -len(primary[i]))
+        return [{"module": self.names[i], "fan_in": len(self.in_edges[i]), "fan_out": len(self.out_edges[i])}
+                for i in order[:limit]]
+
+    def facts(self, modules: list) -> list:
+        # One line of exact structure per module, for grounding an LLM answer
+        cyclic = {self.names[m] for c in self.components() if len(c) > 1 for m in c}
+        lines = []
+        for name in modules:
+            i = self.ids[name]
+            lines.append(f"{name}: imports {len(self.out_edges[i])} modules directly "
+                         f"({len(self._closure(i, self.out_edges))} transitively); imported by "
+                         f"{len(self.in_edges[i])} directly ({len(self._closure(i, self.in_edges))} transitively); "
+                         f"layer {self.layer_of(name)}"
+                         + ("; part of an import cycle" if name in cyclic else ""))
+        return lines
+
+def cached_graph_query(graph) -> GraphQuery:
+    # graph is a tools.graphCache entry; the index is built once per loaded graph
+    return graph.memo("graph_query", lambda: GraphQuery(graph.nodes, graph.arcs))
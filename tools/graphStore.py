@@ -0,0 +1,268 @@
+import hashlib
+import json
+import os
+import sqlite3
+import subprocess
+import threading
+import time
+import uuid
+from .DependencyAnalyzer import ANALYZER_VERSION
+from .compactGraph import write_compact_arcs, COMPACT_EXTENSION, is_compact_file
+from .graphStream import write_json_arcs
+from .repoWalker import iter_source_files
+
+DEFAULT_GRAPH_FOLDER = os.path.join(".", "files")
+DEFAULT_INDEX_PATH = os.path.join(".", "cache", "graphs.sqlite")
+# Graphs not analyzed or read for this many days are removed by the collector (0 keeps them)
+GRAPH_RETENTION_DAYS = float(os.getenv("GRAPH_RETENTION_DAYS", "30"))
+# At most this many graph files are kept; the least recently used go first (0 for no limit)
+GRAPH_MAX_COUNT = int(os.getenv("GRAPH_MAX_COUNT", "1000"))
+# Reading a graph refreshes its last_used at most this often, so loads don't all write
+TOUCH_INTERVAL = 60
+
+def graph_digest(file_path: str) -> str:
+    # Content hash of a written graph file; equal graphs in the same format get the same name
+    h = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def repo_commit(repo_path: str):
+    # HEAD of the repository, None when it isn't a git checkout
+    try:
+        out = subprocess.run(["git", "-C", repo_path, "rev-parse", "HEAD"],
+                             capture_output=True, check=True, text=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.strip() or None
+
+def source_fingerprint(repo_path: str, options: tuple, use_git: bool = False, prefixes="src") -> str:
+    # Identifies the analyzed state of a repository: every module file's path, mtime and
+    # size plus the options that shape the graph. Stat calls only, no file is read.
+    h = hashlib.blake2b(digest_size=16)
+    h.update(json.dumps([os.path.realpath(repo_path), ANALYZER_VERSION, list(options)]).encode("utf-8"))
+    for rel_path, full_path in iter_source_files(repo_path, prefixes, use_git):
+        try:
+            st = os.stat(full_path)
+        except OSError:
+            continue
+        h.update(f"\0{rel_path}\0{st.st_mtime_ns}\0{st.st_size}".encode("utf-8", errors="surrogateescape"))
+    return h.hexdigest()
+
+class GraphStore:
+    # Graph files under ./files named by their content hash, plus an SQLite index of their
+    # metadata. Writing a graph that already exists returns the existing file, and listing
+    # graphs reads the index instead of stat'ing every file in the folder.
+    def __init__(self, folder: str = DEFAULT_GRAPH_FOLDER, index_path: str = DEFAULT_INDEX_PATH):
+        self.folder = os.path.abspath(folder)
+        self.index_path = index_path
+        self._local = threading.local()
+        self._touched = {}
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared between threads, so each thread gets its own
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if not self._initialized:
+                self._initialize()
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.index_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _initialize(self):
+        # Created on first use, so importing the module touches nothing on disk
+        with self._init_lock:
+            if self._initialized:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+            conn = self._connect()
+            with conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS graphs ("
+                    "name TEXT PRIMARY KEY, format TEXT, repo TEXT, git_commit TEXT, created REAL, "
+                    "last_used REAL, size INTEGER, nodes INTEGER, arcs INTEGER, large_files TEXT)")
+                conn.execute("CREATE INDEX IF NOT EXISTS graphs_created ON graphs (created)")
+                conn.execute("CREATE INDEX IF NOT EXISTS graphs_last_used ON graphs (last_used)")
+                # Repository state -> graph built from it, so an unchanged repository isn't rebuilt
+                conn.execute("CREATE TABLE IF NOT EXISTS sources (fingerprint TEXT PRIMARY KEY, name TEXT)")
+                # Session handed out with the graph, so analyzing it again doesn't start another one
+                columns = [row[1] for row in conn.execute("PRAGMA table_info(graphs)")]
+                if "session_id" not in columns:
+                    conn.execute("ALTER TABLE graphs ADD COLUMN session_id TEXT")
+            conn.close()
+            self._initialized = True
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.folder, name)
+
+    def save(self, nodes: list, arcs, fmt: str = "json", repo: str = None, large_files: list = None):
+        # Writes nodes and (source, target, symbol) arcs, streamed from any iterable.
+        # Returns (path, reused) where reused means the same graph was already stored.
+        os.makedirs(self.folder, exist_ok=True)
+        tmp = os.path.join(self.folder, f".{uuid.uuid4().hex}.tmp")
+        try:
+            writer = write_compact_arcs if fmt == "compact" else write_json_arcs
+            arc_count = writer(nodes, arcs, tmp)
+            name = graph_digest(tmp) + (COMPACT_EXTENSION if fmt == "compact" else ".json")
+            path = self.path(name)
+            reused = os.path.isfile(path)
+            if reused:
+                os.remove(tmp)
+            else:
+                os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        now = time.time()
+        with self._conn() as conn:
+            # A reused graph keeps its creation time; the repository it came from is the latest one
+            conn.execute(
+                "INSERT INTO graphs (name, format, repo, git_commit, created, last_used, size, nodes, arcs, "
+                "large_files) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(name) DO UPDATE SET "
+                "repo = excluded.repo, git_commit = excluded.git_commit, last_used = excluded.last_used, "
+                "nodes = excluded.nodes, arcs = excluded.arcs, large_files = excluded.large_files",
+                (name, fmt, repo, repo_commit(repo) if repo else None, now, now, os.path.getsize(path),
+                 len(nodes), arc_count, json.dumps(large_files or [])))
+        self._touched[name] = now
+        return path, reused
+
+    def record_source(self, fingerprint: str, path: str):
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO sources (fingerprint, name) VALUES (?, ?)",
+                         (fingerprint, os.path.basename(path)))
+
+    def lookup_source(self, fingerprint: str):
+        # The graph already built from this repository state, as (path, entry), or None
+        row = self._conn().execute(
+            "SELECT g.name FROM sources s JOIN graphs g ON g.name = s.name WHERE s.fingerprint = ?",
+            (fingerprint,)).fetchone()
+        if row is None or not os.path.isfile(self.path(row[0])):
+            return None
+        self.touch(self.path(row[0]), force=True)
+        return self.path(row[0]), self.get(row[0])
+
+    def session_for(self, path: str):
+        row = self._conn().execute("SELECT session_id FROM graphs WHERE name = ?",
+                                   (os.path.basename(path),)).fetchone()
+        return row[0] if row is not None else None
+
+    def set_session(self, path: str, session_id: str):
+        with self._conn() as conn:
+            conn.execute("UPDATE graphs SET session_id = ? WHERE name = ?", (session_id, os.path.basename(path)))
+
+    def touch(self, path: str, force: bool = False):
+        # Marks a stored graph as used, which keeps it from being collected
+        if os.path.dirname(os.path.abspath(path)) != self.folder:
+            return
+        name = os.path.basename(path)
+        now = time.time()
+        if not force and now - self._touched.get(name, 0) < TOUCH_INTERVAL:
+            return
+        self._touched[name] = now
+        with self._conn() as conn:
+            conn.execute("UPDATE graphs SET last_used = ? WHERE name = ?", (now, name))
+
+    def sync(self):
+        # Indexes graph files the index doesn't know yet (written by older versions or copied
+        # in by hand) and drops entries whose file is gone. Only runs when the folder changed.
+        try:
+            stamp = str(os.stat(self.folder).st_mtime_ns)
+        except OSError:
+            return
+        conn = self._conn()
+        row = conn.execute("SELECT value FROM meta WHERE key = 'folder_stamp'").fetchone()
+        if row is not None and row[0] == stamp:
+            return
+        on_disk = {}
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.startswith("."):
+                    on_disk[entry.name] = entry
+        known = set(r[0] for r in conn.execute("SELECT name FROM graphs"))
+        with conn:
+            for name in known.difference(on_disk):
+                conn.execute("DELETE FROM graphs WHERE name = ?", (name,))
+                conn.execute("DELETE FROM sources WHERE name = ?", (name,))
+            for name in set(on_disk).difference(known):
+                st = on_disk[name].stat()
+                fmt = "compact" if is_compact_file(on_disk[name].path) else "json"
+                # Counts aren't known without loading the graph; they stay empty
+                conn.execute(
+                    "INSERT OR IGNORE INTO graphs (name, format, created, last_used, size) VALUES (?, ?, ?, ?, ?)",
+                    (name, fmt, st.st_mtime, st.st_mtime, st.st_size))
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('folder_stamp', ?)", (stamp,))
+
+    def _entry(self, row) -> dict:
+        name, fmt, repo, commit, created, last_used, size, nodes, arcs, large_files = row
+        return {"name": name, "format": fmt, "repo": repo, "commit": commit, "created": created,
+                "last_used": last_used, "size": size, "nodes": nodes, "arcs": arcs,
+                "large_files": json.loads(large_files) if large_files else []}
+
+    def get(self, name: str):
+        row = self._conn().execute(
+            "SELECT name, format, repo, git_commit, created, last_used, size, nodes, arcs, large_files "
+            "FROM graphs WHERE name = ?", (name,)).fetchone()
+        return self._entry(row) if row is not None else None
+
+    def list(self, offset: int = 0, limit: int = None, repo: str = None):
+        # Returns (page of entries, newest first, total number of entries)
+        self.sync()
+        where, args = ("WHERE repo = ?", (repo,)) if repo else ("", ())
+        conn = self._conn()
+        total = conn.execute(f"SELECT COUNT(*) FROM graphs {where}", args).fetchone()[0]
+        rows = conn.execute(
+            "SELECT name, format, repo, git_commit, created, last_used, size, nodes, arcs, large_files "
+            f"FROM graphs {where} ORDER BY created DESC, name LIMIT ? OFFSET ?",
+            args + (-1 if limit is None else limit, offset)).fetchall()
+        return [self._entry(row) for row in rows], total
+
+    def collect(self, retention_days: float = GRAPH_RETENTION_DAYS, max_count: int = GRAPH_MAX_COUNT,
+                dry_run: bool = False) -> list:
+        # Removes graphs unused for retention_days and the least recently used beyond
+        # max_count. Only graphs written by the store are
+        # considered; files found in the folder are left alone. Returns the removed names.
+        self.sync()
+        conn = self._conn()
+        rows = conn.execute("SELECT name, last_used FROM graphs WHERE repo IS NOT NULL "
+                            "ORDER BY last_used DESC, name").fetchall()
+        cutoff = time.time() - retention_days * 86400
+        expired = [name for i, (name, last_used) in enumerate(rows)
+                   if (retention_days and (last_used or 0) < cutoff) or (max_count and i >= max_count)]
+        if dry_run:
+            return expired
+        for name in expired:
+            try:
+                os.remove(self.path(name))
+            except FileNotFoundError:
+                pass
+            with conn:
+                conn.execute("DELETE FROM graphs WHERE name = ?", (name,))
+                conn.execute("DELETE FROM sources WHERE name = ?", (name,))
+            self._touched.pop(name, None)
+        return expired
+
+    def claim_collection(self, interval: float) -> bool:
+        # True for the one caller, across workers, that should run the collector now
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT value FROM meta WHERE key = 'last_gc'").fetchone()
+            now = time.time()
+            if row is not None and now - float(row[0]) < interval:
+                return False
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_gc', ?)", (str(now),))
+            return True
+
+# Shared by every request handled by this process
+graph_store = GraphStore()
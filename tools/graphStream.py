@@ -0,0 +1,212 @@
+import json
+import re
+from .compactGraph import CompactGraph, is_compact_file
+
+# Characters of JSON text read, or written, at a time
+CHUNK_SIZE = 1 << 16
+# Page size of nodes and of arcs when a paged request gives no limit
+DEFAULT_PAGE_SIZE = 1000
+
+_WS = re.compile(r"[ \t\n\r]*")
+_decoder = json.JSONDecoder()
+
+def iter_json_text(nodes, arcs, chunk_size: int = CHUNK_SIZE):
+    # The same text json.dump(graph, f, indent=2) writes for {"nodes", "arcs"}, produced
+    # piece by piece from nodes and (source, target, symbol) tuples, so a stored graph
+    # gets the same bytes, and content hash, however it was written
+    dumps = json.dumps
+    parts = ['{\n  "nodes": [']
+    size = 0
+    sep = "\n    "
+    for name in nodes:
+        text = sep + dumps(name)
+        parts.append(text)
+        size += len(text)
+        sep = ",\n    "
+        if size >= chunk_size:
+            yield "".join(parts)
+            parts, size = [], 0
+    parts.append('\n  ],\n  "arcs": [' if sep != "\n    " else '],\n  "arcs": [')
+    sep = "\n    "
+    for source, target, symbol in arcs:
+        text = (f'{sep}{{\n      "source": {dumps(source)},\n      "target": {dumps(target)},\n'
+                f'      "symbol": {dumps(symbol)}\n    }}')
+        parts.append(text)
+        size += len(text)
+        sep = ",\n    "
+        if size >= chunk_size:
+            yield "".join(parts)
+            parts, size = [], 0
+    parts.append("\n  ]\n}" if sep != "\n    " else "]\n}")
+    yield "".join(parts)
+
+def write_json_arcs(nodes, arcs, filepath: str) -> int:
+    # Writes a JSON graph without building it in memory; returns the number of arcs written
+    count = 0
+    def counted():
+        nonlocal count
+        for arc in arcs:
+            count += 1
+            yield arc
+    with open(filepath, "w", encoding="utf-8") as f:
+        for chunk in iter_json_text(nodes, counted()):
+            f.write(chunk)
+    return count
+
+class _JSONReader:
+    # Decodes one JSON value at a time from a text file, reading more only when the
+    # value at the current position isn't complete yet
+    def __init__(self, f, chunk_size: int = CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        data = self.f.read(self.chunk_size)
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        # Next non-whitespace character, "" at the end of the file
+        while True:
+            self.pos = _WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def take(self, expected: str) -> str:
+        c = self.peek()
+        if not c or c not in expected:
+            raise ValueError(f"Expected one of {expected!r} in graph file, found {c!r}")
+        self.pos += 1
+        return c
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+                # A number or literal cut at the buffer end could continue in the next chunk
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def items(self):
+        # Values of the array whose "[" was just taken, up to and including its "]". The
+        # loop keeps the buffer in locals, since large graphs have a million items here.
+        # scan_once is the C scanner behind raw_decode, without its per-call Python frame
+        scan, ws = _decoder.scan_once, _WS.match
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            buf = self.buf
+            # raw_decode doesn't skip leading whitespace
+            pos = self.pos = ws(buf, self.pos).end()
+            try:
+                obj, end = scan(buf, pos)
+            except (StopIteration, json.JSONDecodeError):
+                if self.eof:
+                    raise ValueError(f"Invalid value in graph file at {buf[pos:pos + 20]!r}") from None
+                self._fill()
+                continue
+            if end == len(buf) and not self.eof:
+                self._fill()
+                continue
+            pos = ws(buf, end).end()
+            if pos >= len(buf):
+                self.pos = end
+                c = self.peek()
+                pos = self.pos
+                buf = self.buf
+            else:
+                c = buf[pos]
+            if not c or c not in ",]":
+                raise ValueError(f"Expected one of ',]' in graph file, found {c!r}")
+            self.pos = pos + 1
+            yield obj
+            if c == "]":
+                return
+
+def iter_graph(filepath: str):
+    # Yields ("node", name) and then ("arc", (source, target, symbol)) in file order,
+    # holding one node or arc at a time whatever the size of the graph
+    if is_compact_file(filepath):
+        with CompactGraph(filepath) as graph:
+            table = graph.strings()
+            for sid in graph.node_ids:
+                yield "node", table[sid]
+            for s, t, y in zip(graph.source_ids, graph.target_ids, graph.symbol_ids):
+                yield "arc", (table[s], table[t], table[y])
+        return
+    with open(filepath, "r", encoding="utf-8") as f:
+        reader = _JSONReader(f)
+        reader.take("{")
+        if reader.peek() == "}":
+            return
+        while True:
+            key = reader.value()
+            reader.take(":")
+            if key in ("nodes", "arcs") and reader.peek() == "[":
+                reader.take("[")
+                if key == "nodes":
+                    for item in reader.items():
+                        yield "node", item
+                else:
+                    for item in reader.items():
+                        yield "arc", (item["source"], item["target"], item["symbol"])
+            else:
+                reader.value()
+            if reader.take(",}") == "}":
+                return
+
+def stream_graph_json(filepath: str, chunk_size: int = CHUNK_SIZE):
+    # The graph as JSON text in chunks: a JSON file is copied as is, a compact one is
+    # rendered on the fly
+    if is_compact_file(filepath):
+        with CompactGraph(filepath) as graph:
+            table = graph.strings()
+            nodes = (table[sid] for sid in graph.node_ids)
+            arcs = ((table[s], table[t], table[y])
+                    for s, t, y in zip(graph.source_ids, graph.target_ids, graph.symbol_ids))
+            yield from iter_json_text(nodes, arcs, chunk_size)
+        return
+    with open(filepath, "r", encoding="utf-8") as f:
+        for chunk in iter(lambda: f.read(chunk_size), ""):
+            yield chunk
+
+def read_graph_page(filepath: str, node_offset: int = 0, node_limit: int = DEFAULT_PAGE_SIZE,
+                    arc_offset: int = 0, arc_limit: int = DEFAULT_PAGE_SIZE, sources=None, targets=None) -> dict:
+    # One pass over the file: a range of nodes, and a range of the arcs whose source is in
+    # sources and target in targets (either may be None for any), with their totals.
+    # Only the returned pages are kept in memory.
+    sources = set(sources) if sources else None
+    targets = set(targets) if targets else None
+    node_stop = node_offset + node_limit if node_limit is not None else None
+    arc_stop = arc_offset + arc_limit if arc_limit is not None else None
+    nodes, arcs = [], []
+    total_nodes = total_arcs = matched = 0
+    for kind, item in iter_graph(filepath):
+        if kind == "node":
+            if total_nodes >= node_offset and (node_stop is None or total_nodes < node_stop):
+                nodes.append(item)
+            total_nodes += 1
+            continue
+        total_arcs += 1
+        if (sources is None or item[0] in sources) and (targets is None or item[1] in targets):
+            if matched >= arc_offset and (arc_stop is None or matched < arc_stop):
+                arcs.append({"source": item[0], "target": item[1], "symbol": item[2]})
+            matched += 1
+    return {"nodes": nodes, "arcs": arcs, "total_nodes": total_nodes, "total_arcs": total_arcs,
+            "matched_arcs": matched}
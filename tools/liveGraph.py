@@ -0,0 +1,215 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from .AnalysisCache import AnalysisCache
+from .DependencyAnalyzer import MAX_FILE_BYTES, LARGE_FILES
+from .GraphBuilder import GraphBuilder, summarize_module, write_graph, pool_size, PARALLEL_MIN_FILES, DEFAULT_CHUNKSIZE
+from .ModuleIndex import ModuleIndex, suffixes, relative_target
+from .graphCache import CachedGraph
+from .repoWalker import iter_source_files
+from .metrics import phase, FILES_TOTAL
+
+def _stamp(path: str):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+def import_keys(source_name: str, imports: list) -> set:
+    # Names whose appearance or disappearance can change how these imports resolve:
+    # the imported module and "module.name" for absolute imports, the absolute target
+    # and target.name for relative ones. A new module matters when one of its dotted
+    # suffixes is among them.
+    keys = set()
+    for imported_module, imported_name in imports:
+        target = relative_target(source_name, imported_module) if imported_module.startswith(".") \
+            else imported_module
+        if target:
+            keys.add(target)
+            keys.add(f"{target}.{imported_name}")
+    return keys
+
+class LiveGraph:
+    # A dependency graph kept in memory and patched as files change instead of rebuilt.
+    # Per module it keeps the file stamp, the import summary and the resolved outgoing
+    # arcs. An index from import keys to importing modules finds the modules whose arcs
+    # can change when another module is added or removed; those are relinked from their
+    # summaries without being parsed again.
+    def __init__(self, repo_path: str, filter_prefix="src", use_git: bool = False,
+                 max_file_bytes: int = MAX_FILE_BYTES, large_files: str = LARGE_FILES, workers: int = None,
+                 use_cache: bool = True, ref: str = None):
+        self.repo_path = repo_path
+        self.filter_prefix = filter_prefix
+        self.use_git = use_git
+        self.max_file_bytes = max_file_bytes
+        self.large_files = large_files
+        self.workers = pool_size(workers)
+        self.use_cache = use_cache
+        self.ref = ref or repo_path
+        self.paths = {}
+        self.stamps = {}
+        self.summaries = {}
+        # module -> [(target, symbol)] in resolution order, without duplicates
+        self.out = {}
+        # Modules that were not read in full ("light" or "skipped")
+        self.modes = {}
+        self.index = ModuleIndex(())
+        self.importers = {}
+        self.version = 0
+        self.updated = None
+        self._view = None
+        # lock guards the structures above; update_lock keeps one scan at a time while
+        # parsing happens outside lock, so queries are served from the previous version
+        self.lock = threading.Lock()
+        self.update_lock = threading.Lock()
+
+    def _current_files(self) -> dict:
+        # module -> (path, stamp) for every module file under the prefix right now
+        files = {}
+        for rel_path, full_path in iter_source_files(self.repo_path, self.filter_prefix, self.use_git):
+            stamp = _stamp(full_path)
+            if stamp is not None:
+                files[rel_path[:-len(".py")].replace("/", ".")] = (full_path, stamp)
+        return files
+
+    def build(self):
+        with self.update_lock:
+            # Stamps are taken before parsing, so a file edited during the build is
+            # seen as changed by the next scan
+            current = self._current_files()
+            cache = AnalysisCache() if self.use_cache else None
+            try:
+                builder = GraphBuilder(self.repo_path, filter_prefix=self.filter_prefix, workers=self.workers,
+                                       cache=cache, use_git=self.use_git, max_file_bytes=self.max_file_bytes,
+                                       large_files=self.large_files)
+                builder.build()
+            finally:
+                if cache is not None:
+                    cache.close()
+            modes = {entry["path"][:-len(".py")].replace("/", "."): entry["mode"]
+                     for entry in builder.large_file_report}
+            with self.lock:
+                for node, imports in zip(builder.graph.nodes.values(), builder.summaries):
+                    self.paths[node.name] = node.path
+                    self.stamps[node.name] = current.get(node.name, (None, None))[1]
+                    self._set_summary(node.name, imports)
+                    if node.name in modes:
+                        self.modes[node.name] = modes[node.name]
+                    self.index.add(node.name)
+                for name in self.paths:
+                    self._link(name)
+                self._changed()
+
+    def scan(self):
+        # Re-analyzes what changed on disk since the last scan. Returns a report of the
+        # modules added, changed and removed, or None when nothing changed.
+        with self.update_lock:
+            with phase("watch_scan"):
+                current = self._current_files()
+            removed = [name for name in self.paths if name not in current]
+            added = [name for name in current if name not in self.paths]
+            changed = [name for name in current if name in self.paths and current[name][1] != self.stamps[name]]
+            if not (added or removed or changed):
+                return None
+            with phase("watch_update"):
+                return self._apply(current, added, changed, removed)
+
+    def _apply(self, current: dict, added: list, changed: list, removed: list) -> dict:
+        parse = added + changed
+        summaries = self._summarize([current[name][0] for name in parse])
+        for _, mode in summaries:
+            FILES_TOTAL.inc(mode=mode)
+        with self.lock:
+            for name in removed:
+                self._set_summary(name, None)
+                for table in (self.paths, self.stamps, self.out, self.modes):
+                    table.pop(name, None)
+                self.index.remove(name)
+            for name, (imports, mode) in zip(parse, summaries):
+                self.paths[name], self.stamps[name] = current[name]
+                self._set_summary(name, imports)
+                if mode != "full":
+                    self.modes[name] = mode
+                else:
+                    self.modes.pop(name, None)
+                self.index.add(name)
+            # Changed modules get new outgoing arcs; modules importing something that now
+            # resolves differently get their outgoing arcs recomputed
+            relink = set(parse)
+            for name in added + removed:
+                for suffix in suffixes(name):
+                    relink.update(self.importers.get(suffix, ()))
+            for name in relink:
+                if name in self.paths:
+                    self._link(name)
+            self._changed()
+            return {"version": self.version, "added": sorted(added), "changed": sorted(changed),
+                    "removed": sorted(removed), "relinked": len(relink.difference(parse))}
+
+    def _summarize(self, paths: list) -> list:
+        summarize = partial(summarize_module, max_bytes=self.max_file_bytes, large_files=self.large_files)
+        if self.workers > 1 and len(paths) >= PARALLEL_MIN_FILES:
+            # A branch switch can touch thousands of files at once
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                return list(pool.map(summarize, paths, chunksize=DEFAULT_CHUNKSIZE))
+        return [summarize(path) for path in paths]
+
+    def _set_summary(self, name: str, imports):
+        old = self.summaries.pop(name, None)
+        if old is not None:
+            for key in import_keys(name, old):
+                importers = self.importers.get(key)
+                if importers is not None:
+                    importers.discard(name)
+                    if not importers:
+                        del self.importers[key]
+        if imports is not None:
+            self.summaries[name] = imports
+            for key in import_keys(name, imports):
+                self.importers.setdefault(key, set()).add(name)
+
+    def _link(self, name: str):
+        # Same resolution as GraphBuilder._link, for one module
+        arcs = {}
+        for imported_module, imported_name in self.summaries[name]:
+            for target in self.index.resolve(name, imported_module, imported_name):
+                arcs[(target, imported_name)] = None
+        self.out[name] = list(arcs)
+
+    def _changed(self):
+        self.version += 1
+        self.updated = time.time()
+        self._view = None
+
+    def view(self) -> CachedGraph:
+        # The current graph in the shape graph_cache hands out, so every query tool can use
+        # it. It is materialized once per version; memoized prompts and indexes go with it.
+        with self.lock:
+            if self._view is None:
+                nodes = list(self.paths)
+                arcs = [{"source": source, "target": target, "symbol": symbol}
+                        for source in nodes for target, symbol in self.out[source]]
+                self._view = CachedGraph(self.ref, (self.version,), nodes, arcs, repo=self.repo_path)
+            return self._view
+
+    def snapshot(self, fmt: str = "json") -> tuple:
+        # Returns (path of the written graph file, version it was taken from)
+        view = self.view()
+        with phase("export"):
+            arcs = ((arc["source"], arc["target"], arc["symbol"]) for arc in view.arcs)
+            path, _ = write_graph(view.nodes, arcs, fmt, repo=self.repo_path,
+                                  large_files=self.stats()["large_files"])
+        return path, view.stamp[0]
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "version": self.version,
+                "modules": len(self.paths),
+                "arcs": sum(len(arcs) for arcs in self.out.values()),
+                "updated": self.updated,
+                "large_files": [{"module": name, "mode": mode} for name, mode in sorted(self.modes.items())],
+            }
@@ -0,0 +1,173 @@
+import contextvars
+import re
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds in seconds, from a cached lookup up to the analysis of a large repository
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000)
+# Sent back on every response; a client-supplied id is kept so logs on both sides line up
+TRACE_HEADER = "X-Trace-Id"
+_TRACE_ID = re.compile(r"[A-Za-z0-9._:-]{1,128}\Z")
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels[n] for n in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self.values.get(tuple(labels[n] for n in self.labelnames), 0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            items = sorted(self.values.items())
+        lines.extend(f"{self.name}{_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items)
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (the last one is +Inf), sum, count]
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels[n] for n in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            items = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self.values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+class MetricsRegistry:
+    # Metrics of this process in the Prometheus text format (version 0.0.4). Each server
+    # process keeps its own; with several workers every one of them has to be scraped.
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (),
+                  buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+PHASE_SECONDS = registry.histogram(
+    "mcp_phase_seconds", "Time spent in each phase of analysis and query handling", ("phase",))
+FILES_TOTAL = registry.counter(
+    "mcp_analyzed_files_total", "Modules seen by analyses, by how they were read (cached, full, light, skipped)",
+    ("mode",))
+ARCS_TOTAL = registry.counter("mcp_graph_arcs_total", "Arcs created by analyses")
+CACHE_LOOKUPS = registry.counter(
+    "mcp_cache_lookups_total", "Lookups in the analysis, graph and response caches", ("cache", "result"))
+LLM_REQUESTS = registry.counter("mcp_llm_requests_total", "Completion requests by outcome", ("outcome",))
+LLM_TOKENS = registry.histogram(
+    "mcp_llm_tokens", "Prompt and completion tokens per request", ("kind",), TOKEN_BUCKETS)
+HTTP_SECONDS = registry.histogram(
+    "mcp_http_request_seconds", "Time to produce a response, by route and status", ("route", "status"))
+
+class Trace:
+    # Phase timings of the request being handled, returned in its Server-Timing header
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.timings = {}
+
+    def add(self, phase: str, seconds: float):
+        self.timings[phase] = self.timings.get(phase, 0.0) + seconds
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{phase};dur={seconds * 1000:.1f}" for phase, seconds in self.timings.items())
+
+_current_trace = contextvars.ContextVar("mcp_trace", default=None)
+
+def start_trace(trace_id: str = None):
+    # Returns (trace, token); pass the token to end_trace when the request is done
+    if not trace_id or not _TRACE_ID.match(trace_id):
+        trace_id = uuid.uuid4().hex
+    trace = Trace(trace_id)
+    return trace, _current_trace.set(trace)
+
+def end_trace(token):
+    _current_trace.reset(token)
+
+def current_trace():
+    return _current_trace.get()
+
+def current_trace_id() -> str:
+    trace = _current_trace.get()
+    return trace.trace_id if trace is not None else None
+
+@contextmanager
+def phase(name: str, timings: dict = None):
+    # Times the block into mcp_phase_seconds, the current request's trace and, when
+    # given, a caller's own timings dict (analysis jobs run outside any request)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        PHASE_SECONDS.observe(elapsed, phase=name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(name, elapsed)
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
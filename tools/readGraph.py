@@ -1,7 +1,16 @@
 import json
 from typing import List, Tuple
+from .compactGraph import CompactGraph, is_compact_file
+from .metrics import phase
 
 def load_graph(filepath: str) -> Tuple[List[str], List[Tuple[str, str, str]]]:
+    with phase("load"):
+        return _load_graph(filepath)
+
+def _load_graph(filepath: str) -> Tuple[List[str], List[Tuple[str, str, str]]]:
+    if is_compact_file(filepath):
+        with CompactGraph(filepath) as graph:
+            return graph.nodes(), graph.arcs()
     with open(filepath, "r", encoding="utf-8") as f:
         data = json.load(f)
     nodes = data.get("nodes", [])
@@ -11,4 +20,12 @@ def load_graph(filepath: str) -> Tuple[List[str], List[Tuple[str, str, str]]]:
     #     for dep in dependencies:
     #         for target, dependency in dep.items():
     #             arcs.append((source, target, dependency))  # (from, to, what)
-    return nodes, arcs_raw
\ No newline at end of file
+    return nodes, arcs_raw
+
+def read_graph_json(filepath: str) -> str:
+    # JSON text of a graph file whatever its on-disk format, for clients that expect JSON
+    if is_compact_file(filepath):
+        with CompactGraph(filepath) as graph:
+            return json.dumps(graph.to_dict(), indent=2)
+    with open(filepath, "r", encoding="utf-8") as f:
+        return f.read()
@@ -0,0 +1,203 @@
+import os
+import re
+import subprocess
+
+# Directories that never contain project modules, pruned wherever they appear
+IGNORED_DIRS = {"__pycache__", "node_modules", "site-packages"}
+# Build output is only pruned at the repository root, nested packages may use these names
+IGNORED_ROOT_DIRS = {"build", "dist"}
+
+def _translate(pattern: str) -> str:
+    # gitignore glob -> regex over '/'-separated paths
+    i, out = 0, []
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == len(pattern):
+            out.append("/.*")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            out.append("[^/]")
+            i += 1
+        elif pattern[i] == "[":
+            end = pattern.find("]", i + 1)
+            if end == -1:
+                out.append(re.escape(pattern[i]))
+                i += 1
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append(f"[{body}]")
+                i = end + 1
+        else:
+            if pattern[i] == "\\" and i + 1 < len(pattern):
+                i += 1
+            out.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(out)
+
+class GitIgnore:
+    def __init__(self):
+        # (base dir, regex, negated, dir_only), in the order git evaluates them
+        self.rules = []
+
+    def add_file(self, path: str, base: str):
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return
+        for line in lines:
+            line = line.rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negated = line.startswith("!")
+            if negated:
+                line = line[1:]
+            elif line.startswith("\\"):
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            # Patterns with an inner slash are relative to the .gitignore, others match at any depth
+            if "/" in line:
+                regex = _translate(line.lstrip("/"))
+            else:
+                regex = "(?:.*/)?" + _translate(line)
+            self.rules.append((base, re.compile(regex + r"\Z"), negated, dir_only))
+
+    def ignored(self, rel_path: str, is_dir: bool) -> bool:
+        result = False
+        for base, regex, negated, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if base:
+                if not rel_path.startswith(base + "/"):
+                    continue
+                candidate = rel_path[len(base) + 1:]
+            else:
+                candidate = rel_path
+            if regex.match(candidate):
+                result = not negated
+        return result
+
+def _is_module(name: str) -> bool:
+    return name.endswith(".py") and not name.startswith("__init__")
+
+def _in_prefix(rel_path: str, prefix: str, is_dir: bool) -> bool:
+    # Keep anything under the prefix, plus the directories leading down to it
+    if rel_path.startswith(prefix):
+        return True
+    return is_dir and prefix.startswith(rel_path + "/")
+
+def walk_python_files(repo_path: str, prefix: str = "", respect_gitignore: bool = True):
+    # Yields (relative path with '/' separators, full path) in a deterministic order
+    prefix = prefix.replace(os.sep, "/")
+    ignore = GitIgnore()
+    if respect_gitignore:
+        ignore.add_file(os.path.join(repo_path, ".git", "info", "exclude"), "")
+
+    def walk(dir_path: str, rel_dir: str):
+        if respect_gitignore:
+            ignore.add_file(os.path.join(dir_path, ".gitignore"), rel_dir)
+        try:
+            with os.scandir(dir_path) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            return
+        subdirs = []
+        for entry in entries:
+            rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if is_dir:
+                if entry.name.startswith(".") or entry.name in IGNORED_DIRS or entry.name.endswith(".egg-info"):
+                    continue
+                if not rel_dir and entry.name in IGNORED_ROOT_DIRS:
+                    continue
+                if not _in_prefix(rel, prefix, True):
+                    continue
+                # Virtualenvs are recognised by their marker file, whatever they are called
+                if os.path.isfile(os.path.join(entry.path, "pyvenv.cfg")):
+                    continue
+                if respect_gitignore and ignore.ignored(rel, True):
+                    continue
+                subdirs.append((entry.path, rel))
+            elif _is_module(entry.name) and _in_prefix(rel, prefix, False):
+                if respect_gitignore and ignore.ignored(rel, False):
+                    continue
+                yield rel, entry.path
+        for sub_path, sub_rel in subdirs:
+            yield from walk(sub_path, sub_rel)
+
+    yield from walk(repo_path, "")
+
+def _walk_order(rel_path: str):
+    # Same order walk_python_files produces: a directory's files first, then its subdirectories
+    parts = rel_path.split("/")
+    return [(1, part) for part in parts[:-1]] + [(0, parts[-1])]
+
+def git_python_files(repo_path: str, prefix: str = ""):
+    # Tracked plus untracked-but-not-ignored files straight from git; None when git can't answer
+    prefix = prefix.replace(os.sep, "/")
+    pathspec = prefix.rsplit("/", 1)[0] if "/" in prefix else "."
+    try:
+        out = subprocess.run(
+            ["git", "-C", repo_path, "ls-files", "-z", "--cached", "--others", "--exclude-standard", "--", pathspec],
+            capture_output=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    files = []
+    for rel in sorted(set(out.decode("utf-8", errors="surrogateescape").split("\0")), key=_walk_order):
+        if not rel or not rel.startswith(prefix) or not _is_module(rel.rsplit("/", 1)[-1]):
+            continue
+        dirs = rel.split("/")[:-1]
+        if any(part.startswith(".") or part in IGNORED_DIRS or part.endswith(".egg-info") for part in dirs):
+            continue
+        if dirs and dirs[0] in IGNORED_ROOT_DIRS:
+            continue
+        full_path = os.path.join(repo_path, *rel.split("/"))
+        # Deleted files stay in the index until the deletion is staged
+        if os.path.isfile(full_path):
+            files.append((rel, full_path))
+    return files
+
+def iter_python_files(repo_path: str, prefix: str = "", use_git: bool = False):
+    if use_git:
+        files = git_python_files(repo_path, prefix)
+        if files is not None:
+            return files
+    return walk_python_files(repo_path, prefix)
+
+def normalize_prefixes(prefixes, default: str = "src") -> tuple:
+    # One prefix or a list of them (several source roots), with '/' separators
+    if prefixes is None:
+        prefixes = default
+    if isinstance(prefixes, str):
+        prefixes = [prefixes]
+    return tuple(dict.fromkeys(p.replace(os.sep, "/") for p in prefixes))
+
+def iter_source_files(repo_path: str, prefixes, use_git: bool = False):
+    # iter_python_files over every prefix in turn; a file under two overlapping prefixes
+    # is listed once, for the first
+    prefixes = normalize_prefixes(prefixes)
+    if len(prefixes) == 1:
+        yield from iter_python_files(repo_path, prefixes[0], use_git)
+        return
+    seen = set()
+    for prefix in prefixes:
+        for rel_path, full_path in iter_python_files(repo_path, prefix, use_git):
+            if rel_path not in seen:
+                seen.add(rel_path)
+                yield rel_path, full_path
@@ -0,0 +1,205 @@
+import glob
+import hashlib
+import json
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from .AnalysisCache import AnalysisCache
+from .DependencyAnalyzer import ANALYZER_VERSION, MAX_FILE_BYTES, LARGE_FILES
+from .Graph import Graph
+from .GraphBuilder import GraphBuilder, BuildCancelled, link_module, write_graph, pool_size
+from .ModuleIndex import ModuleIndex
+from .graphStore import GraphStore
+from .repoWalker import iter_source_files, normalize_prefixes
+from .metrics import phase, FILES_TOTAL, ARCS_TOTAL, CACHE_LOOKUPS
+
+DEFAULT_SHARD_DIR = os.path.join(".", "cache", "shards")
+
+def shard_of(rel_path: str, prefix: str) -> str:
+    # A shard is a top-level package under a prefix; modules directly in the prefix
+    # directory form a shard of their own, named after the prefix
+    base = prefix.rstrip("/")
+    rest = rel_path[len(base) + 1:] if base and rel_path.startswith(base + "/") else rel_path
+    if "/" not in rest:
+        return base
+    top = rest.split("/", 1)[0]
+    return f"{base}/{top}" if base else top
+
+def plan_shards(repo_path: str, prefixes, use_git: bool = False) -> dict:
+    # shard -> [(relative path, full path)], shards and files in walk order, so the
+    # concatenated shards list modules in the order a single build would
+    plan = {}
+    for prefix in normalize_prefixes(prefixes):
+        for rel_path, full_path in iter_source_files(repo_path, prefix, use_git):
+            plan.setdefault(shard_of(rel_path, prefix), {}).setdefault(rel_path, full_path)
+    # A file under two overlapping prefixes belongs to the first one
+    seen = set()
+    for shard, files in plan.items():
+        plan[shard] = [(rel, full) for rel, full in files.items() if rel not in seen]
+        seen.update(files)
+    return {shard: files for shard, files in plan.items() if files}
+
+def shard_fingerprint(repo_path: str, shard: str, files: list, options: tuple) -> str:
+    # Changes when a module of the shard is added, removed or touched, or the options change
+    h = hashlib.blake2b(digest_size=16)
+    h.update(json.dumps([os.path.realpath(repo_path), shard, ANALYZER_VERSION, list(options)]).encode("utf-8"))
+    for rel_path, full_path in files:
+        try:
+            st = os.stat(full_path)
+        except OSError:
+            continue
+        h.update(f"\0{rel_path}\0{st.st_mtime_ns}\0{st.st_size}".encode("utf-8", errors="surrogateescape"))
+    return h.hexdigest()
+
+def _counter_delta(counter, before: dict) -> list:
+    return [(key, value - before.get(key, 0)) for key, value in list(counter.values.items())
+            if value != before.get(key, 0)]
+
+def build_shard(repo_path: str, files: list, artifact_path: str, max_file_bytes: int = MAX_FILE_BYTES,
+                large_files: str = LARGE_FILES, use_cache: bool = True) -> dict:
+    # Runs in a worker process. Parses one shard and saves its partial graph: the modules
+    # and their imports, unresolved, since an absolute import may resolve to modules of
+    # any shard. Returns the module count and the metrics the shard added, which the
+    # parent records when the shard ran in another process.
+    counted = {counter: dict(counter.values) for counter in (FILES_TOTAL, CACHE_LOOKUPS)}
+    cache = AnalysisCache() if use_cache else None
+    try:
+        builder = GraphBuilder(repo_path, workers=1, cache=cache, max_file_bytes=max_file_bytes,
+                               large_files=large_files, files=files)
+        summaries = builder.summarize(parallel=False)
+    finally:
+        if cache is not None:
+            cache.close()
+    modes = {entry["path"]: entry for entry in builder.large_file_report}
+    artifact = {
+        "modules": [node.name for node in builder.graph.nodes.values()],
+        "imports": summaries,
+        "large_files": [modes[rel] for rel, _ in files if rel in modes],
+    }
+    tmp = f"{artifact_path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(artifact, f)
+    os.replace(tmp, artifact_path)
+    return {"modules": len(files),
+            "metrics": {counter.name: _counter_delta(counter, before) for counter, before in counted.items()}}
+
+class ShardedBuilder:
+    # Builds the graph of very large repositories shard by shard. Every shard (a top-level
+    # package under one of the prefixes) is parsed in its own worker process and saved as
+    # a partial graph under cache/shards; the merge then links every shard's imports
+    # against the modules of all shards. Shards whose files didn't change since their
+    # partial graph was saved are not parsed again. The merged graph is the one
+    # GraphBuilder builds for the same prefixes, arc for arc.
+    def __init__(self, repo_path: str, filter_prefix="src", workers: int = None, use_cache: bool = True,
+                 use_git: bool = False, max_file_bytes: int = MAX_FILE_BYTES, large_files: str = LARGE_FILES,
+                 shard_dir: str = DEFAULT_SHARD_DIR, store: GraphStore = None):
+        self.repo_path = repo_path
+        # Graph store export_graph writes to; None for the shared one under ./files
+        self.store = store
+        self.prefixes = normalize_prefixes(filter_prefix)
+        self.workers = pool_size(workers)
+        self.use_cache = use_cache
+        self.use_git = use_git
+        self.max_file_bytes = max_file_bytes
+        self.large_files = large_files
+        self.shard_dir = shard_dir
+        self.graph = Graph()
+        self.large_file_report = []
+        self.timings = {}
+        self.reused = False
+        # One entry per shard: name, modules, and whether it was rebuilt
+        self.shard_report = []
+
+    def _artifact_path(self, shard: str, fingerprint: str) -> str:
+        key = hashlib.blake2b(f"{os.path.realpath(self.repo_path)}\0{shard}".encode("utf-8"),
+                              digest_size=12).hexdigest()
+        return os.path.join(self.shard_dir, f"{key}-{fingerprint}.json")
+
+    def build(self, parallel: bool = None, progress=None, cancel_event=None):
+        # progress(parsed, total) counts the modules of finished shards
+        os.makedirs(self.shard_dir, exist_ok=True)
+        options = (self.max_file_bytes, self.large_files)
+        with phase("walk", self.timings):
+            plan = plan_shards(self.repo_path, self.prefixes, self.use_git)
+            artifacts = {shard: self._artifact_path(shard, shard_fingerprint(self.repo_path, shard, files, options))
+                         for shard, files in plan.items()}
+        total = sum(len(files) for files in plan.values())
+        stale = [shard for shard in plan if not os.path.isfile(artifacts[shard])]
+        done = total - sum(len(plan[shard]) for shard in stale)
+        FILES_TOTAL.inc(done, mode="cached")
+        if progress is not None:
+            progress(done, total)
+        with phase("parse", self.timings):
+            if parallel is None:
+                parallel = self.workers > 1 and len(stale) > 1
+            for shard, result in self._build_shards(stale, plan, artifacts, parallel, cancel_event):
+                done += result["modules"]
+                self._remove_old_artifacts(artifacts[shard])
+                if progress is not None:
+                    progress(done, total)
+        with phase("link", self.timings):
+            self._merge(plan, artifacts)
+        self.shard_report = [{"shard": shard, "modules": len(plan[shard]), "rebuilt": shard in stale}
+                             for shard in plan]
+        return self.graph
+
+    def _build_shards(self, stale: list, plan: dict, artifacts: dict, parallel: bool, cancel_event):
+        args = {shard: (self.repo_path, plan[shard], artifacts[shard], self.max_file_bytes, self.large_files,
+                        self.use_cache) for shard in stale}
+        if not parallel:
+            for shard in stale:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise BuildCancelled("Build cancelled")
+                yield shard, build_shard(*args[shard])
+            return
+        pool = ProcessPoolExecutor(max_workers=min(self.workers, len(stale)))
+        try:
+            # Largest shards first, so a big one doesn't start last and hold up the merge
+            futures = {pool.submit(build_shard, *args[shard]): shard
+                       for shard in sorted(stale, key=lambda s: -len(plan[s]))}
+            for future in as_completed(futures):
+                result = future.result()
+                # Worker processes have their own metrics registry
+                for counter in (FILES_TOTAL, CACHE_LOOKUPS):
+                    for key, amount in result["metrics"][counter.name]:
+                        counter.inc(amount, **dict(zip(counter.labelnames, key)))
+                yield futures[future], result
+                if cancel_event is not None and cancel_event.is_set():
+                    raise BuildCancelled("Build cancelled")
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _remove_old_artifacts(self, artifact_path: str):
+        # Partial graphs of earlier states of the same shard
+        key = os.path.basename(artifact_path).split("-", 1)[0]
+        for path in glob.glob(os.path.join(self.shard_dir, f"{key}-*.json")):
+            if path != artifact_path:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _merge(self, plan: dict, artifacts: dict):
+        # Nodes of every shard first, so the index sees all modules; then each shard's
+        # partial graph is loaded in turn and its imports resolved, in node order
+        for files in plan.values():
+            for rel_path, full_path in files:
+                self.graph.add_node(rel_path[:-len(".py")].replace("/", "."), full_path)
+        index = ModuleIndex(self.graph.nodes.keys())
+        nodes = self.graph.nodes
+        created = 0
+        self.large_file_report = []
+        for shard in plan:
+            with open(artifacts[shard], "r", encoding="utf-8") as f:
+                artifact = json.load(f)
+            for name, imports in zip(artifact["modules"], artifact["imports"]):
+                created += link_module(self.graph, index, nodes[name], [tuple(i) for i in imports])
+            self.large_file_report.extend(artifact["large_files"])
+        ARCS_TOTAL.inc(created)
+
+    def export_graph(self, fmt: str = "json") -> str:
+        with phase("export", self.timings):
+            path, self.reused = write_graph(list(self.graph.nodes), self.graph.iter_arc_names(), fmt,
+                                            repo=self.repo_path, large_files=self.large_file_report,
+                                            store=self.store)
+            return path
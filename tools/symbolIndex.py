@@ -0,0 +1,183 @@
+import os
+import threading
+from .DependencyAnalyzer import DependencyAnalyzer, MAX_FILE_BYTES, LARGE_FILES
+from .ModuleIndex import ModuleIndex
+from .graphStore import graph_store
+from .metrics import phase, CACHE_LOOKUPS
+
+# Most lines of symbol facts added to a query prompt
+SYMBOL_FACT_LINES = 40
+
+class SymbolNotFound(KeyError):
+    pass
+
+def graph_repo(graph):
+    # Repository a graph was built from: known to watched graphs, and recorded in the
+    # store index for graphs written by an analysis. None for files added by hand.
+    if getattr(graph, "repo", None):
+        return graph.repo
+    if os.path.dirname(graph.path) == graph_store.folder:
+        entry = graph_store.get(os.path.basename(graph.path))
+        if entry is not None:
+            return entry["repo"]
+    return None
+
+class SymbolIndex:
+    # Definitions, references and call sites of the modules of one graph. Nothing is parsed
+    # up front: a module's source is read the first time a lookup needs it, and kept until
+    # its file changes. Looking up a symbol parses its module and the modules that import
+    # it according to the graph, never the rest of the repository.
+    def __init__(self, repo_path: str, nodes: list, arcs: list, max_bytes: int = MAX_FILE_BYTES,
+                 large_files: str = LARGE_FILES):
+        self.repo_path = repo_path
+        self.max_bytes = max_bytes
+        self.large_files = large_files
+        self.index = ModuleIndex(nodes)
+        self.importers = {}
+        for arc in arcs:
+            self.importers.setdefault(arc["target"], set()).add(arc["source"])
+        # module -> (file stamp, parsed module)
+        self.modules = {}
+        self.lock = threading.Lock()
+        self.nbytes = 0
+
+    def source_path(self, module: str) -> str:
+        # Module names are relative paths with dots, as GraphBuilder names them
+        return os.path.join(self.repo_path, *module.split(".")) + ".py"
+
+    def module(self, name: str) -> dict:
+        # {"definitions": [...], "references": [...]} with references resolved to graph modules
+        path = self.source_path(name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            raise SymbolNotFound(f"Source of module '{name}' not found under '{self.repo_path}'")
+        stamp = (st.st_mtime_ns, st.st_size)
+        cached = self.modules.get(name)
+        if cached is not None and cached[0] == stamp:
+            CACHE_LOOKUPS.inc(cache="symbol", result="hit")
+            return cached[1]
+        CACHE_LOOKUPS.inc(cache="symbol", result="miss")
+        with phase("symbols"):
+            parsed = DependencyAnalyzer(path, self.max_bytes, self.large_files).symbols()
+            entry = {
+                "definitions": [{"name": n, "kind": kind, "line": line, "end_line": end}
+                                for n, kind, line, end in parsed["definitions"]],
+                "references": self._resolve(name, parsed),
+            }
+        with self.lock:
+            previous = self.modules.get(name)
+            if previous is not None:
+                self.nbytes -= self._size(previous[1])
+            self.modules[name] = (stamp, entry)
+            self.nbytes += self._size(entry)
+        return entry
+
+    def _size(self, entry: dict) -> int:
+        return 200 * len(entry["definitions"]) + 250 * len(entry["references"])
+
+    def _resolve(self, name: str, parsed: dict) -> list:
+        # Each reference becomes (graph module, symbol in it); references to modules outside
+        # the graph (the standard library, third-party packages) are dropped
+        imports = parsed["imports"]
+        local = set(d[0] for d in parsed["definitions"])
+        resolved = []
+        for scope, dotted, line, call in parsed["references"]:
+            root, _, rest = dotted.partition(".")
+            if root not in imports:
+                if dotted in local or root in local:
+                    resolved.append({"scope": scope, "module": name, "symbol": dotted, "line": line, "call": call})
+                continue
+            module, imported = imports[root]
+            for target, symbol in self._targets(name, module, imported, rest):
+                resolved.append({"scope": scope, "module": target, "symbol": symbol, "line": line, "call": call})
+        return resolved
+
+    def _targets(self, name: str, module: str, imported: str, rest: str) -> list:
+        if imported is not None:
+            targets = []
+            for target in self.index.resolve(name, module, imported):
+                if target.endswith("." + imported) and not module.endswith(imported):
+                    # "from pkg import submodule": the rest names a symbol of the submodule
+                    targets.append((target, rest or None))
+                else:
+                    targets.append((target, f"{imported}.{rest}" if rest else imported))
+            return targets
+        # "import a.b" or "import a.b as c": the longest dotted prefix that is a module
+        parts = (module.split(".") + rest.split(".")) if rest else module.split(".")
+        for i in range(len(parts), 0, -1):
+            targets = self.index.resolve(name, ".".join(parts[:i]))
+            if targets:
+                symbol = ".".join(parts[i:]) or None
+                return [(target, symbol) for target in targets]
+        return []
+
+    def definition(self, module: str, symbol: str) -> dict:
+        # Exact qualified name, or a dotted suffix naming one definition ("request" for "Session.request")
+        definitions = self.module(module)["definitions"]
+        matches = [d for d in definitions if d["name"] == symbol]
+        if not matches:
+            matches = [d for d in definitions if d["name"].endswith("." + symbol)]
+        if len(matches) == 1:
+            return matches[0]
+        if not matches:
+            raise SymbolNotFound(f"Symbol '{symbol}' not defined in module '{module}'")
+        shown = ", ".join(sorted(d["name"] for d in matches)[:10])
+        raise SymbolNotFound(f"Symbol '{symbol}' is ambiguous in module '{module}': {shown}")
+
+    def uses(self, module: str, symbol: str = None) -> list:
+        # What the module, or one of its definitions and everything nested in it, refers to
+        rows = self.module(module)["references"]
+        if symbol is None:
+            return list(rows)
+        return [r for r in rows if r["scope"] == symbol or r["scope"].startswith(symbol + ".")]
+
+    def references(self, module: str, symbol: str) -> list:
+        # Where a definition is referred to, in its own module and in the modules importing it;
+        # "call" marks the call sites. References to an attribute of it (Class.method) count too.
+        rows = []
+        for source in [module] + sorted(self.importers.get(module, set()) - {module}):
+            try:
+                entry = self.module(source)
+            except SymbolNotFound:
+                continue
+            for r in entry["references"]:
+                if r["module"] == module and r["symbol"] and \
+                        (r["symbol"] == symbol or r["symbol"].startswith(symbol + ".")) and \
+                        not (source == module and (r["scope"] == symbol or r["scope"].startswith(symbol + "."))):
+                    rows.append({"module": source, "scope": r["scope"], "line": r["line"], "call": r["call"]})
+        return rows
+
+    def facts(self, modules: list, words: set, limit: int = SYMBOL_FACT_LINES) -> list:
+        # Lines for a query prompt: for each module, its definitions with what they use in
+        # other modules; for definitions the query names, where they are used
+        lines = []
+        for module in modules:
+            try:
+                entry = self.module(module)
+            except SymbolNotFound:
+                continue
+            for d in entry["definitions"]:
+                # Only the definition's own body; nested definitions get lines of their own
+                uses = sorted(set(f"{u['module']}.{u['symbol']}" if u["symbol"] else u["module"]
+                                  for u in entry["references"] if u["scope"] == d["name"] and u["module"] != module))
+                named = d["name"].rsplit(".", 1)[-1] in words
+                if uses:
+                    lines.append(f"{module}.{d['name']} ({d['kind']}, line {d['line']}) uses: {', '.join(uses)}")
+                if named:
+                    used_by = sorted(set(f"{r['module']}.{r['scope']}" if r["scope"] else r["module"]
+                                         for r in self.references(module, d["name"])))
+                    lines.append(f"{module}.{d['name']} ({d['kind']}, line {d['line']}) is used by: "
+                                 + (", ".join(used_by) if used_by else "nothing in the graph"))
+                if len(lines) >= limit:
+                    return lines[:limit]
+        return lines
+
+def cached_symbol_index(graph, repo_path: str = None):
+    # graph is a tools.graphCache entry; one index per graph and repository, parsed lazily.
+    # None when the repository of the graph isn't known and none was given.
+    repo_path = repo_path or graph_repo(graph)
+    if not repo_path:
+        return None
+    return graph.memo(f"symbol_index:{os.path.realpath(repo_path)}",
+                      lambda: SymbolIndex(repo_path, graph.nodes, graph.arcs))